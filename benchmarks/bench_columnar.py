@@ -0,0 +1,62 @@
+"""
+Compare reading a whole table through SQL (a dict per row, SQLite, then tuples) with the columnar path.
+
+    python benchmarks/bench_columnar.py [--rows 50000] [--width 20] [--repeat 3]
+
+Tables are served by the local mock API (``benchmarks/mock_server.py``), with caching off. ``fetch_arrow`` is only
+timed when ``pyarrow`` is installed.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockServer  # noqa: E402
+from rest_db_api import columnar  # noqa: E402
+from rest_db_api.columnar import fetch_arrow, fetch_columns  # noqa: E402
+from rest_db_api.utils import get_virtual_table  # noqa: E402
+
+ENGINE_OPTIONS = {"cache_ttl": 0, "cache_backend": "memory", "stats_backend": "memory"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--width", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    server = MockServer().start()
+    table = get_virtual_table(endpoint="/rows", params={"rows": args.rows, "width": args.width},
+                              jsonpath="$.items[*]")
+    engine = create_engine(f"rest://{server.address}?ishttps=0&cache_ttl=0&cache_backend=memory&stats_backend=memory")
+    try:
+        with engine.connect() as connection:
+            def read_sql():
+                return len(connection.execute(text(f'SELECT * FROM "{table}"')).fetchall())
+
+            def read_columns():
+                return sum(len(batch["id"]) for batch in fetch_columns(table, server.address, False, ENGINE_OPTIONS))
+
+            candidates = {"sql": read_sql, "fetch_columns": read_columns}
+            if columnar.pyarrow is not None:
+                candidates["fetch_arrow"] = lambda: fetch_arrow(table, server.address, False, ENGINE_OPTIONS).num_rows
+
+            print(f"{args.rows} rows of {args.width} columns")
+            baseline = None
+            for name, read in candidates.items():
+                assert read() == args.rows
+                elapsed = min(timeit.repeat(read, number=1, repeat=args.repeat))
+                baseline = baseline or elapsed
+                print(f"{name:<16} {elapsed * 1000:>10.1f} ms {baseline / elapsed:>6.1f}x")
+    finally:
+        engine.dispose()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
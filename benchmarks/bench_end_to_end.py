@@ -0,0 +1,241 @@
+"""
+Run SQL through ``create_engine("rest://...")`` against a local mock API, end to end.
+
+    python benchmarks/bench_end_to_end.py [--iterations 20] [--json]
+    python benchmarks/bench_end_to_end.py --save-baseline
+    python benchmarks/bench_end_to_end.py --check [--tolerance 0.25]
+
+Every scenario reports the p50/p99 latency of its statement, the rows per second, the upstream requests per run and
+the peak memory allocated by Python during a run, traced by ``tracemalloc`` on a separate, untimed run (the mock
+server's allocations included, SQLite's left out). Caching is off, so every run goes over HTTP to the mock server
+(``benchmarks/mock_server.py``), started on a free port.
+
+The ``parse`` scenarios time the hot paths that don't send requests: decoding a virtual table (``parse_uri``),
+rewriting the ``HEADER``/``QUERY_PARAM`` conditions of a statement (``parse_operation_and_uri``), both uncached,
+and discovering the columns of a table from its first rows (``_set_columns``).
+
+``--check`` compares the results with ``benchmarks/baselines.json`` and exits with ``1`` when a scenario got slower
+(or bigger) by more than ``--tolerance``, or sends a different number of requests. Baselines depend on the machine,
+save them again with ``--save-baseline`` before comparing changes on another one.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockServer  # noqa: E402
+from rest_db_api.rest_api_adapter import RestAdapter, decode_virtual_table  # noqa: E402
+from rest_db_api.utils import get_virtual_table, parse_operation_and_uri  # noqa: E402
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_TOLERANCE = 0.25
+# megabytes a scenario may allocate over its baseline whatever the tolerance, the parsers allocate next to nothing
+PEAK_MB_SLACK = 0.5
+
+
+class Scenario(NamedTuple):
+    name: str
+    # virtual table, without its ``#`` fragment when the statement has ``HEADER``/``QUERY_PARAM`` conditions
+    table: str
+    # statement, with ``{table}`` replaced by the virtual table
+    sql: str
+    # move the ``HEADER``/``QUERY_PARAM`` conditions into the table before every run, as shillelagh's query
+    # manipulation does
+    rewrite: bool = False
+
+
+class Result(NamedTuple):
+    name: str
+    p50_ms: float
+    p99_ms: float
+    rows_per_s: float
+    requests: float
+    peak_mb: float
+
+
+def get_table(rows: int, width: int = 10, depth: int = 0, latency_ms: int = 0, envelope: bool = True,
+              **kwargs) -> str:
+    params = {"rows": rows, "width": width, "depth": depth}
+    if latency_ms:
+        params["latency_ms"] = latency_ms
+    if not envelope:
+        # tables without their ``#`` fragment are read with the default ``$[*]`` JSONPath
+        params["envelope"] = 0
+        return get_virtual_table(endpoint="/rows", params=params, **kwargs).split("#")[0]
+    return get_virtual_table(endpoint="/rows", params=params, jsonpath="$.items[*]", **kwargs)
+
+
+SCENARIOS = [
+    Scenario("scan 10k rows", get_table(10000), 'SELECT * FROM "{table}"'),
+    Scenario("scan 10k rows, 2 columns", get_table(10000), 'SELECT id, column_1 FROM "{table}"'),
+    Scenario("limit 10 of 10k rows", get_table(10000), 'SELECT * FROM "{table}" LIMIT 10'),
+    Scenario("filter 10k rows", get_table(10000), 'SELECT id FROM "{table}" WHERE column_2 > 2000'),
+    Scenario("scan 2k wide rows", get_table(2000, width=50), 'SELECT * FROM "{table}"'),
+    Scenario("scan 2k nested rows", get_table(2000, width=20, depth=3), 'SELECT * FROM "{table}"'),
+    Scenario("paginate 10k rows", get_table(10000, pagination={
+        "type": "page", "page_param": "page", "page_size_param": "page_size", "page_size": 500,
+        "total_path": "$.total"}), 'SELECT * FROM "{table}"'),
+    Scenario("paginate 10k rows, 20ms latency", get_table(10000, latency_ms=20, pagination={
+        "type": "page", "page_param": "page", "page_size_param": "page_size", "page_size": 500,
+        "total_path": "$.total", "concurrency": 8}), 'SELECT * FROM "{table}"'),
+    Scenario("query param conditions", get_table(1000, envelope=False),
+             'SELECT * FROM "{table}" WHERE QUERY_PARAM_X_SOURCE = \'bench\' AND HEADER_X_API_KEY = \'key\'',
+             rewrite=True),
+]
+
+
+def get_peak_mb(call: Callable[[], Any]) -> float:
+    """
+    Return the peak memory allocated while running ``call``; tracing allocations slows it down, don't time it.
+    """
+    tracemalloc.start()
+    try:
+        call()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def get_percentile(timings: List[float], percentile: float) -> float:
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(round(percentile * (len(timings) - 1))))]
+
+
+def time_calls(call: Callable[[], Any], iterations: int) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_scenario(server: MockServer, scenario: Scenario, iterations: int) -> Result:
+    engine = create_engine(f"rest://{server.address}?ishttps=0&cache_ttl=0&cache_backend=memory&stats_backend=memory")
+    try:
+        with engine.connect() as connection:
+            def run():
+                operation = scenario.sql.format(table=scenario.table)
+                if scenario.rewrite:
+                    _, operation = RestAdapter.parse_operation_and_uri(scenario.table, operation)
+                return connection.execute(text(operation)).fetchall()
+
+            # warm up: discovers the columns, and builds the responses of the mock server
+            num_rows = len(run())
+            requests = server.requests
+            timings = time_calls(run, iterations)
+            requests = (server.requests - requests) / iterations
+            peak_mb = get_peak_mb(run)
+    finally:
+        # apsw connections left to the garbage collector may crash the interpreter at exit
+        engine.dispose()
+    return Result(scenario.name, statistics.median(timings) * 1000, get_percentile(timings, 0.99) * 1000,
+                  num_rows / statistics.mean(timings), requests, peak_mb)
+
+
+def run_parse_scenarios(server: MockServer, iterations: int) -> List[Result]:
+    table = get_table(1000)
+    uri = get_table(1000, envelope=False)
+    operation = f'SELECT * FROM "{uri}" WHERE HEADER_X_API_KEY = \'key\' AND id > 10'
+    # statements are rewritten (and virtual tables decoded) once per distinct input, time it uncached
+    calls = {
+        "parse_uri": (lambda: decode_virtual_table.__wrapped__(table), 0),
+        "parse_operation_and_uri": (lambda: parse_operation_and_uri.__wrapped__(uri, operation), 0),
+        "_set_columns, 1k rows": (lambda: RestAdapter(*RestAdapter.parse_uri(table), base_url=server.address,
+                                                      is_https=False,
+                                                      engine_options={"cache_ttl": 0, "cache_backend": "memory",
+                                                                      "stats_backend": "memory"}),
+                                  1000),
+    }
+    results = []
+    for name, (call, num_rows) in calls.items():
+        call()
+        requests = server.requests
+        # the parsers take microseconds, repeat them to get past the resolution of the clock
+        repeat = 1 if num_rows else 100
+        timings = [timing / repeat for timing in time_calls(lambda: [call() for _ in range(repeat)], iterations)]
+        results.append(Result(f"parse: {name}", statistics.median(timings) * 1000,
+                              get_percentile(timings, 0.99) * 1000,
+                              num_rows / statistics.mean(timings), (server.requests - requests) / iterations,
+                              get_peak_mb(call)))
+    return results
+
+
+def check(results: List[Result], baselines: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """
+    Return the regressions of ``results`` over ``baselines``.
+    """
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result.name)
+        if baseline is None:
+            continue
+        for field, slack in (("p50_ms", 0), ("peak_mb", PEAK_MB_SLACK)):
+            value = getattr(result, field)
+            if value > baseline[field] * (1 + tolerance) + slack:
+                regressions.append(f"{result.name}: {field} {value:.2f} > {baseline[field]:.2f}")
+        if result.rows_per_s < baseline["rows_per_s"] * (1 - tolerance):
+            regressions.append(f"{result.name}: rows_per_s {result.rows_per_s:.0f} < {baseline['rows_per_s']:.0f}")
+        if result.requests != baseline["requests"]:
+            regressions.append(f"{result.name}: requests {result.requests:g} != {baseline['requests']:g}")
+    return regressions
+
+
+def print_results(results: List[Result]) -> None:
+    print(f"{'scenario':<34} {'p50 (ms)':>9} {'p99 (ms)':>9} {'rows/s':>10} {'requests':>9} {'peak (MB)':>10}")
+    for result in results:
+        print(f"{result.name:<34} {result.p50_ms:>9.3f} {result.p99_ms:>9.3f} {result.rows_per_s:>10.0f}"
+              f" {result.requests:>9g} {result.peak_mb:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--scenario", help="only run the scenarios containing this text")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {BASELINES_PATH}")
+    parser.add_argument("--check", action="store_true", help="compare the results with the baselines")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    server = MockServer().start()
+    try:
+        results = [run_scenario(server, scenario, args.iterations) for scenario in SCENARIOS
+                   if not args.scenario or args.scenario in scenario.name]
+        results += [result for result in run_parse_scenarios(server, args.iterations)
+                    if not args.scenario or args.scenario in result.name]
+    finally:
+        server.stop()
+
+    if args.json:
+        print(json.dumps([result._asdict() for result in results], indent=2))
+    else:
+        print_results(results)
+
+    if args.save_baseline:
+        with open(BASELINES_PATH, "w") as file:
+            json.dump({result.name: {key: round(value, 3) for key, value in result._asdict().items() if key != "name"}
+                       for result in results}, file, indent=2)
+            file.write("\n")
+    if args.check:
+        baselines: Optional[Dict[str, Dict[str, float]]] = None
+        if os.path.exists(BASELINES_PATH):
+            with open(BASELINES_PATH) as file:
+                baselines = json.load(file)
+        regressions = check(results, baselines or {}, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
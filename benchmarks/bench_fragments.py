@@ -0,0 +1,37 @@
+"""
+Compare evaluating fragments with a new ``JSONPath`` per call, with the compiled fragments.
+
+    python benchmarks/bench_fragments.py [--rows 100000] [--repeat 5]
+"""
+import argparse
+import timeit
+
+from jsonpath import JSONPath
+
+from rest_db_api.fragments import compile_fragment
+
+FRAGMENTS = ["$[*]", "$.data.items[*]", "$.data.items[?(@.id >= 0)]"]
+
+
+def get_payload(fragment: str, rows: int):
+    items = [{"id": i, "name": f"row {i}", "score": i * 0.5} for i in range(rows)]
+    return items if fragment == "$[*]" else {"data": {"items": items}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'fragment':<30} {'jsonpath (ms)':>14} {'compiled (ms)':>14} {'speedup':>8}")
+    for fragment in FRAGMENTS:
+        payload = get_payload(fragment, args.rows)
+        baseline = min(timeit.repeat(lambda: JSONPath(fragment).parse(payload), number=1, repeat=args.repeat))
+        compiled = min(timeit.repeat(lambda: compile_fragment(fragment).parse(payload), number=1,
+                                     repeat=args.repeat))
+        print(f"{fragment:<30} {baseline * 1000:>14.2f} {compiled * 1000:>14.2f} {baseline / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare the cost of logging a response, the way ``_get_response`` used to (an INFO f-string of the URL, params,
+headers and the whole body), with the lazy, redacted and capped records, for a large POST body.
+
+    python benchmarks/bench_logging.py [--number 2000] [--body-filters 200]
+
+Each record is timed with the logger at WARNING (the records are dropped) and at INFO and DEBUG (written to an
+in-memory stream).
+"""
+import argparse
+import io
+import logging
+import timeit
+
+from rest_db_api.logs import Payload, Redacted
+
+URL = "https://api.example.com/v1/orders/search"
+QUERY_PARAMS = {"status": ["open"], "page": ["1"]}
+HEADERS = {"Authorization": "Bearer secret", "Cookie": "session=secret", "Accept": "application/json"}
+
+
+def log_previous(logger: logging.Logger, body):
+    logger.info(f"response received; uri : {URL}; query_params : {QUERY_PARAMS};"
+                f" headers : {HEADERS}; json : {body}; is_response_cached : {False}")
+
+
+def log_lazily(logger: logging.Logger, body):
+    logger.info("response received; uri : %s; status : %s; is_response_cached : %s", Payload(URL), 200, False)
+    logger.debug("request sent; uri : %s; query_params : %s; headers : %s; json : %s", Payload(URL),
+                 Redacted(QUERY_PARAMS), Redacted(HEADERS), Payload(body))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--body-filters", type=int, default=200)
+    args = parser.parse_args()
+
+    body = {"filters": [{"field": f"field_{i}", "op": "in", "values": [f"value {j}" for j in range(20)]}
+                        for i in range(args.body_filters)]}
+    logger = logging.getLogger("bench_logging")
+    logger.propagate = False
+    stream = io.StringIO()
+    logger.addHandler(logging.StreamHandler(stream))
+
+    print(f"{'level':<8} {'previous (us)':>14} {'lazy (us)':>10} {'previous (bytes)':>17} {'lazy (bytes)':>13}")
+    for level in (logging.WARNING, logging.INFO, logging.DEBUG):
+        logger.setLevel(level)
+        timings = []
+        sizes = []
+        for log in (log_previous, log_lazily):
+            stream.seek(0)
+            stream.truncate()
+            timings.append(timeit.timeit(lambda: log(logger, body), number=args.number) / args.number * 1e6)
+            sizes.append(len(stream.getvalue()) // args.number)
+        print(f"{logging.getLevelName(level):<8} {timings[0]:>14.1f} {timings[1]:>10.1f} {sizes[0]:>17}"
+              f" {sizes[1]:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare materializing rows with ``flatten`` (the previous path), with ``RowMaterializer``.
+
+    python benchmarks/bench_rows.py [--rows 100000] [--width 40] [--repeat 5]
+"""
+import argparse
+import copy
+import timeit
+
+from shillelagh.fields import Integer, String
+from shillelagh.lib import flatten
+
+from rest_db_api import rows as rows_module
+from rest_db_api.rows import RowMaterializer, get_json_encoder
+
+
+def get_items(rows: int, width: int):
+    item = {f"column_{i}": i if i % 4 else {"nested": [i, str(i)]} for i in range(width)}
+    return [copy.copy(item) for _ in range(rows)]
+
+
+def flatten_rows(items):
+    for i, row in enumerate(items):
+        row["rowid"] = i
+        yield flatten(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--width", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    items = get_items(args.rows, args.width)
+    columns = {name: String() if i % 4 == 0 else Integer() for i, name in enumerate(items[0])}
+    candidates = {
+        "flatten": lambda: flatten_rows(items),
+        "materializer (json)": lambda: RowMaterializer(columns).get_rows(items),
+        "materializer, 4 columns": lambda: RowMaterializer(columns).get_rows(
+            items, requested_columns=set(list(columns)[:4])),
+    }
+    if rows_module.orjson is not None:
+        encode = get_json_encoder("orjson")
+        candidates["materializer (orjson)"] = lambda: RowMaterializer(columns, encode).get_rows(items)
+
+    print(f"{args.rows} rows of {args.width} columns")
+    baseline = None
+    for name, get_rows in candidates.items():
+        elapsed = min(timeit.repeat(lambda: sum(1 for _ in get_rows()), number=1, repeat=args.repeat))
+        baseline = baseline or elapsed
+        print(f"{name:<28} {elapsed * 1000:>10.2f} ms {baseline / elapsed:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Time the rewrite of header and query param conditions, for the long statements of the adapter tests.
+
+    python benchmarks/bench_sql_rewrite.py [--number 200]
+
+``cold`` re-parses the statement on every call, ``cached`` is what a dashboard re-issuing a statement pays.
+"""
+import argparse
+import timeit
+
+from rest_db_api.utils import parse_operation_and_uri
+
+STATEMENTS = {
+    "multi-predicate": ("/reports/v2.0/ledgers", """SELECT * from "/reports/v2.0/ledgers"
+        where colour = blue and QUERY_PARAMcount = 100 and QUERY_PARAMpage in (5,6)
+              and "HEADERx-clear-node-id" in ("test-header-6", "test-header-9") and first_name = "big_mack"
+              and "HEADERx-clear-node-type" = "node-type"
+              and dress_code = pink
+              order BY test_order_column desc
+        LIMIT 1001"""),
+    "nested, grouped": ("REPORTS_LEDGER_SUMMARY", """SELECT "S.No." AS "S.No.", "GSTIN" AS "GSTIN", "STATE" AS "STATE",
+       "Date" AS "Date", "Balance Type" AS "Balance Type", "TOTAL TAX" AS "TOTAL TAX", "IGST" AS "IGST",
+       "CGST" AS "CGST", "SGST" AS "SGST", "CESS" AS "CESS"
+FROM
+  (SELECT "rowid" as "S.No.", "gstin" as "GSTIN", "gstinNodeId" as "GSTIN_NODE_ID", "state" as "STATE",
+          "date" as "Date", "balance_type" as "Balance Type", "total_taxable_value" as "TOTAL TAX", "igst" as "IGST",
+          "cgst" as "CGST", "sgst" as "SGST", "cess" as "CESS", "org_id" as "org_id", "node_ids" as "node_ids",
+          "returnPeriod" as "returnPeriod"
+   from "REPORTS_LEDGER_SUMMARY"
+   WHERE "HEADERx-clear-job-id" = "feb0b665-a9f5-4c7f-be74-7c27a08dd41f") AS virtual_table
+WHERE (org_id in ('e1378c1f-35f5-494b-9903-fd851f238613')
+       and node_ids in ('e65f96d7-ea28-475b-832f-d1ac2b3c8a57', '5e3fa661-2f00-4fcb-98ee-6739406bdfad'))
+GROUP BY "S.No.", "GSTIN", "STATE", "Date", "Balance Type", "TOTAL TAX", "IGST", "CGST", "SGST", "CESS"
+LIMIT 1000
+OFFSET 0"""),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'statement':<18} {'cold (us)':>10} {'cached (us)':>12}")
+    for name, (uri, operation) in STATEMENTS.items():
+        cold = timeit.timeit(lambda: parse_operation_and_uri.__wrapped__(uri, operation), number=args.number)
+        parse_operation_and_uri(uri, operation)
+        cached = timeit.timeit(lambda: parse_operation_and_uri(uri, operation), number=args.number)
+        print(f"{name:<18} {cold / args.number * 1e6:>10.1f} {cached / args.number * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Time the decoding of virtual tables, and the construction of adapters, for a small and a large request body.
+
+    python benchmarks/bench_table_spec.py [--number 2000]
+
+``cold`` decodes the URI on every call, ``cached`` is what every query after the first one pays. Adapters are
+built from a declared schema, so no request is sent.
+"""
+import argparse
+import timeit
+
+from rest_db_api.rest_api_adapter import RestAdapter, decode_virtual_table
+from rest_db_api.utils import get_virtual_table
+
+SCHEMA = {"id": "integer", "name": "string", "amount": "float"}
+
+TABLES = {
+    "small body": get_virtual_table(endpoint="/v1/orders", params={"status": "open"},
+                                    headers={"x-api-key": "key"}, options={"schema": SCHEMA}),
+    "large body": get_virtual_table(endpoint="/v1/orders/search", params={"status": "open"},
+                                    headers={"x-api-key": "key", "x-node-id": "node"},
+                                    body={"filters": [{"field": f"field_{i}", "op": "in",
+                                                       "values": [f"value {j}" for j in range(20)]}
+                                                      for i in range(50)]},
+                                    options={"schema": SCHEMA}),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'table':<12} {'cold (us)':>10} {'cached (us)':>12} {'adapter (us)':>13}")
+    for name, uri in TABLES.items():
+        cold = timeit.timeit(lambda: (decode_virtual_table.cache_clear(), RestAdapter.parse_uri(uri)),
+                             number=args.number)
+        RestAdapter.parse_uri(uri)
+        cached = timeit.timeit(lambda: RestAdapter.parse_uri(uri), number=args.number)
+        adapter = timeit.timeit(lambda: RestAdapter(*RestAdapter.parse_uri(uri), base_url="localhost"),
+                                number=args.number)
+        print(f"{name:<12} {cold / args.number * 1e6:>10.1f} {cached / args.number * 1e6:>12.2f}"
+              f" {adapter / args.number * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
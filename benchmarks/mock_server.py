@@ -0,0 +1,122 @@
+"""
+A local stand-in for a REST API, serving synthetic JSON rows.
+
+    python benchmarks/mock_server.py [--port 8765]
+
+Every GET answers ``{"total": rows, "items": [...]}`` (or a bare array with ``envelope=0``), shaped by query params:
+
+- ``rows``: number of rows of the dataset (default ``1000``)
+- ``width``: columns per row (default ``10``)
+- ``depth``: nesting depth of every fourth column (default ``0``, flat)
+- ``page``, ``page_size``: serve a single page of the rows
+- ``latency_ms``: delay before answering
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+
+def get_value(row: int, column: int, depth: int) -> Any:
+    if depth and column % 4 == 0:
+        value: Any = {"value": row * column, "tags": [f"tag-{row % 7}", f"tag-{column % 5}"]}
+        for level in range(depth - 1):
+            value = {f"level_{level}": value}
+        return value
+    if column % 3 == 1:
+        return f"value {row}-{column}"
+    if column % 3 == 2:
+        return row * column * 0.5
+    return row * column
+
+
+def get_rows(start: int, end: int, width: int, depth: int) -> List[Dict[str, Any]]:
+    return [
+        {"id": row, **{f"column_{column}": get_value(row, column, depth) for column in range(1, width)}}
+        for row in range(start, end)
+    ]
+
+
+class MockServer:
+    """
+    Serves the synthetic rows from a background thread, counting the requests it answers.
+    """
+
+    def __init__(self, port: int = 0):
+        self.requests = 0
+        self._lock = threading.Lock()
+        # responses are generated once per shape
+        self._cache: Dict[Tuple, bytes] = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                params = {key: values[0] for key, values in
+                          urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).items()}
+                with server._lock:
+                    server.requests += 1
+                latency = float(params.get("latency_ms", 0)) / 1000
+                if latency:
+                    time.sleep(latency)
+                body = server.get_body(params)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self.address = f"127.0.0.1:{self._server.server_address[1]}"
+
+    def get_body(self, params: Dict[str, str]) -> bytes:
+        rows = int(params.get("rows", 1000))
+        width = int(params.get("width", 10))
+        depth = int(params.get("depth", 0))
+        start, end = 0, rows
+        if "page" in params:
+            page_size = int(params.get("page_size", 100))
+            start = min((int(params["page"]) - 1) * page_size, rows)
+            end = min(start + page_size, rows)
+        envelope = params.get("envelope", "1") == "1"
+
+        key = (start, end, width, depth, envelope, rows)
+        body = self._cache.get(key)
+        if body is None:
+            items = get_rows(start, end, width, depth)
+            body = self._cache[key] = json.dumps({"total": rows, "items": items} if envelope else items).encode()
+        return body
+
+    def start(self) -> 'MockServer':
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = MockServer(args.port).start()
+    print(f"serving on http://{server.address}, eg /rows?rows=100&width=5&depth=2")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from typing import Any, Dict, Iterator, List, Optional, Type
+
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Boolean, Field, Float, Integer, String
+
+from rest_db_api.rest_api_adapter import COLUMN_BATCH_SIZE, RestAdapter
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+try:
+    import pandas
+except ImportError:  # pragma: no cover
+    pandas = None
+
+# arrow type of the columns of each field type, anything else is a string
+ARROW_TYPES: Dict[Type[Field], str] = {
+    Integer: "int64",
+    Float: "float64",
+    Boolean: "bool_",
+    String: "string",
+}
+
+
+def open_adapter(uri: str,
+                 base_url: str,
+                 is_https: bool = True,
+                 engine_options: Optional[Dict[str, Any]] = None) -> RestAdapter:
+    return RestAdapter(*RestAdapter.parse_uri(uri), base_url=base_url, is_https=is_https,
+                       engine_options=engine_options)
+
+
+def fetch_columns(uri: str,
+                  base_url: str,
+                  is_https: bool = True,
+                  engine_options: Optional[Dict[str, Any]] = None,
+                  columns: Optional[List[str]] = None,
+                  batch_size: int = COLUMN_BATCH_SIZE) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Yield the whole virtual table ``uri`` as batches of columns, ``{column: [values]}``, without going through
+    SQLite.
+    """
+    adapter = open_adapter(uri, base_url, is_https, engine_options)
+    try:
+        yield from adapter.get_column_batches(columns, batch_size)
+    finally:
+        adapter.close()
+
+
+def get_arrow_schema(adapter: RestAdapter, columns: Optional[List[str]] = None) -> 'pyarrow.Schema':
+    names = columns or [column_name for column_name in adapter.get_columns() if column_name != "rowid"]
+    return pyarrow.schema([
+        (column_name, getattr(pyarrow, ARROW_TYPES.get(type(adapter.get_columns().get(column_name)), "string"))())
+        for column_name in names
+    ])
+
+
+def to_record_batch(batch: Dict[str, List[Any]], schema: 'pyarrow.Schema') -> 'pyarrow.RecordBatch':
+    return pyarrow.RecordBatch.from_arrays([pyarrow.array(batch[field.name], type=field.type) for field in schema],
+                                           schema=schema)
+
+
+def fetch_arrow_batches(uri: str,
+                        base_url: str,
+                        is_https: bool = True,
+                        engine_options: Optional[Dict[str, Any]] = None,
+                        columns: Optional[List[str]] = None,
+                        batch_size: int = COLUMN_BATCH_SIZE) -> Iterator['pyarrow.RecordBatch']:
+    """
+    Yield the whole virtual table ``uri`` as Arrow record batches of up to ``batch_size`` rows.
+    """
+    if pyarrow is None:
+        raise ProgrammingError("`pyarrow` is not installed; install it with `pip install rest-db-api[arrow]`")
+
+    adapter = open_adapter(uri, base_url, is_https, engine_options)
+    try:
+        schema = get_arrow_schema(adapter, columns)
+        for batch in adapter.get_column_batches(schema.names, batch_size):
+            yield to_record_batch(batch, schema)
+    finally:
+        adapter.close()
+
+
+def fetch_arrow(uri: str,
+                base_url: str,
+                is_https: bool = True,
+                engine_options: Optional[Dict[str, Any]] = None,
+                columns: Optional[List[str]] = None,
+                batch_size: int = COLUMN_BATCH_SIZE) -> 'pyarrow.Table':
+    """
+    Return the whole virtual table ``uri`` as an Arrow table.
+    """
+    if pyarrow is None:
+        raise ProgrammingError("`pyarrow` is not installed; install it with `pip install rest-db-api[arrow]`")
+
+    adapter = open_adapter(uri, base_url, is_https, engine_options)
+    try:
+        schema = get_arrow_schema(adapter, columns)
+        batches = [to_record_batch(batch, schema) for batch in adapter.get_column_batches(schema.names, batch_size)]
+    finally:
+        adapter.close()
+    return pyarrow.Table.from_batches(batches, schema=schema)
+
+
+def fetch_dataframe(uri: str,
+                    base_url: str,
+                    is_https: bool = True,
+                    engine_options: Optional[Dict[str, Any]] = None,
+                    columns: Optional[List[str]] = None,
+                    batch_size: int = COLUMN_BATCH_SIZE) -> 'pandas.DataFrame':
+    """
+    Return the whole virtual table ``uri`` as a pandas dataframe, built from Arrow when ``pyarrow`` is installed.
+    """
+    if pandas is None:
+        raise ProgrammingError("`pandas` is not installed; install it with `pip install rest-db-api[pandas]`")
+    if pyarrow is not None:
+        return fetch_arrow(uri, base_url, is_https, engine_options, columns, batch_size).to_pandas()
+
+    data: Dict[str, List[Any]] = {}
+    for batch in fetch_columns(uri, base_url, is_https, engine_options, columns, batch_size):
+        for column_name, values in batch.items():
+            data.setdefault(column_name, []).extend(values)
+    return pandas.DataFrame(data, columns=list(data) or columns)
@@ -0,0 +1,102 @@
+import itertools
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.filters import Equal, Filter
+
+FAN_OUT_OPTION_KEYS = ("headers", "params", "concurrency")
+DEFAULT_FAN_OUT_CONCURRENCY = 4
+
+
+class FanOutRequest(NamedTuple):
+    """
+    The headers and query params of one of the requests of a fanned-out table, and the values it is tagged with.
+    """
+    # tag column -> value
+    tags: Dict[str, str]
+    headers: Dict[str, str]
+    query_params: Dict[str, List[str]]
+
+
+def get_tag_columns(option: Any) -> Dict[str, str]:
+    # a list of names is tagged with columns of the same names
+    if isinstance(option, list):
+        return {name: name for name in option}
+    return dict(option or {})
+
+
+class FanOut(NamedTuple):
+    """
+    The ``fan_out`` table option: headers and query params sent with a single value per request.
+
+    Each value of an ``IN`` list is sent in its own request (every combination, when several names fan out), and
+    the rows are tagged with the values of their request, in the column mapped to the name.
+    """
+    # header name -> tag column
+    headers: Dict[str, str]
+    # query param name -> tag column
+    params: Dict[str, str]
+    concurrency: int = DEFAULT_FAN_OUT_CONCURRENCY
+
+    @classmethod
+    def from_option(cls, option: Any) -> Optional['FanOut']:
+        if not option:
+            return None
+        if not isinstance(option, dict) or not set(option) <= set(FAN_OUT_OPTION_KEYS):
+            raise ProgrammingError(f"Invalid fan_out option; expected an object with the keys"
+                                   f" {list(FAN_OUT_OPTION_KEYS)}; found : {option}")
+        fan_out = cls(
+            headers={name.lower(): column for name, column in get_tag_columns(option.get("headers")).items()},
+            params=get_tag_columns(option.get("params")),
+            concurrency=int(option.get("concurrency", DEFAULT_FAN_OUT_CONCURRENCY)),
+        )
+        if not fan_out.headers and not fan_out.params:
+            raise ProgrammingError(f"Invalid fan_out option; no `headers` or `params`; found : {option}")
+        if fan_out.concurrency < 1:
+            raise ProgrammingError(f"Invalid fan_out option; `concurrency` must be positive; found : {option}")
+        return fan_out
+
+    @property
+    def tag_columns(self) -> List[str]:
+        return [*self.headers.values(), *self.params.values()]
+
+    def get_requests(self,
+                     headers: Dict[str, str],
+                     query_params: Dict[str, List[str]],
+                     bounds: Optional[Dict[str, Filter]] = None) -> List[FanOutRequest]:
+        """
+        Return a request per combination of the values of the fanned-out headers and params.
+
+        Multi-valued headers are joined with commas, as HTTP does; ``=`` conditions on a tag column only keep the
+        requests of that value.
+        """
+        bounds = bounds or {}
+        dimensions = []
+        for header, value in headers.items():
+            column = self.headers.get(header.lower())
+            if column:
+                values = [part.strip() for part in value.split(",") if part.strip()]
+                dimensions.append((column, "header", header, values))
+        for param, values in query_params.items():
+            column = self.params.get(param)
+            if column:
+                dimensions.append((column, "param", param, [str(value) for value in values]))
+
+        for index, (column, kind, name, values) in enumerate(dimensions):
+            filter_ = bounds.get(column)
+            if isinstance(filter_, Equal):
+                dimensions[index] = (column, kind, name, [value for value in values if value == str(filter_.value)])
+
+        requests = []
+        for combination in itertools.product(*[values for *_, values in dimensions]):
+            tags = {}
+            request_headers = dict(headers)
+            request_params = dict(query_params)
+            for (column, kind, name, _), value in zip(dimensions, combination):
+                tags[column] = value
+                if kind == "header":
+                    request_headers[name] = value
+                else:
+                    request_params[name] = [value]
+            requests.append(FanOutRequest(tags, request_headers, request_params))
+        return requests
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import itertools
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Iterable, Iterator, Optional, TypeVar
+
+from shillelagh.exceptions import ProgrammingError
+
+_logger = logging.getLogger(__name__)
+
+FETCH_ENGINES = ("threads", "async")
+# requests in flight at once, across every query using the async engine
+DEFAULT_MAX_CONCURRENCY = 16
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class AsyncFetcher:
+    """
+    Runs fetches concurrently from an event loop running in a background thread.
+
+    A semaphore bounds the requests in flight across every adapter sharing the fetcher, so that a dashboard firing
+    many fan-out queries at once doesn't open unbounded connections. Requests are still sent by the shared
+    ``requests`` session, from the loop's executor, so that they go through the response cache and connection pool.
+
+    A call holding a permit doesn't wait for more: maps started from within a call (eg the pages of a fanned-out
+    request) run inline, as waiting on the semaphore could deadlock once the outer calls hold every permit.
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        if max_concurrency < 1:
+            raise ProgrammingError(f"`max_concurrency` must be positive; found : {max_concurrency}")
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="rest-fetch")
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="rest-fetch-loop", daemon=True)
+        self._thread.start()
+        self._local = threading.local()
+        # created on the loop, older Pythons bind semaphores to the loop they are created on
+        self._semaphore: asyncio.Semaphore = self._submit(self._create_semaphore()).result()
+
+    async def _create_semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def _submit(self, coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def _run(self, call: Callable[[], R]) -> R:
+        async with self._semaphore:
+            return await self._loop.run_in_executor(None, functools.partial(self._call, call))
+
+    def _call(self, call: Callable[[], R]) -> R:
+        self._local.holds_permit = True
+        try:
+            return call()
+        finally:
+            self._local.holds_permit = False
+
+    def map(self, call: Callable[[T], R], items: Iterable[T], concurrency: int) -> Iterator[R]:
+        """
+        Yield ``call(item)`` for every item in order, with at most ``concurrency`` of them in flight.
+
+        Items are only submitted as earlier ones are consumed, so closing the iterator early stops fetching.
+        """
+        if getattr(self._local, "holds_permit", False):
+            yield from map(call, items)
+            return
+
+        items = iter(items)
+        futures: Deque[Future] = deque(
+            self._submit(self._run(functools.partial(call, item))) for item in itertools.islice(items, concurrency)
+        )
+        try:
+            while futures:
+                result = futures.popleft().result()
+                for item in itertools.islice(items, 1):
+                    futures.append(self._submit(self._run(functools.partial(call, item))))
+                yield result
+        finally:
+            # cancelled from the loop, once their tasks are created: cancelling them from here could drop coroutines
+            # that were never scheduled
+            for future in futures:
+                self._loop.call_soon_threadsafe(future.cancel)
+
+    async def _cancel_tasks(self) -> None:
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        self._submit(self._cancel_tasks()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._executor.shutdown(wait=False)
+
+
+_fetchers: Dict[int, AsyncFetcher] = {}
+_fetchers_lock = threading.Lock()
+
+
+def get_fetcher(engine: Optional[str], max_concurrency: Optional[int] = None) -> Optional[AsyncFetcher]:
+    """
+    Return the async fetcher shared by the adapters using ``max_concurrency``, or ``None`` for the default engine,
+    which fetches with a thread pool per query.
+    """
+    engine = engine or "threads"
+    if engine not in FETCH_ENGINES:
+        raise ProgrammingError(f"Unsupported fetch engine : {engine}; supported engines : {list(FETCH_ENGINES)}")
+    if engine == "threads":
+        return None
+
+    max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY
+    with _fetchers_lock:
+        fetcher = _fetchers.get(max_concurrency)
+        if fetcher is None:
+            _logger.info("starting async fetcher; max_concurrency : %s", max_concurrency)
+            fetcher = _fetchers[max_concurrency] = AsyncFetcher(max_concurrency)
+    return fetcher
+
+
+def close_fetchers() -> None:
+    """
+    Stop every shared async fetcher.
+    """
+    with _fetchers_lock:
+        for fetcher in _fetchers.values():
+            fetcher.close()
+        _fetchers.clear()
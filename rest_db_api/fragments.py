@@ -0,0 +1,98 @@
+import copy
+import functools
+import re
+from typing import Any, List, Optional, Tuple
+
+from jsonpath import JSONPath
+
+# compiled fragments kept around, most virtual tables of a deployment share a handful of fragments
+FRAGMENT_CACHE_SIZE = 256
+
+# a chain of keys, eg ``.data`` or ``['line items']``
+KEY_PATTERN = re.compile(r"\.([A-Za-z_][\w-]*)|\['([^']*)'\]|\[\"([^\"]*)\"\]")
+
+
+def parse_simple_path(fragment: str) -> Optional[Tuple[List[str], bool]]:
+    """
+    Return the keys of a simple fragment (a chain of keys, like ``$.meta.total`` or ``$.data.items[*]``), and
+    whether it ends with ``[*]``.
+
+    ``None`` is returned for anything else (filters, recursive descent, slices...), which needs the full
+    JSONPath engine.
+    """
+    if not fragment.startswith("$"):
+        return None
+
+    is_wildcard = fragment.endswith("[*]")
+    path = fragment[1:-3] if is_wildcard else fragment[1:]
+    keys = []
+    position = 0
+    while position < len(path):
+        match = KEY_PATTERN.match(path, position)
+        if not match:
+            return None
+        keys.append(next(group for group in match.groups() if group is not None))
+        position = match.end()
+    return keys, is_wildcard
+
+
+def parse_simple_fragment(fragment: str) -> Optional[List[str]]:
+    """
+    Return the keys leading to the array of a simple fragment, like ``$[*]`` or ``$.data.items[*]``.
+
+    ``None`` is returned for anything else (filters, recursive descent, slices...), which needs the full
+    JSONPath engine.
+    """
+    simple_path = parse_simple_path(fragment)
+    if simple_path is None or not simple_path[1]:
+        return None
+    return simple_path[0]
+
+
+class CompiledFragment:
+    """
+    A fragment parsed once, evaluated with the same results as ``JSONPath(fragment).parse``.
+
+    Simple fragments walk the payload directly; the others are evaluated by the JSONPath engine.
+    """
+
+    def __init__(self, fragment: str):
+        self.fragment = fragment
+        simple_path = parse_simple_path(fragment)
+        self.is_simple = simple_path is not None
+        self.keys, self.is_wildcard = simple_path if simple_path else ([], False)
+        self._jsonpath = None if self.is_simple else JSONPath(fragment)
+
+    def parse(self, payload: Any) -> List[Any]:
+        """
+        Return the values matched in ``payload``. An array matched by a simple fragment is returned as is, not
+        copied.
+        """
+        if not isinstance(payload, (list, dict)):
+            raise TypeError("obj must be a list or a dict.")
+
+        if not self.is_simple:
+            # the engine keeps its results on the instance, a shallow copy keeps the cached one thread safe
+            return copy.copy(self._jsonpath).parse(payload)
+
+        value = payload
+        for key in self.keys:
+            if not isinstance(value, dict) or key not in value:
+                return []
+            value = value[key]
+
+        if not self.is_wildcard:
+            return [value]
+        if isinstance(value, list):
+            return value
+        if isinstance(value, dict):
+            return list(value.values())
+        return []
+
+
+@functools.lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def compile_fragment(fragment: str) -> CompiledFragment:
+    """
+    Return the compiled ``fragment``, compiling it on first use.
+    """
+    return CompiledFragment(fragment)
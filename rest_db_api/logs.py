@@ -0,0 +1,125 @@
+import json
+import logging
+import re
+from typing import Any, Collection, Dict, Iterable, Iterator, Mapping, Tuple
+
+# headers and query params whose values are credentials, they are never logged
+SENSITIVE_NAME_PATTERN = re.compile(r"auth|token|secret|passw|cookie|session|signature|api[-_]?key|^key$",
+                                    re.IGNORECASE)
+REDACTED = "***"
+# characters of request bodies and SQL statements kept in logs
+MAX_PAYLOAD_LOG_LENGTH = 1000
+
+_encoder = json.JSONEncoder(default=str)
+
+
+def is_sensitive(name: str, sensitive_names: Collection[str] = ()) -> bool:
+    return name.lower() in sensitive_names or SENSITIVE_NAME_PATTERN.search(name) is not None
+
+
+def redact(values: Mapping[str, Any], sensitive_names: Collection[str] = ()) -> Dict[str, Any]:
+    """
+    Return a copy of headers or query params, without the values of credentials.
+
+    ``sensitive_names`` (lower case) are redacted along with the names that look like credentials.
+    """
+    return {name: REDACTED if is_sensitive(name, sensitive_names) else value for name, value in values.items()}
+
+
+# ``header1=name:value`` params of virtual tables, and ``header=name:value`` ones added by the SQL rewrite
+URI_HEADER_PATTERN = re.compile(r"(header\d*=)([^:&#\"]+):([^&#\"]*)", re.IGNORECASE)
+URI_PARAM_PATTERN = re.compile(r"([?&])([^=&#\"]+)=([^&#\"]*)")
+# ``HEADER_COOKIE = '...'`` conditions of statements
+# closing quotes are optional, values may be cut by the truncation of the text
+CONDITION_PATTERN = re.compile(r"(\b\w+\s*=\s*)'((?:[^']|'')*)'?")
+JSON_VALUE_PATTERN = re.compile(r'("([^"]+)"\s*:\s*)"((?:[^"\\]|\\.)*)"?')
+
+
+def redact_text(text: str) -> str:
+    """
+    Redact the credentials of a URI, statement or JSON document: header params of virtual tables, query params,
+    conditions and keys whose names look like credentials.
+    """
+    # patterns are only run on texts that may match them
+    if "=" in text:
+        text = URI_HEADER_PATTERN.sub(
+            lambda match: f"{match[1]}{match[2]}:{REDACTED if is_sensitive(match[2]) else match[3]}", text)
+        text = URI_PARAM_PATTERN.sub(
+            lambda match: f"{match[1]}{match[2]}={REDACTED if is_sensitive(match[2]) else match[3]}", text)
+        if "'" in text:
+            text = CONDITION_PATTERN.sub(
+                lambda match: f"{match[1]}'{REDACTED}'" if is_sensitive(match[1].split("=")[0].strip()) else match[0],
+                text)
+    if '"' in text:
+        text = JSON_VALUE_PATTERN.sub(
+            lambda match: f'{match[1]}"{REDACTED}"' if is_sensitive(match[2]) else match[0], text)
+    return text
+
+
+def truncate(text: str, max_length: int = MAX_PAYLOAD_LOG_LENGTH) -> str:
+    """
+    Cap ``text`` to ``max_length`` characters, and redact what is left.
+    """
+    if len(text) <= max_length:
+        return redact_text(text)
+    return f"{redact_text(text[:max_length])}... ({len(text)} characters)"
+
+
+def dump_head(value: Any, max_length: int) -> Tuple[str, bool]:
+    """
+    Serialize the first ``max_length`` characters of ``value`` as JSON, without serializing the rest of a large body.
+
+    Returns the text and whether it was cut.
+    """
+    chunks = []
+    length = 0
+    for chunk in _encoder.iterencode(value):
+        chunks.append(chunk)
+        length += len(chunk)
+        if length > max_length:
+            return "".join(chunks)[:max_length], True
+    return "".join(chunks), False
+
+
+class Redacted:
+    """
+    Headers or query params to log, redacted only if the record is emitted.
+    """
+    __slots__ = ("values", "sensitive_names")
+
+    def __init__(self, values: Mapping[str, Any], sensitive_names: Collection[str] = ()):
+        self.values = values
+        self.sensitive_names = sensitive_names
+
+    def __str__(self) -> str:
+        return str(redact(self.values, self.sensitive_names))
+
+
+class Payload:
+    """
+    A request body, URI or statement to log, serialized, redacted and truncated to ``max_length`` only if the record
+    is emitted.
+    """
+    __slots__ = ("value", "max_length")
+
+    def __init__(self, value: Any, max_length: int = MAX_PAYLOAD_LOG_LENGTH):
+        self.value = value
+        self.max_length = max_length
+
+    def __str__(self) -> str:
+        if isinstance(self.value, str):
+            return truncate(self.value, self.max_length)
+        text, is_cut = dump_head(self.value, self.max_length)
+        return f"{redact_text(text)}... (truncated)" if is_cut else redact_text(text)
+
+
+def log_items(items: Iterable[Any], logger: logging.Logger, max_length: int = MAX_PAYLOAD_LOG_LENGTH) -> Iterator[Any]:
+    """
+    Yield ``items``, logging each of them at DEBUG level.
+
+    Only wrapped around the rows while DEBUG is enabled, so that materializing rows doesn't check the level for every
+    row otherwise.
+    """
+    for item in items:
+        logger.debug("row : %s", Payload(item, max_length))
+        yield item
@@ -0,0 +1,114 @@
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from shillelagh.typing import Row
+
+_logger = logging.getLogger(__name__)
+
+# statements whose probed keys are kept by each key index, to batch them when the statement is run again
+STATEMENT_KEYS_CACHE_SIZE = 32
+
+_statement_ids = itertools.count(1)
+_statements = threading.local()
+
+
+class Statement(NamedTuple):
+    id: int
+    operation: str
+
+
+def start_statement(operation: str) -> None:
+    """
+    Mark the start of ``operation`` on the current thread; key indexes are kept for the probes of a statement.
+    """
+    _statements.current = Statement(next(_statement_ids), operation)
+
+
+def get_statement() -> Optional[Statement]:
+    """
+    Return the statement run by the current thread, or ``None`` outside of the dialect.
+    """
+    return getattr(_statements, "current", None)
+
+
+def get_index_key(value: Any) -> str:
+    # SQLite compares ``1`` and ``1.0`` equal, and the API may return keys as strings or as numbers
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class KeyIndex:
+    """
+    The rows fetched for the probes of a column (SQLite probes the inner table of a join once per outer row), by
+    key, so that repeated keys are answered from memory.
+
+    The index is kept for the probes of a statement, started by ``start_statement``; without a statement (eg when
+    the adapter is used outside of the dialect) nothing is kept between probes. SQLite probes one key at a time, so
+    the keys of a statement can't be known before its first probe: the keys probed by the last run of the same
+    statement are fetched along with its first missed keys, in batches, since a query re-run (eg by a dashboard)
+    probes the same keys again. The first run of a statement fetches a key per missed probe.
+    """
+
+    def __init__(self, column_name: str, batch_size: int):
+        self.column_name = column_name
+        self.batch_size = batch_size
+        self._rows: Dict[str, List[Row]] = {}
+        # keys probed by the current statement, and by the last run of each statement, in probe order
+        self._probed_keys: Dict[str, Any] = {}
+        self._previous_keys: Dict[str, Any] = {}
+        self._statement_keys: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._statement: Optional[Statement] = None
+
+    def probe(self, value: Any) -> Optional[List[Row]]:
+        """
+        Return the rows of ``value``, or ``None`` when they have to be fetched.
+        """
+        statement = get_statement()
+        if statement is None or statement != self._statement:
+            self._start(statement)
+
+        self._probed_keys[get_index_key(value)] = value
+        return self.get(value)
+
+    def _start(self, statement: Optional[Statement]) -> None:
+        if self._statement is not None and self._probed_keys:
+            self._statement_keys[self._statement.operation] = self._probed_keys
+            self._statement_keys.move_to_end(self._statement.operation)
+            while len(self._statement_keys) > STATEMENT_KEYS_CACHE_SIZE:
+                self._statement_keys.popitem(last=False)
+        self._previous_keys = self._statement_keys.get(statement.operation, {}) if statement else {}
+        self._probed_keys = {}
+        self._rows = {}
+        self._statement = statement
+
+    def get(self, value: Any) -> Optional[List[Row]]:
+        return self._rows.get(get_index_key(value))
+
+    def get_batch(self, value: Any) -> List[Any]:
+        """
+        Return the values to fetch along with ``value``: keys of the last run of the statement not fetched yet.
+        """
+        key = get_index_key(value)
+        batch = [value]
+        for previous_key, previous_value in self._previous_keys.items():
+            if len(batch) >= self.batch_size:
+                break
+            if previous_key != key and previous_key not in self._rows:
+                batch.append(previous_value)
+        return batch
+
+    def add(self, values: Iterable[Any], rows: Iterable[Row]) -> None:
+        """
+        Index the ``rows`` fetched for ``values``; values without rows are indexed as having none.
+        """
+        for value in values:
+            self._rows[get_index_key(value)] = []
+        for row in rows:
+            key = get_index_key(row.get(self.column_name))
+            if key in self._rows:
+                self._rows[key].append(row)
+        _logger.debug("indexed lookup rows; column : %s; keys : %s", self.column_name, len(self._rows))
@@ -0,0 +1,259 @@
+import contextlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import requests
+
+_logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class QueryMetrics:
+    """
+    Timings and counters of one call of the adapter, handed to the metrics hooks once the call is done.
+
+    ``phases`` maps a phase to the seconds spent in it: ``rewrite`` (of the SQL), ``request`` (upstream round trips),
+    ``cache`` (responses served by the cache), ``decode`` (JSON), ``jsonpath``, ``materialize`` (flattening objects
+    into rows, and decoding streamed responses) and ``sqlite`` (time between rows, spent by SQLite and the caller).
+    Pages fetched concurrently add up, so the phases may sum to more than ``duration``.
+    """
+    enabled = True
+
+    def __init__(self, operation: str, uri: str):
+        self.operation = operation
+        self.uri = uri
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.requests = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes = 0
+        self.rows = 0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self._start = time.perf_counter()
+        # pages are fetched from worker threads
+        self._lock = threading.Lock()
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] += seconds
+
+    def time(self, phase: str, call: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        try:
+            return call()
+        finally:
+            self.add_phase(phase, time.perf_counter() - start)
+
+    def time_response(self, send: Callable[[], requests.Response], is_streamed: bool = False) -> requests.Response:
+        """
+        Send a request, adding its time to the ``cache`` or ``request`` phase.
+        """
+        start = time.perf_counter()
+        response = send()
+        self.add_phase("cache" if getattr(response, "from_cache", False) else "request", time.perf_counter() - start)
+        self.add_response(response, is_streamed)
+        return response
+
+    def add_response(self, response: requests.Response, is_streamed: bool = False) -> None:
+        is_cached = getattr(response, "from_cache", False)
+        # reading the content of a streamed response would download it
+        size = int(response.headers.get("Content-Length") or 0) if is_streamed else len(response.content or b"")
+        with self._lock:
+            self.requests += 1
+            self.bytes += size
+            if is_cached:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def time_rows(self, rows: Iterator[T], phase: str) -> Iterator[T]:
+        """
+        Yield ``rows``, adding the time spent producing them to ``phase``.
+        """
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield row
+        finally:
+            self.add_phase(phase, elapsed)
+            close = getattr(rows, "close", None)
+            if close is not None:
+                close()
+
+    def track(self, rows: Iterator[T]) -> Iterator[T]:
+        """
+        Yield the rows of a query, counting them, then emit the metrics once the query stops reading.
+
+        The time between rows is spent by SQLite (and the caller), it is added to the ``sqlite`` phase.
+        """
+        inside = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    inside += time.perf_counter() - start
+                self.rows += 1
+                yield row
+        except Exception as exception:
+            self.error = repr(exception)
+            raise
+        finally:
+            rows.close()
+            self.duration = time.perf_counter() - self._start
+            self.add_phase("sqlite", max(self.duration - inside, 0.0))
+            emit(self)
+
+    @contextlib.contextmanager
+    def measure(self) -> Iterator[None]:
+        """
+        Time the block of a call that doesn't yield rows, emitting the metrics at its end.
+        """
+        try:
+            yield
+        except Exception as exception:
+            self.error = repr(exception)
+            raise
+        finally:
+            self.duration = time.perf_counter() - self._start
+            emit(self)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "operation": self.operation,
+            "uri": self.uri,
+            "duration": self.duration,
+            "phases": dict(self.phases),
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "bytes": self.bytes,
+            "rows": self.rows,
+            "error": self.error,
+        }
+
+
+class DisabledMetrics(QueryMetrics):
+    """
+    Stands in for the metrics of calls while no hook is registered, doing nothing.
+    """
+    enabled = False
+
+    def __init__(self):
+        super().__init__("", "")
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        pass
+
+    def time(self, phase: str, call: Callable[[], T]) -> T:
+        return call()
+
+    def time_response(self, send: Callable[[], requests.Response], is_streamed: bool = False) -> requests.Response:
+        return send()
+
+    def add_response(self, response: requests.Response, is_streamed: bool = False) -> None:
+        pass
+
+    def time_rows(self, rows: Iterator[T], phase: str) -> Iterator[T]:
+        return rows
+
+    def track(self, rows: Iterator[T]) -> Iterator[T]:
+        return rows
+
+    def measure(self) -> ContextManager[None]:
+        return contextlib.nullcontext()
+
+
+NO_METRICS = DisabledMetrics()
+
+MetricsHook = Callable[[QueryMetrics], None]
+_hooks: List[MetricsHook] = []
+_hooks_lock = threading.Lock()
+
+
+def add_metrics_hook(hook: MetricsHook) -> None:
+    """
+    Call ``hook`` with the ``QueryMetrics`` of every call of the adapters: ``get_data``, ``_set_columns`` (schema
+    discovery) and ``parse_operation_and_uri``.
+
+    Hooks run on the thread of the query, they should hand the metrics over (eg to a Prometheus registry, an
+    OpenTelemetry span or a log) rather than do slow work.
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+
+def remove_metrics_hook(hook: MetricsHook) -> None:
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def clear_metrics_hooks() -> None:
+    with _hooks_lock:
+        _hooks.clear()
+
+
+def start_metrics(operation: str, uri: str) -> QueryMetrics:
+    """
+    Return the metrics of a new call, or ``NO_METRICS`` when no hook is registered.
+    """
+    if not _hooks:
+        return NO_METRICS
+    return QueryMetrics(operation, uri)
+
+
+def emit(metrics: QueryMetrics) -> None:
+    if not metrics.enabled:
+        return
+    for hook in list(_hooks):
+        try:
+            hook(metrics)
+        except Exception as exception:
+            # metrics must never fail a query
+            _logger.error("metrics hook failed; hook : %s; operation : %s", hook, metrics.operation, exc_info=exception)
+
+
+class MetricsRegistry:
+    """
+    A metrics hook keeping Prometheus-style counters, summed per operation.
+
+        registry = MetricsRegistry()
+        add_metrics_hook(registry)
+        registry.collect()
+        # {("get_data", "calls"): 3, ("get_data", "rows"): 1200, ("get_data", "seconds_request"): 0.8, ...}
+    """
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def __call__(self, metrics: QueryMetrics) -> None:
+        operation = metrics.operation
+        with self._lock:
+            self._counters[(operation, "calls")] += 1
+            self._counters[(operation, "errors")] += metrics.error is not None
+            self._counters[(operation, "seconds")] += metrics.duration
+            for name in ("requests", "cache_hits", "cache_misses", "bytes", "rows"):
+                self._counters[(operation, name)] += getattr(metrics, name)
+            for phase, seconds in metrics.phases.items():
+                self._counters[(operation, f"seconds_{phase}")] += seconds
+
+    def collect(self) -> Dict[Tuple[str, str], float]:
+        with self._lock:
+            return dict(self._counters)
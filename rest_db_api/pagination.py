@@ -0,0 +1,228 @@
+import abc
+import logging
+import math
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type, Union
+
+import requests
+from shillelagh.exceptions import ProgrammingError
+
+from rest_db_api.fragments import compile_fragment
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+
+# table options that paginators fall back to, when they are not set in the pagination config
+SHARED_OPTIONS = ("limit_param", "offset_param", "page_param", "page_size_param", "page_start")
+
+
+class PageRequest(NamedTuple):
+    """
+    The request for a single page; ``url`` is ``None`` for the virtual table's own URL.
+    """
+    url: Optional[str]
+    params: Dict[str, Any]
+
+
+class Paginator(abc.ABC):
+    """
+    Builds the request of each page of a paginated virtual table.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.page_size = int(config.get("page_size", DEFAULT_PAGE_SIZE))
+        self.max_pages = int(config.get("max_pages", 0)) or None
+        self.total_path: Optional[str] = config.get("total_path")
+        self.total_pages_path: Optional[str] = config.get("total_pages_path")
+        self.concurrency = int(config.get("concurrency", DEFAULT_CONCURRENCY))
+
+    def get_totals(self, payload: Any) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Read the total number of rows and of pages from a page, when their JSONPaths are configured.
+        """
+        total_rows = total_pages = None
+        if self.total_path:
+            values = compile_fragment(self.total_path).parse(payload)
+            total_rows = int(values[0]) if values and values[0] is not None else None
+        if self.total_pages_path:
+            values = compile_fragment(self.total_pages_path).parse(payload)
+            total_pages = int(values[0]) if values and values[0] is not None else None
+
+        if total_pages is None and total_rows is not None:
+            total_pages = math.ceil(total_rows / self.page_size)
+        return total_rows, total_pages
+
+    @abc.abstractmethod
+    def get_first_page(self, offset: int) -> Tuple[PageRequest, int]:
+        """
+        Return the request of the page holding row ``offset``, and the number of rows to skip in it.
+        """
+
+    @abc.abstractmethod
+    def get_next_page(self,
+                      page: PageRequest,
+                      response: requests.Response,
+                      payload: Any,
+                      num_rows: int) -> Optional[PageRequest]:
+        """
+        Return the request of the page following ``page``, or ``None`` if it was the last one.
+        """
+
+    def get_remaining_pages(self, page: PageRequest, payload: Any, num_rows: int) -> Optional[List[PageRequest]]:
+        """
+        Return the requests of all the pages after ``page``, if the totals in its payload allow computing them.
+
+        Pages known up front can be fetched concurrently; ``None`` means they have to be followed one by one.
+        """
+        return None
+
+
+class OffsetPaginator(Paginator):
+    """
+    Pages addressed by ``limit``/``offset`` style params.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.limit_param = config.get("limit_param", "limit")
+        self.offset_param = config.get("offset_param", "offset")
+
+    def get_first_page(self, offset: int) -> Tuple[PageRequest, int]:
+        return PageRequest(None, {self.limit_param: self.page_size, self.offset_param: offset}), 0
+
+    def get_next_page(self, page, response, payload, num_rows):
+        if num_rows < self.page_size:
+            return None
+        return PageRequest(None, {**page.params, self.offset_param: page.params[self.offset_param] + num_rows})
+
+    def get_remaining_pages(self, page, payload, num_rows):
+        total_rows, total_pages = self.get_totals(payload)
+        if total_rows is None and total_pages is not None:
+            total_rows = total_pages * self.page_size
+        if total_rows is None:
+            return None
+        if num_rows < self.page_size:
+            return []
+
+        start = page.params[self.offset_param] + self.page_size
+        return [
+            PageRequest(None, {**page.params, self.offset_param: offset})
+            for offset in range(start, total_rows, self.page_size)
+        ]
+
+
+class PageNumberPaginator(Paginator):
+    """
+    Pages addressed by ``page``/``size`` style params.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.page_param = config.get("page_param", "page")
+        self.page_size_param = config.get("page_size_param", "size")
+        self.page_start = int(config.get("page_start", 1))
+
+    def get_first_page(self, offset: int) -> Tuple[PageRequest, int]:
+        page_number = self.page_start + offset // self.page_size
+        return PageRequest(None, {self.page_param: page_number, self.page_size_param: self.page_size}), \
+            offset % self.page_size
+
+    def get_next_page(self, page, response, payload, num_rows):
+        if num_rows < self.page_size:
+            return None
+        return PageRequest(None, {**page.params, self.page_param: page.params[self.page_param] + 1})
+
+    def get_remaining_pages(self, page, payload, num_rows):
+        _, total_pages = self.get_totals(payload)
+        if total_pages is None:
+            return None
+        if num_rows < self.page_size:
+            return []
+
+        last_page = self.page_start + total_pages - 1
+        return [
+            PageRequest(None, {**page.params, self.page_param: page_number})
+            for page_number in range(page.params[self.page_param] + 1, last_page + 1)
+        ]
+
+
+class CursorPaginator(Paginator):
+    """
+    Pages chained by a cursor found in each response.
+
+    The cursor is read with the ``cursor_path`` JSONPath and sent back in ``cursor_param``. A cursor that is
+    an absolute URL is followed as is.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        if "cursor_path" not in config:
+            raise ProgrammingError("`cursor_path` is required for cursor pagination")
+        self.cursor_path = config["cursor_path"]
+        self.cursor_param = config.get("cursor_param", "cursor")
+        self.page_size_param = config.get("page_size_param")
+
+    def get_first_page(self, offset: int) -> Tuple[PageRequest, int]:
+        params = {self.page_size_param: self.page_size} if self.page_size_param else {}
+        return PageRequest(None, params), offset
+
+    def get_next_page(self, page, response, payload, num_rows):
+        cursors = compile_fragment(self.cursor_path).parse(payload)
+        cursor = cursors[0] if cursors else None
+        if not cursor or not num_rows:
+            return None
+        if isinstance(cursor, str) and cursor.startswith(("http://", "https://")):
+            return PageRequest(cursor, {})
+        return PageRequest(page.url, {**page.params, self.cursor_param: cursor})
+
+
+class LinkHeaderPaginator(Paginator):
+    """
+    Pages chained by the ``rel="next"`` URL of RFC 5988 ``Link`` headers.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.page_size_param = config.get("page_size_param")
+
+    def get_first_page(self, offset: int) -> Tuple[PageRequest, int]:
+        params = {self.page_size_param: self.page_size} if self.page_size_param else {}
+        return PageRequest(None, params), offset
+
+    def get_next_page(self, page, response, payload, num_rows):
+        next_url = response.links.get("next", {}).get("url")
+        if not next_url or not num_rows:
+            return None
+        return PageRequest(next_url, {})
+
+
+PAGINATORS: Dict[str, Type[Paginator]] = {
+    "offset": OffsetPaginator,
+    "page": PageNumberPaginator,
+    "cursor": CursorPaginator,
+    "link": LinkHeaderPaginator,
+}
+
+
+def get_paginator(options: Dict[str, Any]) -> Optional[Paginator]:
+    """
+    Build the paginator declared in the ``pagination`` option of a virtual table.
+
+    ``pagination`` is either the pagination type, or a config dict with a ``type`` key.
+    """
+    pagination: Union[str, Dict[str, Any], None] = options.get("pagination")
+    if not pagination:
+        return None
+    if isinstance(pagination, str):
+        pagination = {"type": pagination}
+
+    config = {key: options[key] for key in SHARED_OPTIONS if key in options}
+    config.update(pagination)
+
+    pagination_type = config.get("type")
+    if pagination_type not in PAGINATORS:
+        raise ProgrammingError(f"Unsupported pagination type : {pagination_type}; "
+                               f"supported types : {sorted(PAGINATORS)}")
+
+    return PAGINATORS[pagination_type](config)
@@ -0,0 +1,235 @@
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Field, Float, Integer, Order
+from shillelagh.filters import Equal, Filter, Range
+from shillelagh.typing import RequestedOrder, Row
+
+COLUMN_FILTER_KEYS = ("eq", "from", "to", "exact", "in", "separator", "batch_size")
+# keys sent in a single request by an ``in`` param
+DEFAULT_BATCH_SIZE = 50
+
+
+class ColumnFilter(NamedTuple):
+    """
+    The upstream params that filters on a column are sent as, declared in the ``filters`` table option.
+
+    ``from``/``to`` bounds are sent as is, and are expected to be inclusive. ``exact`` tells whether the API
+    filters exactly like SQL would; when it does, SQLite doesn't filter the rows again. ``in`` is a param taking
+    up to ``batch_size`` values joined with ``separator``, eg ``ids=1,2,3``, used to look up the keys of a join.
+    """
+    eq_param: Optional[str] = None
+    from_param: Optional[str] = None
+    to_param: Optional[str] = None
+    exact: bool = True
+    in_param: Optional[str] = None
+    separator: str = ","
+    batch_size: int = DEFAULT_BATCH_SIZE
+
+    @classmethod
+    def from_option(cls, column_name: str, option: Any) -> 'ColumnFilter':
+        if isinstance(option, str):
+            return cls(eq_param=option)
+        if not isinstance(option, dict) or not set(option) <= set(COLUMN_FILTER_KEYS):
+            raise ProgrammingError(f"Invalid filter of column : {column_name}; expected a param name, or an object"
+                                   f" with the keys {list(COLUMN_FILTER_KEYS)}; found : {option}")
+        column_filter = cls(option.get("eq"), option.get("from"), option.get("to"), bool(option.get("exact", True)),
+                            option.get("in"), option.get("separator", ","),
+                            int(option.get("batch_size", DEFAULT_BATCH_SIZE)))
+        if not column_filter.get_filters():
+            raise ProgrammingError(f"Invalid filter of column : {column_name}; no `eq`, `in`, `from` or `to` param")
+        if column_filter.batch_size < 1:
+            raise ProgrammingError(f"Invalid filter of column : {column_name}; `batch_size` must be positive;"
+                                   f" found : {column_filter.batch_size}")
+        return column_filter
+
+    def get_filters(self) -> List[Type[Filter]]:
+        filters: List[Type[Filter]] = []
+        if self.eq_param or self.in_param:
+            filters.append(Equal)
+        if self.from_param or self.to_param:
+            filters.append(Range)
+        return filters
+
+    def get_in_params(self, values: List[Any]) -> Dict[str, Any]:
+        return {self.in_param: self.separator.join(str(value) for value in values)}
+
+    def get_params(self, filter_: Filter) -> Tuple[Dict[str, Any], bool]:
+        """
+        Return the params sending ``filter_`` upstream, and whether they apply it exactly.
+        """
+        if isinstance(filter_, Range) and (self.eq_param or self.in_param) and filter_.start is not None \
+                and filter_.start == filter_.end and filter_.include_start and filter_.include_end:
+            filter_ = Equal(filter_.start)
+
+        if isinstance(filter_, Equal):
+            if self.eq_param:
+                return {self.eq_param: filter_.value}, self.exact
+            if self.in_param:
+                return self.get_in_params([filter_.value]), self.exact
+            filter_ = Range(filter_.value, filter_.value, True, True)
+
+        if not isinstance(filter_, Range):
+            return {}, False
+
+        params: Dict[str, Any] = {}
+        is_exact = self.exact
+        for param, value, include in [(self.from_param, filter_.start, filter_.include_start),
+                                      (self.to_param, filter_.end, filter_.include_end)]:
+            if value is None:
+                continue
+            if param:
+                params[param] = value
+            # exclusive bounds are sent as inclusive ones, the rows on the bound are dropped here
+            is_exact = is_exact and bool(param) and include
+        return params, is_exact
+
+
+def get_column_filters(options: Dict[str, Any], columns: Dict[str, Field]) -> Dict[str, ColumnFilter]:
+    """
+    Parse the ``filters`` table option, a ``{column: param or {"eq", "from", "to", "exact"}}`` mapping.
+    """
+    column_filters = {}
+    for column_name, option in (options.get("filters") or {}).items():
+        if column_name not in columns:
+            raise ProgrammingError(f"Filter declared on an unknown column : {column_name};"
+                                   f" columns : {sorted(columns)}")
+        column_filters[column_name] = ColumnFilter.from_option(column_name, option)
+    return column_filters
+
+
+def get_filter_params(column_filters: Dict[str, ColumnFilter],
+                      bounds: Dict[str, Filter]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Return the upstream params of ``bounds``, and whether the API applies all of them exactly.
+    """
+    params: Dict[str, Any] = {}
+    is_exact = True
+    for column_name, filter_ in bounds.items():
+        column_filter = column_filters.get(column_name)
+        if column_filter is None:
+            is_exact = False
+            continue
+        filter_params, is_filter_exact = column_filter.get_params(filter_)
+        params.update(filter_params)
+        is_exact = is_exact and is_filter_exact
+    return params, is_exact
+
+
+def coerce(value: Any, field: Optional[Field]) -> Any:
+    """
+    Convert the numbers an API returns as strings (or integers, for a float column) to the type of their column,
+    as SQLite does when comparing them; other values are returned as is.
+    """
+    if isinstance(field, Integer) and isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    if isinstance(field, Float) and isinstance(value, (str, int)) and not isinstance(value, bool):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+
+def matches(filter_: Filter, value: Any, field: Optional[Field] = None) -> bool:
+    if value is None:
+        return False
+    try:
+        return filter_.check(coerce(value, field))
+    except TypeError:
+        # SQLite filters the rows of inexact columns again, and compares the values of another type than the
+        # column's; rows of exact columns aren't checked again, so they can't be let through
+        return field is None or not field.exact
+
+
+def filter_rows(rows: Iterable[Row],
+                bounds: Dict[str, Filter],
+                columns: Optional[Dict[str, Field]] = None) -> Iterator[Row]:
+    """
+    Drop the rows not matching ``bounds``, so that ``LIMIT``/``OFFSET`` can be applied to the remaining ones.
+    """
+    checks = [(column_name, filter_, (columns or {}).get(column_name)) for column_name, filter_ in bounds.items()]
+    for row in rows:
+        if all(matches(filter_, row.get(column_name), field) for column_name, filter_, field in checks):
+            yield row
+
+
+class SortParam(NamedTuple):
+    """
+    The upstream param that ``ORDER BY`` is sent as, declared in the ``sort`` table option.
+
+    Each ordered column is rendered with ``format``, eg ``date,desc`` or, with ``{direction}{field}`` and
+    ``desc: "-"``, ``-date``. Several columns are joined with ``separator``, or sent as a repeated param.
+    """
+    param: str
+    # column -> upstream field
+    fields: Dict[str, str]
+    format: str = "{field},{direction}"
+    asc: str = "asc"
+    desc: str = "desc"
+    separator: Optional[str] = None
+
+    @classmethod
+    def from_option(cls, option: Any, columns: Dict[str, Field]) -> Optional['SortParam']:
+        if not option:
+            return None
+        if not isinstance(option, dict) or "param" not in option or not option.get("columns"):
+            raise ProgrammingError(f"Invalid sort option; expected an object with `param` and `columns`;"
+                                   f" found : {option}")
+
+        fields = option["columns"]
+        if isinstance(fields, list):
+            fields = {column_name: column_name for column_name in fields}
+        unknown_columns = set(fields) - set(columns)
+        if unknown_columns:
+            raise ProgrammingError(f"Sort declared on unknown columns : {sorted(unknown_columns)};"
+                                   f" columns : {sorted(columns)}")
+
+        return cls(
+            param=option["param"],
+            fields=fields,
+            format=option.get("format", "{field},{direction}"),
+            asc=option.get("asc", "asc"),
+            desc=option.get("desc", "desc"),
+            separator=option.get("separator"),
+        )
+
+    def can_sort(self, order: List[Tuple[str, RequestedOrder]]) -> bool:
+        return all(column_name in self.fields for column_name, _ in order)
+
+    def get_params(self, order: List[Tuple[str, RequestedOrder]]) -> Dict[str, Any]:
+        """
+        Return the params asking the API for rows in ``order``.
+        """
+        values = [
+            self.format.format(field=self.fields[column_name],
+                               direction=self.desc if requested_order == Order.DESCENDING else self.asc)
+            for column_name, requested_order in order
+        ]
+        if not values:
+            return {}
+        return {self.param: values if self.separator is None else self.separator.join(values)}
+
+
+def get_sort_key(value: Any) -> Tuple[int, Any]:
+    # SQLite orders NULLs first, then numbers, then text
+    if value is None:
+        return 0, 0
+    if isinstance(value, (bool, int, float)):
+        return 1, value
+    return 2, str(value)
+
+
+def sort_rows(rows: Iterable[Row], order: List[Tuple[str, RequestedOrder]]) -> Iterator[Row]:
+    """
+    Sort rows the API can't sort, loading them all in memory like SQLite would.
+    """
+    sorted_rows = list(rows)
+    # sorts are stable, so sorting by the last column first sorts by all of them
+    for column_name, requested_order in reversed(order):
+        sorted_rows.sort(key=lambda row: get_sort_key(row.get(column_name)),
+                         reverse=requested_order == Order.DESCENDING)
+    return iter(sorted_rows)
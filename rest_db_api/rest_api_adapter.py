@@ -1,38 +1,83 @@
+import copy
+import functools
+import hashlib
+import itertools
 import json
 import logging
+import math
 import os
+import threading
 import urllib
-from typing import Optional, Any, Tuple, Dict, List, Iterator, Set
+from collections import deque
+from types import MappingProxyType
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Any, Tuple, Dict, List, Iterator, Set, Type, Iterable, Deque, Mapping, NamedTuple, \
+    Callable, TypeVar
 
-import requests_cache
-from jsonpath import JSONPath
+import requests
 from shillelagh.adapters.base import Adapter
+from shillelagh.exceptions import ProgrammingError
 from shillelagh.fields import (
     Boolean,
     Field,
     Filter,
+    Float,
+    Integer,
+    Order,
+    String,
 )
-from shillelagh.filters import Equal
-from shillelagh.lib import SimpleCostModel, analyze, flatten
+from shillelagh.filters import Equal, Impossible, Operator
+from shillelagh.lib import analyze, apply_limit_and_offset
 from shillelagh.typing import RequestedOrder, Row
 
 from rest_db_api import utils
+from rest_db_api.fanout import FanOut, FanOutRequest
+from rest_db_api.fetcher import get_fetcher
+from rest_db_api.fragments import compile_fragment, parse_simple_fragment
+from rest_db_api.logs import Payload, Redacted
+from rest_db_api.lookups import KeyIndex
+from rest_db_api.metrics import NO_METRICS, QueryMetrics, start_metrics
+from rest_db_api.pagination import PageRequest, get_paginator
+from rest_db_api.pushdown import ColumnFilter, SortParam, filter_rows, get_column_filters, get_filter_params, \
+    sort_rows
+from rest_db_api.retries import RetryPolicy, get_rate_limiter, send_with_retries
+from rest_db_api.rows import RowMaterializer, get_json_encoder
+from rest_db_api.snapshot import DEFAULT_SNAPSHOT_PATH, Snapshot, SnapshotConfig, SnapshotStore, \
+    refresh_in_background
+from rest_db_api.session import SessionConfig, coalesce_request, get_request_key, get_session, \
+    get_streaming_session
+from rest_db_api.stats import EndpointStats, Observation, get_stats_store, normalize_endpoint
+from rest_db_api.streaming import CHUNK_SIZE, RESPONSE_FORMATS, ROW_FORMATS, iter_json_array, iter_rows
 
 SUPPORTED_PROTOCOLS = {"http", "https"}
 AVERAGE_NUMBER_OF_ROWS = 100000
+# cost of a request, in rows, and share of the rows left by a filter applied upstream, until the endpoint's
+# statistics tell better
+REQUEST_COST = 1000
+PUSHED_FILTER_SELECTIVITY = 0.1
+# cost of a second of latency, and bytes downloaded costing as much as a row
+COST_PER_SECOND = 10000
+BYTES_PER_ROW_COST = 100
+SCHEMA_SAMPLE_SIZE = 1000
+# rows per batch of the columnar reads
+COLUMN_BATCH_SIZE = 10000
+# decoded virtual table URIs kept around
+TABLE_SPEC_CACHE_SIZE = 256
 _logger = logging.getLogger(__name__)
+T = TypeVar("T")
+R = TypeVar("R")
 CHARSET = 'utf8'
 
-
-def get_session() -> requests_cache.CachedSession:
-    """
-    Return a cached session.
-    """
-    return requests_cache.CachedSession(
-        cache_name="rest_api_cache",
-        backend="sqlite",
-        expire_after=5,
-    )
+DECLARED_TYPES: Dict[str, Type[Field]] = {
+    "string": String,
+    "text": String,
+    "integer": Integer,
+    "int": Integer,
+    "float": Float,
+    "real": Float,
+    "boolean": Boolean,
+    "bool": Boolean,
+}
 
 
 def get_decoded_json_body(encoded_json_body: str) -> Dict[Any, Any]:
@@ -40,31 +85,95 @@ def get_decoded_json_body(encoded_json_body: str) -> Dict[Any, Any]:
     return json.loads(decoded)
 
 
+def get_canonical_json_body(encoded_json_body: str) -> str:
+    """
+    Return an encoded JSON body as compact JSON text, validating it.
+    """
+    return json.dumps(get_decoded_json_body(encoded_json_body), separators=(",", ":"))
+
+
 def get_encoded_json_body(plain_json_body: str) -> str:
     return urllib.parse.quote(plain_json_body, CHARSET)
 
 
-def decompose_virtual_table(uri: str) -> Tuple[str, Dict[str, List[str]], Dict[str, str], str, Dict[str, Any]]:
-    parsed = urllib.parse.urlparse(uri)
+def get_declared_columns(schema: Dict[str, str]) -> Dict[str, Field]:
+    """
+    Build the columns of a virtual table from a declared ``{column: type}`` schema.
+    """
+    columns: Dict[str, Field] = {}
+    for column_name, type_name in schema.items():
+        if type_name.lower() not in DECLARED_TYPES:
+            raise ProgrammingError(f"Unsupported column type in declared schema; column : {column_name};"
+                                   f" type : {type_name}")
+        columns[column_name] = DECLARED_TYPES[type_name.lower()](filters=[Equal], order=Order.ANY, exact=False)
+
+    if "rowid" not in columns:
+        columns["rowid"] = Integer(filters=[Equal], order=Order.ANY, exact=False)
+    return columns
+
+
+class TableSpec(NamedTuple):
+    """
+    A decoded virtual table URI, shared by every query referencing the table.
+
+    The body and options are kept as JSON text, so that every caller decodes its own copy: adapters may modify them.
+    """
+    path: str
+    query_params: Mapping[str, Tuple[str, ...]]
+    # ``(param, key, value)`` of every header param value, in order, eg ``("header1", "accept", "*/*")``
+    headers: Tuple[Tuple[str, str, str], ...]
+    fragment: str
+    body_json: str
+    options_json: str
+
+    def get_body(self) -> Any:
+        return json.loads(self.body_json)
+
+    def get_options(self) -> Dict[str, Any]:
+        return json.loads(self.options_json)
+
 
-    path = parsed.path
-    params_and_headers: Dict[str, List[str]] = urllib.parse.parse_qs(parsed.query)
+@functools.lru_cache(maxsize=TABLE_SPEC_CACHE_SIZE)
+def decode_virtual_table(uri: str) -> TableSpec:
+    """
+    Decode a virtual table URI, once per URI.
+
+    Dashboards reference the same tables in every query, and decoding a large ``body`` is costly. Hits and misses
+    are counted by ``decode_virtual_table.cache_info()``.
+    """
+    parsed = urllib.parse.urlparse(uri)
     fragment = urllib.parse.unquote(parsed.fragment) or "$[*]"
 
-    headers: List[HttpHeader] = []
-    query_params: Dict = {}
-    body: Dict = {}
-    for key, val in params_and_headers.items():
+    headers: List[Tuple[str, str, str]] = []
+    query_params: Dict[str, Tuple[str, ...]] = {}
+    body_json = options_json = "{}"
+    for key, val in urllib.parse.parse_qs(parsed.query).items():
         if key.startswith("header"):
-            header: HttpHeader = HttpHeader.parse_header_params(val[0])
-            headers.append(header)
+            for header_param in val:
+                header = HttpHeader.parse_header_params(header_param)
+                headers.append((key, header.get_key(), header.get_value()))
         elif key == "body":
-            body = get_decoded_json_body(val[0])
+            body_json = get_canonical_json_body(val[0])
+        elif key == "options":
+            options_json = get_canonical_json_body(val[0])
         else:
-            query_params[key] = ",".join(val)
+            query_params[key] = tuple(val)
 
-    headers_dict = HttpHeader.load_headers(headers)
-    return path, query_params, headers_dict, fragment, body
+    return TableSpec(parsed.path, MappingProxyType(query_params), tuple(headers), fragment, body_json, options_json)
+
+
+def decompose_virtual_table(uri: str) -> Tuple[str, Dict[str, List[str]], Dict[str, str], str, Dict[str, Any]]:
+    spec = decode_virtual_table(uri)
+
+    # only the first value of each header param is used
+    headers: Dict[str, str] = {}
+    header_params: Set[str] = set()
+    for param, key, value in spec.headers:
+        if param not in header_params:
+            header_params.add(param)
+            headers[key] = value
+    query_params = {key: ",".join(val) for key, val in spec.query_params.items()}
+    return spec.path, query_params, headers, spec.fragment, spec.get_body()
 
 
 class HttpHeader:
@@ -108,6 +217,7 @@ class RestAdapter(Adapter):
     safe = True
     supports_limit = True
     supports_offset = True
+    supports_requested_columns = True
 
     """
     An adapter to use REST APIs as db-api
@@ -118,29 +228,14 @@ class RestAdapter(Adapter):
         return True  # as this is only called from rest_api_dialect
 
     @staticmethod
-    def parse_uri(uri: str) -> Tuple[str, Dict[str, List[str]], Dict[str, str], str, Dict[str, Any]]:
-        parsed = urllib.parse.urlparse(uri)
-
-        path = parsed.path
-        params_and_headers: Dict[str, List[str]] = urllib.parse.parse_qs(parsed.query)
-        fragment = urllib.parse.unquote(parsed.fragment) or "$[*]"
-
-        headers: List[HttpHeader] = []
-        query_params: Dict = {}
-        body: Dict = {}
-        for key, val in params_and_headers.items():
-            if key.startswith("header"):
-                for header in val:
-                    parsed_header: HttpHeader = HttpHeader.parse_header_params(header)
-                    headers.append(parsed_header)
-            elif key == "body":
-                body = get_decoded_json_body(val[0])
-            else:
-                query_params[key] = val
+    def parse_uri(uri: str) -> Tuple[str, Dict[str, List[str]], Dict[str, str], str, Dict[str, Any], Dict[str, Any]]:
+        spec = decode_virtual_table(uri)
 
+        query_params = {key: list(val) for key, val in spec.query_params.items()}
+        headers = [HttpHeader(key, value) for _, key, value in spec.headers]
         headers_dict = HttpHeader.load_multi_valued_headers(headers)
 
-        return path, query_params, headers_dict, fragment, body
+        return spec.path, query_params, headers_dict, spec.fragment, spec.get_body(), spec.get_options()
 
     @staticmethod
     def supports_query_manipulation(operation: str) -> bool:
@@ -149,11 +244,13 @@ class RestAdapter(Adapter):
     @staticmethod
     def parse_operation_and_uri(uri: str, operation: str) -> Tuple[str, str]:
         try:
-            _logger.info(f"parse_operation_and_uri; uri : {uri}; operation : {operation};")
-            uri, operation = utils.parse_operation_and_uri(uri, operation)
+            _logger.debug("parse_operation_and_uri; uri : %s; operation : %s", Payload(uri), Payload(operation))
+            metrics = start_metrics("parse_operation_and_uri", uri)
+            with metrics.measure():
+                uri, operation = metrics.time("rewrite", lambda: utils.parse_operation_and_uri(uri, operation))
         except Exception as exception:
-            _logger.error(f"Exception occurred while parsing; uri : {uri}; operation : {operation}; "
-                          f"exception :", exc_info=exception, stack_info=True)
+            _logger.error("Exception occurred while parsing; uri : %s; operation : %s; exception :", Payload(uri),
+                          Payload(operation), exc_info=exception, stack_info=True)
 
         return uri, operation
 
@@ -163,8 +260,10 @@ class RestAdapter(Adapter):
                  headers_dict: Dict[str, str],
                  fragment: str,
                  body: Dict[Any, Any],
+                 options: Optional[Dict[str, Any]] = None,
                  base_url: str = None,
                  is_https: Boolean = True,
+                 engine_options: Optional[Dict[str, Any]] = None,
                  **kwargs: Any):
         super().__init__()
         self.query_params = query_params
@@ -172,12 +271,25 @@ class RestAdapter(Adapter):
         self.is_https = is_https
         self.headers = headers_dict
         self.body = body
-        self._session = get_session()
+        self.options = options or {}
+        self.engine_options = engine_options or {}
+        session_config = SessionConfig.from_options(self.engine_options)
+        self._session = get_session(base_url, is_https, session_config)
+        self._retry_policy = RetryPolicy.from_options(self.engine_options)
+        self._rate_limiter = get_rate_limiter(base_url, self.engine_options.get("rate_limit"))
+        self._paginator = get_paginator(self.options)
+        self._fetcher = get_fetcher(self.engine_options.get("fetch_engine"), self.engine_options.get("max_concurrency"))
+        # (page request, response, payload) fetched during schema discovery
+        self._prefetched: Optional[Tuple[PageRequest, requests.Response, Any]] = None
+        self._prefetched_lock = threading.Lock()
 
         auth_header_key, auth_header_value = os.environ.get('CL_AUTH_TOKEN', '=').split("=")
         whitelisted_domain = os.environ.get('CL_WHITE_LISTED_DOMAINS', '').split(',')
+        # headers never logged, on top of the ones named like credentials
+        self._sensitive_headers: Set[str] = set()
         if base_url in whitelisted_domain:
             self.headers.update({auth_header_key: auth_header_value})
+            self._sensitive_headers.add(auth_header_key.lower())
 
         if self.is_https is None or self.is_https:
             prefix = "https://"
@@ -189,26 +301,528 @@ class RestAdapter(Adapter):
             path = "/" + path
 
         self.url = prefix + base_url + path
+        self._format = self.options.get("format", "json")
+        if self._format not in RESPONSE_FORMATS:
+            raise ProgrammingError(f"Unsupported response format : {self._format};"
+                                   f" supported formats : {list(RESPONSE_FORMATS)}")
+        # keys leading to the array of rows, when the response is parsed while it streams in (empty for the row
+        # formats, which are streamed by default)
+        self._stream_keys: Optional[List[str]] = None
+        if self.options.get("stream", self._format in ROW_FORMATS):
+            self._stream_keys = self._get_stream_keys()
+        if self._stream_keys is not None:
+            self._streaming_session = get_streaming_session(base_url, is_https, session_config)
+        self._encode = get_json_encoder(self.engine_options.get("json_encoder", "json"))
+        self._snapshot_config = SnapshotConfig.from_option(self.options.get("snapshot"))
+        if self._snapshot_config:
+            self._snapshots = SnapshotStore(self.engine_options.get("snapshot_path") or DEFAULT_SNAPSHOT_PATH)
+            self._snapshot_key = self._get_snapshot_key()
+        self._fan_out = FanOut.from_option(self.options.get("fan_out"))
         self._set_columns()
+        self._add_tag_columns()
+        self._check_snapshot_columns()
+        self._column_filters = self._set_column_filters()
+        # rows looked up by the probes of a join, for the columns with an ``in`` param
+        self._key_indexes = {
+            column_name: KeyIndex(column_name, column_filter.batch_size)
+            for column_name, column_filter in self._column_filters.items()
+            if column_filter.in_param and not self._fan_out
+        }
+        self._sort_param = self._set_sort_param()
+        self._materializer = RowMaterializer(self.columns, self._encode)
+        self._stats = get_stats_store(self.engine_options.get("stats_backend"), self.engine_options.get("stats_path"))
+        self._stats_key = normalize_endpoint("POST" if self.body else "GET", self.url, self.query_params)
 
     def _set_columns(self) -> None:
-        _logger.info(f"custom rest adapter is being used; uri : {self.url}")
-        rows = list(self.get_data({}, []))
-        column_names = list(rows[0].keys()) if rows else []
-        _, order, types = analyze(iter(rows))
+        _logger.info("custom rest adapter is being used; uri : %s", self.url)
+        declared_schema = self.options.get("schema")
+        if declared_schema:
+            self.columns = get_declared_columns(declared_schema)
+            return
+
+        metrics = start_metrics("set_columns", self.url)
+        with metrics.measure():
+            self._discover_columns(metrics)
+
+    def _discover_columns(self, metrics: QueryMetrics) -> None:
+        """
+        Set the columns from the types of the first rows, of the snapshot or of the first response.
+        """
+
+        # only ask for the sample (or the first page) when the API can limit its response, and keep
+        # the payload around so that the first ``get_data`` call doesn't fetch it again
+        sample_size = int(self.options.get("schema_sample_size", SCHEMA_SAMPLE_SIZE))
+        if self._get_fresh_snapshot():
+            rows = self._get_snapshot_rows()
+            try:
+                metrics.rows, _, types = metrics.time("analyze", lambda: analyze(itertools.islice(rows, sample_size)))
+            finally:
+                rows.close()
+            self.columns = {
+                column_name: column_type(filters=[Equal], order=Order.ANY, exact=False)
+                for column_name, column_type in types.items()
+            }
+            return
+
+        if self._paginator:
+            page, _ = self._paginator.get_first_page(0)
+        else:
+            page = PageRequest(None, self._get_limit_offset_params(sample_size, None)[0])
+        source = self
+        if self._fan_out:
+            # the API may only take a single value, the columns are discovered from the first request
+            source = self._get_fan_out_adapter(self._fan_out.get_requests(self.headers, self.query_params)[0])
+        response, payload = source._fetch(page, metrics)
+        data = self._parse(payload, metrics)
+        if self._stream_keys is not None:
+            # only read the sample, and replay it ahead of the rest of the stream
+            data = list(itertools.islice(data, sample_size))
+            payload = itertools.chain(data, payload)
+        if source is self:
+            self._prefetched = (page, response, payload)
+        elif self._stream_keys is not None:
+            response.close()
+        rows = itertools.islice(RowMaterializer(encode=self._encode).get_rows(data), sample_size)
+        metrics.rows, _, types = metrics.time("analyze", lambda: analyze(rows))
+        # rows are sorted in ``get_data``, upstream or locally, so that SQLite can push LIMIT/OFFSET down with
+        # any ORDER BY
         self.columns = {
-            column_name: types[column_name](
+            column_name: column_type(
                 filters=[Equal],
-                order=order[column_name],
+                order=Order.ANY,
                 exact=False,
             )
-            for column_name in column_names
+            for column_name, column_type in types.items()
         }
 
+    def _add_tag_columns(self) -> None:
+        """
+        Add the columns tagging the rows of a fanned-out table with the values of their request.
+        """
+        if not self._fan_out:
+            return
+        for column_name in self._fan_out.tag_columns:
+            self.columns[column_name] = String(filters=[Equal], order=Order.ANY, exact=False)
+
+    def _get_fan_out_adapter(self, request: FanOutRequest) -> 'RestAdapter':
+        """
+        Return a copy of the adapter sending the headers and query params of one of the fanned-out requests.
+        """
+        adapter = copy.copy(self)
+        adapter.headers = request.headers
+        adapter.query_params = request.query_params
+        adapter._prefetched = None
+        adapter._prefetched_lock = threading.Lock()
+        return adapter
+
+    def _get_fan_out_rows(self,
+                          params: Dict[str, Any],
+                          bounds: Dict[str, Filter],
+                          requested_columns: Optional[Set[str]],
+                          metrics: QueryMetrics = NO_METRICS) -> Iterator[Row]:
+        """
+        Yield the rows of every fanned-out request, tagged with the values of their request.
+        """
+        fan_out_requests = self._fan_out.get_requests(self.headers, self.query_params, bounds)
+        _logger.info("fanning out requests; uri : %s; requests : %s; concurrency : %s", self.url,
+                     len(fan_out_requests), self._fan_out.concurrency)
+
+        def fetch(request: FanOutRequest) -> Tuple[Dict[str, str], List[Row]]:
+            adapter = self._get_fan_out_adapter(request)
+            return request.tags, list(adapter._get_filtered_data(params, None, None, requested_columns,
+                                                                 metrics=metrics))
+
+        rowid = 0
+        for tags, rows in self._map_concurrently(fetch, fan_out_requests, self._fan_out.concurrency):
+            for row in rows:
+                row.update(tags)
+                row["rowid"] = rowid
+                rowid += 1
+                yield row
+
+    def _get_snapshot_key(self) -> str:
+        # hashed, so that credentials in the headers aren't written to the snapshot store
+        options = {key: value for key, value in self.options.items() if key != "snapshot"}
+        request = [self.url, self.query_params, self.headers, self.body, self.fragment, options]
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _check_snapshot_columns(self) -> None:
+        if not self._snapshot_config:
+            return
+        for column_name in (self._snapshot_config.key, self._snapshot_config.watermark):
+            if column_name and column_name not in self.columns:
+                raise ProgrammingError(f"Snapshot declared on an unknown column : {column_name};"
+                                       f" columns : {sorted(self.columns)}")
+
+    def _get_fresh_snapshot(self) -> Optional[Snapshot]:
+        if not self._snapshot_config:
+            return None
+        snapshot = self._snapshots.get(self._snapshot_key)
+        if snapshot is None or not snapshot.is_fresh(self._snapshot_config.ttl):
+            return None
+        return snapshot
+
+    def _get_snapshot_rows(self) -> Iterator[Row]:
+        for rowid, row in enumerate(self._snapshots.get_rows(self._snapshot_key)):
+            row["rowid"] = rowid
+            yield row
+
+    def refresh_snapshot(self) -> Snapshot:
+        """
+        Refresh the local copy of the table, fetching the rows changed since the last refresh when it can.
+        """
+        config = self._snapshot_config
+        if not config:
+            raise ProgrammingError(f"The table has no snapshot; uri : {self.url}")
+
+        snapshot = self._snapshots.get(self._snapshot_key)
+        merge = config.is_incremental and snapshot is not None and snapshot.watermark is not None
+        params = {config.since_param: snapshot.watermark} if merge else {}
+        _logger.info("refreshing snapshot; uri : %s; key : %s; params : %s", self.url, self._snapshot_key,
+                     Redacted(params))
+        try:
+            if self._fan_out:
+                rows = self._get_fan_out_rows(params, {}, None)
+            else:
+                rows = self._get_filtered_data(params, None, None, None)
+            snapshot = self._snapshots.save(self._snapshot_key, rows, config, merge=merge)
+        except Exception as exception:
+            _logger.error("failed to refresh snapshot; uri : %s; key : %s", self.url, self._snapshot_key,
+                          exc_info=exception)
+            raise
+        _logger.info("snapshot refreshed; uri : %s; rows : %s; watermark : %s", self.url, snapshot.num_rows,
+                     snapshot.watermark)
+        return snapshot
+
+    def _set_column_filters(self) -> Dict[str, ColumnFilter]:
+        """
+        Let the columns declared in the ``filters`` option be filtered upstream.
+        """
+        column_filters = get_column_filters(self.options, self.columns)
+        for column_name, column_filter in column_filters.items():
+            field = self.columns[column_name]
+            self.columns[column_name] = type(field)(
+                filters=column_filter.get_filters(),
+                order=field.order,
+                exact=column_filter.exact,
+            )
+        return column_filters
+
+    def _set_sort_param(self) -> Optional[SortParam]:
+        """
+        Parse the ``sort`` option, declaring the columns that the API can sort.
+        """
+        return SortParam.from_option(self.options.get("sort"), self.columns)
+
+    def _get_stream_keys(self) -> Optional[List[str]]:
+        if self._paginator:
+            if self.options.get("stream"):
+                _logger.warning("streaming is not supported for paginated tables; uri : %s", self.url)
+            return None
+        if self._format in ROW_FORMATS:
+            return []
+        keys = parse_simple_fragment(self.fragment)
+        if keys is None:
+            _logger.warning("streaming needs a simple fragment like `$.data.items[*]`; uri : %s; fragment : %s",
+                            self.url, self.fragment)
+        return keys
+
     def get_columns(self) -> Dict[str, Field]:
         return self.columns
 
-    get_cost = SimpleCostModel(AVERAGE_NUMBER_OF_ROWS)
+    def get_cost(self, filtered_columns: List[Tuple[str, Operator]], order: List[Tuple[str, RequestedOrder]]) -> int:
+        """
+        Estimate the cost of a query from the requests sent and the rows downloaded.
+
+        The numbers observed on earlier reads of the endpoint are used once there are some: the rows of a full
+        read, or of reads filtered upstream on the same columns, the requests, the bytes per row and the latency.
+        Filters pushed upstream shrink the response, so SQLite prefers plans using them (eg probing each value of
+        an ``IN`` list) on large endpoints, and reads small ones once; the other filters are applied while
+        reading the rows, for free. Sorting is free when the API sorts.
+        """
+        pushed_columns = [column_name for column_name, _ in filtered_columns if column_name in self._column_filters]
+        stats = self._stats.get(self._get_stats_key(pushed_columns))
+        scan_stats = self._stats.get(self._stats_key)
+        if stats is None or stats.rows is None:
+            selectivity = PUSHED_FILTER_SELECTIVITY ** len(pushed_columns)
+            rows = AVERAGE_NUMBER_OF_ROWS
+            requests = 1
+            if scan_stats and scan_stats.rows is not None:
+                rows = scan_stats.rows
+                requests = max(scan_stats.requests * selectivity, 1)
+            rows *= selectivity
+        else:
+            rows = stats.rows
+            requests = max(stats.requests, 1)
+
+        request_cost = REQUEST_COST
+        row_cost = 1
+        for known_stats in (scan_stats, stats):
+            if known_stats and known_stats.latency is not None:
+                request_cost = known_stats.latency * COST_PER_SECOND
+            if known_stats and known_stats.row_bytes is not None:
+                row_cost = 1 + known_stats.row_bytes / BYTES_PER_ROW_COST
+
+        sorted_fields = self._sort_param.fields if self._sort_param else {}
+        num_sorts = len([column_name for column_name, _ in order if column_name not in sorted_fields])
+        return int(requests * request_cost + rows * row_cost + rows * math.log2(max(rows, 2)) * num_sorts)
+
+    def _get_stats_key(self, pushed_columns: Iterable[str]) -> str:
+        """
+        Return the key of the statistics of reads filtered upstream on ``pushed_columns``.
+        """
+        pushed_columns = sorted(set(pushed_columns))
+        if not pushed_columns:
+            return self._stats_key
+        return f"{self._stats_key} where {','.join(pushed_columns)}"
+
+    def get_stats(self, pushed_columns: Iterable[str] = ()) -> Optional[EndpointStats]:
+        """
+        Return the statistics observed on full reads of the table, or on reads filtered upstream on
+        ``pushed_columns``.
+        """
+        return self._stats.get(self._get_stats_key(pushed_columns))
+
+    def _observe(self, rows: Iterator[Row], observation: Observation, pushed_columns: Iterable[str]) -> Iterator[Row]:
+        """
+        Count ``rows``, recording the observed read once they have all been read.
+        """
+        for row in rows:
+            observation.rows += 1
+            yield row
+        self._stats.record(self._get_stats_key(pushed_columns), observation)
+
+    def _get_limit_offset_params(self, limit: Optional[int], offset: Optional[int]) -> Tuple[Dict[str, Any], int]:
+        """
+        Map ``limit``/``offset`` onto the upstream query params declared in the table options.
+
+        Returns the extra query params and the number of rows that still have to be skipped locally.
+        """
+        offset = offset or 0
+        limit_param = self.options.get("limit_param")
+        offset_param = self.options.get("offset_param")
+        page_param = self.options.get("page_param")
+        page_size_param = self.options.get("page_size_param")
+
+        if limit is not None and limit_param:
+            if offset and offset_param:
+                return {limit_param: limit, offset_param: offset}, 0
+            return {limit_param: limit + offset}, offset
+        if limit is None and offset and offset_param:
+            return {offset_param: offset}, 0
+        if limit and page_param and page_size_param:
+            page_start = int(self.options.get("page_start", 1))
+            if offset % limit == 0:
+                return {page_param: page_start + offset // limit, page_size_param: limit}, 0
+            return {page_param: page_start, page_size_param: limit + offset}, offset
+
+        return {}, offset
+
+    def _get_response(self, page: PageRequest, stream: bool = False) -> requests.Response:
+        # pages with their own URL (next links, cursors) already carry the table's query params
+        if page.url:
+            url, query_params = page.url, page.params
+        else:
+            url, query_params = self.url, {**self.query_params, **page.params}
+
+        request_kwargs: Dict[str, Any] = {}
+        if "cache_ttl" in self.options:
+            request_kwargs["expire_after"] = self.options["cache_ttl"]
+
+        session = self._session
+        if stream:
+            session, request_kwargs = self._streaming_session, {"stream": True}
+        request_kwargs["timeout"] = self._retry_policy.timeout
+        method = "POST" if self.body else "GET"
+
+        def send_once() -> requests.Response:
+            if self.body:
+                return session.post(url, params=query_params, headers=self.headers, json=self.body,
+                                    **request_kwargs)
+            return session.get(url, params=query_params, headers=self.headers, **request_kwargs)
+
+        def send() -> requests.Response:
+            return send_with_retries(send_once, method, url, self._retry_policy, self._rate_limiter)
+
+        # a streamed response can only be read once, so it can't be shared
+        if not stream and self.engine_options.get("coalesce_requests", True):
+            # identical requests of concurrent queries (eg charts of a dashboard) share one upstream call
+            response = coalesce_request(get_request_key(method, url, query_params, self.headers, self.body), send)
+        else:
+            response = send()
+
+        is_response_cached: bool = True if response and getattr(response, 'from_cache', False) else False
+
+        # headers are redacted, and the URL, params and body only serialized and capped when the record is emitted
+        if response and response.ok:
+            _logger.info("response received; uri : %s; status : %s; is_response_cached : %s", Payload(url),
+                         response.status_code, is_response_cached)
+            _logger.debug("request sent; uri : %s; query_params : %s; headers : %s; json : %s", Payload(url),
+                          Redacted(query_params), Redacted(self.headers, self._sensitive_headers), Payload(self.body))
+        else:
+            _logger.error("failed to fetch response; uri : %s; query_params : %s; headers : %s; json : %s;"
+                          " is_response_cached : %s; response : %s", Payload(url), Redacted(query_params),
+                          Redacted(self.headers, self._sensitive_headers), Payload(self.body), is_response_cached,
+                          response)
+            response.close()
+            # the body of an error isn't rows, it isn't parsed
+            raise ProgrammingError(f"Failed to fetch {url}; status : {response.status_code}")
+
+        return response
+
+    def _fetch(self, page: PageRequest, metrics: QueryMetrics = NO_METRICS) -> Tuple[requests.Response, Any]:
+        """
+        Return the response and payload of a page, reusing the one fetched during schema discovery.
+        """
+        prefetched = self._take_prefetched(page)
+        if prefetched:
+            metrics.add_response(prefetched[0], is_streamed=self._stream_keys is not None)
+            return prefetched
+
+        # compressed responses are decompressed as their chunks are read
+        if self._stream_keys is not None:
+            response = metrics.time_response(lambda: self._get_response(page, stream=True), is_streamed=True)
+            if self._format in ROW_FORMATS:
+                return response, iter_rows(self._format, response.iter_content(CHUNK_SIZE), self.options)
+            return response, iter_json_array(response.iter_content(CHUNK_SIZE), self._stream_keys)
+
+        response = metrics.time_response(lambda: self._get_response(page))
+        if self._format in ROW_FORMATS:
+            return response, metrics.time(
+                "decode", lambda: list(iter_rows(self._format, response.iter_content(CHUNK_SIZE), self.options)))
+        return response, metrics.time("decode", response.json)
+
+    def _take_prefetched(self, page: PageRequest) -> Optional[Tuple[requests.Response, Any]]:
+        """
+        Return the response and payload fetched during schema discovery if they are the ones of ``page``.
+
+        The prefetched response is used once, by whichever thread takes it first (a snapshot may be refreshed in the
+        background with the same adapter); a streamed one that isn't reused is closed, to release its connection.
+        """
+        with self._prefetched_lock:
+            prefetched, self._prefetched = self._prefetched, None
+        if prefetched is None:
+            return None
+        if prefetched[0] == page:
+            return prefetched[1], prefetched[2]
+        if self._stream_keys is not None:
+            prefetched[1].close()
+        return None
+
+    def _parse(self, payload: Any, metrics: QueryMetrics = NO_METRICS) -> Iterable[Any]:
+        if self._stream_keys is not None or self._format in ROW_FORMATS:
+            # streamed payloads, and the ones of the row formats, are already the rows
+            return payload
+
+        return metrics.time("jsonpath", lambda: compile_fragment(self.fragment).parse(payload))
+
+    def _get_rows(self,
+                  data: Iterable[Any],
+                  start: int = 0,
+                  requested_columns: Optional[Set[str]] = None,
+                  metrics: QueryMetrics = NO_METRICS) -> Iterator[Row]:
+        return metrics.time_rows(self._materializer.get_rows(data, start, requested_columns), "materialize")
+
+    def _fetch_many(self,
+                    pages: Iterable[PageRequest],
+                    concurrency: int,
+                    metrics: QueryMetrics = NO_METRICS) -> Iterator[Tuple[requests.Response, Any]]:
+        """
+        Fetch ``pages`` with at most ``concurrency`` requests in flight, yielding them in order.
+
+        Pages are only submitted as earlier ones are consumed, so closing the iterator early stops fetching. With the
+        async engine, the requests in flight are also bounded across queries.
+        """
+        return self._map_concurrently(functools.partial(self._fetch, metrics=metrics), pages, concurrency)
+
+    def _map_concurrently(self, call: Callable[[T], R], items: Iterable[T], concurrency: int) -> Iterator[R]:
+        """
+        Yield ``call(item)`` for every item in order, with at most ``concurrency`` calls in flight.
+        """
+        if self._fetcher is not None:
+            yield from self._fetcher.map(call, items, concurrency)
+            return
+
+        items = iter(items)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures: Deque[Future] = deque(
+                executor.submit(call, item) for item in itertools.islice(items, concurrency)
+            )
+            try:
+                while futures:
+                    result = futures.popleft().result()
+                    for item in itertools.islice(items, 1):
+                        futures.append(executor.submit(call, item))
+                    yield result
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def _get_paginated_rows(self,
+                            page: PageRequest,
+                            start: int,
+                            max_rows: Optional[int] = None,
+                            requested_columns: Optional[Set[str]] = None,
+                            observation: Optional[Observation] = None,
+                            metrics: QueryMetrics = NO_METRICS) -> Iterator[Row]:
+        """
+        Yield the rows of ``page`` and the pages following it, fetching each page only when it is reached.
+
+        ``max_rows`` is the number of rows needed by the query, counted from the beginning of ``page``.
+        """
+        for data in self._get_pages(page, max_rows, observation, metrics):
+            yield from self._get_rows(data, start, requested_columns, metrics)
+            start += len(data)
+
+    def _get_pages(self,
+                   page: PageRequest,
+                   max_rows: Optional[int] = None,
+                   observation: Optional[Observation] = None,
+                   metrics: QueryMetrics = NO_METRICS) -> Iterator[List[Any]]:
+        """
+        Yield the objects matched by the fragment in ``page`` and the pages following it, fetching each page only
+        when it is reached.
+
+        When the first page tells how many pages there are, the others are fetched concurrently.
+        """
+        paginator = self._paginator
+        response, payload = self._fetch(page, metrics)
+        if observation is not None:
+            observation.add_response(response)
+        data = self._parse(payload, metrics)
+        yield data
+
+        remaining_pages = None
+        if paginator.concurrency > 1:
+            remaining_pages = paginator.get_remaining_pages(page, payload, len(data))
+        if remaining_pages is not None:
+            if max_rows is not None:
+                remaining_pages = remaining_pages[:max(math.ceil(max_rows / paginator.page_size) - 1, 0)]
+            if paginator.max_pages:
+                remaining_pages = remaining_pages[:paginator.max_pages - 1]
+            _logger.info("fetching pages concurrently; uri : %s; pages : %s; concurrency : %s", self.url,
+                         len(remaining_pages), paginator.concurrency)
+            for response, payload in self._fetch_many(remaining_pages, paginator.concurrency, metrics):
+                if observation is not None:
+                    observation.add_response(response)
+                yield self._parse(payload, metrics)
+            return
+
+        num_pages = 1
+        page = paginator.get_next_page(page, response, payload, len(data))
+        while page is not None:
+            if paginator.max_pages and num_pages >= paginator.max_pages:
+                _logger.info("stopping pagination after max_pages; uri : %s; pages : %s", self.url, num_pages)
+                return
+
+            response, payload = self._fetch(page, metrics)
+            if observation is not None:
+                observation.add_response(response)
+            data = self._parse(payload, metrics)
+            yield data
+
+            num_pages += 1
+            page = paginator.get_next_page(page, response, payload, len(data))
 
     def get_data(
             self,
@@ -216,27 +830,221 @@ class RestAdapter(Adapter):
             order: List[Tuple[str, RequestedOrder]],
             limit: Optional[int] = None,
             offset: Optional[int] = None,
+            requested_columns: Optional[Set[str]] = None,
             **kwargs: Any,
     ) -> Iterator[Row]:
-        if self.body:
-            response = self._session.post(self.url, params=self.query_params, headers=self.headers, json=self.body)
-        else:
-            response = self._session.get(self.url, params=self.query_params, headers=self.headers)
+        metrics = start_metrics("get_data", self.url)
+        return metrics.track(self._get_data(bounds, order, limit, offset, requested_columns, metrics))
 
-        is_response_cached: bool = True if response and getattr(response, 'from_cache', False) else False
+    def _get_data(self,
+                  bounds: Dict[str, Filter],
+                  order: List[Tuple[str, RequestedOrder]],
+                  limit: Optional[int],
+                  offset: Optional[int],
+                  requested_columns: Optional[Set[str]],
+                  metrics: QueryMetrics) -> Iterator[Row]:
+        if limit == 0 or any(isinstance(filter_, Impossible) for filter_ in bounds.values()):
+            return
 
-        if response and response.ok:
-            _logger.info(f"response received; uri : {self.url}; query_params : {self.query_params};"
-                         f" headers : {self.headers}; json : {self.body}; is_response_cached : {is_response_cached}")
+        if self._snapshot_config:
+            if self._get_fresh_snapshot():
+                rows = filter_rows(self._get_snapshot_rows(), bounds, self.columns)
+                if order:
+                    rows = sort_rows(rows, order)
+                yield from apply_limit_and_offset(rows, limit, offset)
+                return
+            # the query is answered by the API while the snapshot is refreshed
+            refresh_in_background(self._snapshot_key, self.refresh_snapshot)
+
+        lookup_column = next((column_name for column_name, filter_ in bounds.items()
+                              if column_name in self._key_indexes and isinstance(filter_, Equal)), None)
+        if lookup_column is not None:
+            rows = self._get_lookup_rows(lookup_column, bounds[lookup_column].value, metrics)
+            rows = filter_rows(rows, {column_name: filter_ for column_name, filter_ in bounds.items()
+                                      if column_name != lookup_column}, self.columns)
+            if order:
+                rows = sort_rows(rows, order)
+            yield from apply_limit_and_offset(rows, limit, offset)
+            return
+
+        params, is_exact = get_filter_params(self._column_filters, bounds)
+        is_sorted = not order or (self._sort_param is not None and self._sort_param.can_sort(order))
+        if order and is_sorted:
+            params.update(self._sort_param.get_params(order))
+        if params:
+            _logger.info("pushing filters and sorting upstream; uri : %s; params : %s", self.url, Redacted(params))
+        if self._fan_out:
+            rows = filter_rows(self._get_fan_out_rows(params, bounds, requested_columns, metrics), bounds,
+                               self.columns)
+            if order:
+                rows = sort_rows(rows, order)
+            yield from apply_limit_and_offset(rows, limit, offset)
+            return
+
+        pushed_columns = [column_name for column_name in bounds if column_name in self._column_filters]
+        if (bounds and not is_exact) or not is_sorted:
+            # LIMIT/OFFSET apply to the filtered and sorted rows, so the API can only be asked for all of them
+            observation = Observation()
+            rows = self._observe(self._get_filtered_data(params, None, None, requested_columns, observation, metrics),
+                                 observation, pushed_columns)
+            rows = filter_rows(rows, bounds, self.columns)
+            if not is_sorted:
+                rows = sort_rows(rows, order)
+            yield from apply_limit_and_offset(rows, limit, offset)
+            return
+
+        if limit is None and not offset:
+            observation = Observation()
+            yield from self._observe(
+                self._get_filtered_data(params, None, None, requested_columns, observation, metrics),
+                observation, pushed_columns)
+            return
+
+        yield from self._get_filtered_data(params, limit, offset, requested_columns, metrics=metrics)
+
+    def _get_lookup_rows(self, column_name: str, value: Any, metrics: QueryMetrics = NO_METRICS) -> List[Row]:
+        """
+        Return the rows whose ``column_name`` is ``value``, from the key index, or fetched along with a batch of
+        other keys.
+        """
+        key_index = self._key_indexes[column_name]
+        rows = key_index.probe(value)
+        if rows is not None:
+            return rows
+
+        values = key_index.get_batch(value)
+        params = self._column_filters[column_name].get_in_params(values)
+        _logger.info("looking up keys upstream; uri : %s; column : %s; keys : %s", self.url, column_name, len(values))
+        key_index.add(values, self._get_filtered_data(params, None, None, None, metrics=metrics))
+        return key_index.get(value)
+
+    def _get_filtered_data(self,
+                           params: Dict[str, Any],
+                           limit: Optional[int],
+                           offset: Optional[int],
+                           requested_columns: Optional[Set[str]],
+                           observation: Optional[Observation] = None,
+                           metrics: QueryMetrics = NO_METRICS) -> Iterator[Row]:
+        """
+        Yield the rows from ``offset`` to ``offset + limit`` of the response filtered and sorted by ``params``.
+
+        The responses are added to ``observation`` and ``metrics``.
+        """
+        if self._paginator:
+            page, skip = self._paginator.get_first_page(offset or 0)
+            page = PageRequest(page.url, {**params, **page.params})
+            max_rows = None if limit is None else skip + limit
+            rows = self._get_paginated_rows(page, start=(offset or 0) - skip, max_rows=max_rows,
+                                            requested_columns=requested_columns, observation=observation,
+                                            metrics=metrics)
+            yield from apply_limit_and_offset(rows, limit, skip)
+            return
+
+        limit_offset_params, skip = self._get_limit_offset_params(limit, offset)
+        prefetched = self._prefetched
+        if prefetched and not prefetched[0].params and not params:
+            # the whole response was fetched during schema discovery, limit and offset are applied locally
+            limit_offset_params, skip = {}, offset or 0
+
+        response, payload = self._fetch(PageRequest(None, {**params, **limit_offset_params}), metrics)
+        if observation is not None:
+            observation.add_response(response, is_streamed=self._stream_keys is not None)
+        rows = self._get_rows(self._parse(payload, metrics), start=(offset or 0) - skip,
+                              requested_columns=requested_columns, metrics=metrics)
+        try:
+            yield from apply_limit_and_offset(rows, limit, skip)
+        finally:
+            if self._stream_keys is not None:
+                # stop downloading the rest of the response after a LIMIT
+                response.close()
+
+    def get_column_batches(self,
+                           columns: Optional[List[str]] = None,
+                           batch_size: int = COLUMN_BATCH_SIZE) -> Iterator[Dict[str, List[Any]]]:
+        """
+        Yield the whole table as batches of up to ``batch_size`` rows, ``{column: [values]}``.
+
+        Bulk readers (exports, dataframes) don't go through SQLite, nor build a dict per row: the values of each
+        column are gathered from the objects matched by the fragment, a page at a time. Nested values are JSON
+        encoded, as in the rows of ``get_data``.
+        """
+        names = columns or [column_name for column_name in self.columns if column_name != "rowid"]
+        unknown_columns = [column_name for column_name in names if column_name not in self.columns]
+        if unknown_columns:
+            raise ProgrammingError(f"Unknown columns : {unknown_columns}; columns : {sorted(self.columns)}")
+
+        encode = self._encode
+        nested_columns = self._materializer.nested_columns
+        rowid = 0
+        for items in self._get_item_batches(batch_size):
+            batch: Dict[str, List[Any]] = {}
+            for column_name in names:
+                if column_name == "rowid":
+                    batch[column_name] = list(range(rowid, rowid + len(items)))
+                    continue
+                values = [item.get(column_name) for item in items]
+                if column_name in nested_columns:
+                    values = [encode(value) if isinstance(value, (list, dict)) else value for value in values]
+                batch[column_name] = values
+            rowid += len(items)
+            yield batch
+
+    def _get_item_batches(self, batch_size: int) -> Iterator[List[Any]]:
+        """
+        Yield the objects of the whole table (or the rows of its snapshot, or of its fanned-out requests), in lists
+        of up to ``batch_size``.
+        """
+        observation: Optional[Observation] = None
+        response: Optional[requests.Response] = None
+        if self._get_fresh_snapshot():
+            pages: Iterable[Iterable[Any]] = [self._get_snapshot_rows()]
         else:
-            _logger.error(f"failed to fetch response; uri : {self.url}; query_params : {self.query_params};"
-                          f" headers : {self.headers}; json : {self.body}; is_response_cached : {is_response_cached};"
-                          f" response : {response}")
-
-        payload = response.json()
-        parser = JSONPath(self.fragment)
-        data = parser.parse(payload)
-        for i, row in enumerate(data):
-            row["rowid"] = i
-            _logger.debug(row)
-            yield flatten(row)
+            if self._snapshot_config:
+                refresh_in_background(self._snapshot_key, self.refresh_snapshot)
+            if self._fan_out:
+                pages = [self._get_fan_out_rows({}, {}, None)]
+            else:
+                observation = Observation()
+                if self._paginator:
+                    pages = self._get_pages(self._paginator.get_first_page(0)[0], observation=observation)
+                else:
+                    response, payload = self._fetch(PageRequest(None, {}))
+                    observation.add_response(response, is_streamed=self._stream_keys is not None)
+                    pages = [self._parse(payload)]
+
+        try:
+            for page in pages:
+                items = iter(page)
+                while True:
+                    batch = list(itertools.islice(items, batch_size))
+                    if not batch:
+                        break
+                    if observation is not None:
+                        observation.rows += len(batch)
+                    yield batch
+        finally:
+            if response is not None and self._stream_keys is not None:
+                response.close()
+        if observation is not None:
+            self._stats.record(self._stats_key, observation)
+
+    def close(self) -> None:
+        with self._prefetched_lock:
+            prefetched, self._prefetched = self._prefetched, None
+        if prefetched and self._stream_keys is not None:
+            prefetched[1].close()
+
+
+def refresh_snapshot(uri: str,
+                     base_url: str,
+                     is_https: bool = True,
+                     engine_options: Optional[Dict[str, Any]] = None) -> Snapshot:
+    """
+    Refresh the snapshot of the virtual table ``uri``, eg from a scheduled job.
+    """
+    adapter = RestAdapter(*RestAdapter.parse_uri(uri), base_url=base_url, is_https=is_https,
+                          engine_options=engine_options)
+    try:
+        return adapter.refresh_snapshot()
+    finally:
+        adapter.close()
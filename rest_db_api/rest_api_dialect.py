@@ -1,11 +1,48 @@
+import json
 import urllib.parse
 
 from shillelagh.backends.apsw.dialects.base import APSWDialect
 from sqlalchemy.engine.url import URL
-from typing import Any, Dict, Tuple, List
+from typing import Any, Callable, Dict, Tuple, List
 
 from sqlalchemy.pool import _ConnectionFairy
 
+from rest_db_api.lookups import start_statement
+
+
+def is_truthy(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+# engine URL query params passed on to the adapter as ``engine_options``, with their parsers
+ENGINE_OPTIONS: Dict[str, Callable[[str], Any]] = {
+    "pool_connections": int,
+    "pool_maxsize": int,
+    "pool_block": is_truthy,
+    "keep_alive": is_truthy,
+    "cache_ttl": float,
+    "cache_backend": str,
+    "cache_path": str,
+    "cache_max_size": int,
+    # url-encoded JSON object of ``{url pattern: ttl}``
+    "cache_urls_expire_after": json.loads,
+    "cache_stale_while_revalidate": is_truthy,
+    "coalesce_requests": is_truthy,
+    "json_encoder": str,
+    "stats_backend": str,
+    "stats_path": str,
+    "snapshot_path": str,
+    "fetch_engine": str,
+    "max_concurrency": int,
+    "connect_timeout": float,
+    "read_timeout": float,
+    "max_retries": int,
+    "retry_backoff": float,
+    "max_backoff": float,
+    "max_retry_after": float,
+    "rate_limit": float,
+}
+
 
 class RestApiDialect(APSWDialect):
     name = "rest"
@@ -20,6 +57,11 @@ class RestApiDialect(APSWDialect):
         if "ishttps" in query_params:
             is_https = query_params["ishttps"][0] == '1'
 
+        engine_options = {}
+        for name, parse in ENGINE_OPTIONS.items():
+            if name in query_params:
+                engine_options[name] = parse(query_params[name][0])
+
         return (), {
             "path": ":memory:",
             "adapters": ["myrestadapter"],
@@ -27,6 +69,7 @@ class RestApiDialect(APSWDialect):
                 "myrestadapter": {
                     "base_url": base_url,
                     "is_https": is_https,
+                    "engine_options": engine_options,
                 },
             },
             "safe": True,
@@ -36,6 +79,15 @@ class RestApiDialect(APSWDialect):
     def get_table_names(self, connection, schema=None, **kw) -> List[str]:
         return ["'Tables' dont exists in rest APIs. Use SQL lab directly"]
 
+    def do_execute(self, cursor, statement, parameters, context=None) -> None:
+        # the rows looked up by the probes of a join are kept for the statement
+        start_statement(statement)
+        super().do_execute(cursor, statement, parameters, context)
+
+    def do_execute_no_params(self, cursor, statement, context=None) -> None:
+        start_statement(statement)
+        super().do_execute_no_params(cursor, statement, context)
+
     def do_ping(self, dbapi_connection: _ConnectionFairy) -> bool:
         # required to check 'active' connections by superset. As this is a REST call, this is not applicable.
         return True
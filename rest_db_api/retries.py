@@ -0,0 +1,213 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, NamedTuple, Optional, Tuple
+
+import requests
+from shillelagh.exceptions import ProgrammingError
+
+from rest_db_api.logs import Payload
+
+_logger = logging.getLogger(__name__)
+
+# statuses worth retrying: throttled, or the upstream (or a proxy in front of it) failed
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# requests that may be sent again: POSTs of this adapter are searches, but may not be safe to repeat once processed
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# share of the request rate kept after a 429, and requests per second regained after every success
+THROTTLE_FACTOR = 0.5
+RECOVERY_STEP = 0.5
+MIN_RATE = 0.5
+
+
+class RetryPolicy(NamedTuple):
+    """
+    Timeouts and retries of upstream requests, set from the ``rest://`` engine URL.
+    """
+    # seconds to open a connection, and to wait for the response between bytes
+    connect_timeout: float = 10
+    read_timeout: float = 60
+    max_retries: int = 3
+    # base of the exponential backoff, in seconds
+    retry_backoff: float = 0.5
+    max_backoff: float = 30
+    # longer ``Retry-After`` delays aren't waited for, the request fails right away
+    max_retry_after: float = 60
+
+    @classmethod
+    def from_options(cls, engine_options: Dict[str, Any]) -> 'RetryPolicy':
+        return cls(**{key: engine_options[key] for key in cls._fields if engine_options.get(key) is not None})
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+    def can_retry(self, method: str, response: Optional[requests.Response] = None,
+                  exception: Optional[Exception] = None) -> bool:
+        """
+        Tell whether a failed request may be sent again.
+
+        Any request may be retried when it was rejected before being processed (a connection that couldn't be
+        opened, or a 429); idempotent ones on timeouts and server errors too.
+        """
+        if isinstance(exception, requests.exceptions.ConnectTimeout):
+            return True
+        if exception is not None:
+            return method in IDEMPOTENT_METHODS and isinstance(
+                exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        if response.status_code == 429:
+            return True
+        return method in IDEMPOTENT_METHODS and response.status_code in RETRY_STATUSES
+
+    def get_delay(self, attempt: int, response: Optional[requests.Response] = None) -> Optional[float]:
+        """
+        Return the seconds to wait before retrying, or ``None`` when the API asks for a wait longer than
+        ``max_retry_after``.
+
+        Backoffs are exponential, with full jitter so that the queries of a dashboard don't retry in lockstep.
+        """
+        retry_after = get_retry_after(response) if response is not None else None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        return random.uniform(0, min(self.max_backoff, self.retry_backoff * 2 ** attempt))
+
+
+def get_retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Return the seconds of the ``Retry-After`` header, given in seconds or as an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Limits the requests sent to a host, adapting to 429 responses.
+
+    A 429 cuts the rate to ``THROTTLE_FACTOR`` of the current one, and every success raises it back by
+    ``RECOVERY_STEP`` requests per second, up to ``rate``. Without a ``rate`` the bucket is unlimited until the
+    first 429, which starts from the rate observed over the last second.
+    """
+
+    def __init__(self, rate: Optional[float] = None):
+        self.max_rate = rate
+        self.rate = rate
+        self._tokens = max(rate, 1) if rate else 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        # recent requests, to know the rate being throttled
+        self._sent: Deque[float] = deque()
+
+    def acquire(self) -> None:
+        """
+        Wait for a token.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._sent.append(now)
+                while self._sent and self._sent[0] < now - 1:
+                    self._sent.popleft()
+                if self.rate is None:
+                    return
+                self._tokens = min(max(self.rate, 1), self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self._sent.pop()
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self) -> None:
+        with self._lock:
+            rate = self.rate if self.rate is not None else len(self._sent)
+            self.rate = max(rate * THROTTLE_FACTOR, MIN_RATE)
+            self._tokens = 0
+            self._updated = time.monotonic()
+        _logger.warning("throttled by the API, lowering the request rate; rate : %s", self.rate)
+
+    def recover(self) -> None:
+        with self._lock:
+            if self.rate is None:
+                return
+            self.rate += RECOVERY_STEP
+            if self.max_rate is not None:
+                self.rate = min(self.rate, self.max_rate)
+
+
+_buckets: Dict[Tuple[str, Optional[float]], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(host: str, rate: Optional[float] = None) -> TokenBucket:
+    """
+    Return the token bucket shared by every adapter calling ``host`` with the ``rate`` limit.
+
+    Engines configured with different limits for a host each get their own bucket, so each gets the rate it asked
+    for (and is throttled on its own 429s).
+    """
+    with _buckets_lock:
+        bucket = _buckets.get((host, rate))
+        if bucket is None:
+            bucket = _buckets[host, rate] = TokenBucket(rate)
+    return bucket
+
+
+def clear_rate_limiters() -> None:
+    with _buckets_lock:
+        _buckets.clear()
+
+
+def send_with_retries(send: Callable[[], requests.Response],
+                      method: str,
+                      url: str,
+                      policy: RetryPolicy,
+                      rate_limiter: TokenBucket) -> requests.Response:
+    """
+    Send a request, retrying the failures that ``policy`` allows.
+
+    The last response is returned, even when it failed; connection errors and timeouts that can't be retried are
+    raised as ``ProgrammingError``.
+    """
+    attempt = 0
+    while True:
+        rate_limiter.acquire()
+        try:
+            response = send()
+        except requests.exceptions.RequestException as exception:
+            if attempt >= policy.max_retries or not policy.can_retry(method, exception=exception):
+                raise ProgrammingError(f"Failed to fetch {url}; attempts : {attempt + 1}; error : {exception}") \
+                    from exception
+            delay = policy.get_delay(attempt)
+            reason = type(exception).__name__
+        else:
+            if response.status_code == 429:
+                rate_limiter.throttle()
+            elif response.ok:
+                rate_limiter.recover()
+            if response.ok or attempt >= policy.max_retries or not policy.can_retry(method, response=response):
+                return response
+            delay = policy.get_delay(attempt, response)
+            if delay is None:
+                return response
+            reason = response.status_code
+            response.close()
+
+        _logger.warning("retrying request; url : %s; attempt : %s; reason : %s; delay : %.2f", Payload(url),
+                        attempt + 1, reason, delay)
+        time.sleep(delay)
+        attempt += 1
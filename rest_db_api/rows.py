@@ -0,0 +1,87 @@
+import json
+import logging
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, List, Optional
+
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Field, String
+from shillelagh.typing import Row
+
+from rest_db_api.logs import log_items
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_logger = logging.getLogger(__name__)
+
+JSON_ENCODERS = ("json", "orjson")
+
+# same output as ``json.dumps``, without building an encoder for every value
+_json_encoder = json.JSONEncoder()
+
+
+def encode_orjson(value: Any) -> str:
+    return orjson.dumps(value).decode()
+
+
+def get_json_encoder(name: str = "json") -> Callable[[Any], str]:
+    """
+    Return the function serializing nested values (objects and arrays) of rows.
+
+    ``orjson`` is several times faster, but its output is compact (``{"a":1}`` instead of ``{"a": 1}``) and
+    doesn't escape non ASCII characters.
+    """
+    if name == "json":
+        return _json_encoder.encode
+    if name == "orjson":
+        if orjson is None:
+            raise ProgrammingError("`orjson` is not installed; install it with `pip install rest-db-api[orjson]`")
+        return encode_orjson
+    raise ProgrammingError(f"Unsupported json encoder : {name}; supported encoders : {list(JSON_ENCODERS)}")
+
+
+class RowMaterializer:
+    """
+    Turns the objects matched by the fragment into table rows, numbering them with ``rowid``.
+
+    The parsed objects are left untouched. Without ``columns`` (during schema discovery) every key is kept,
+    otherwise rows only hold the table columns, and only ``String`` columns are checked for nested values.
+    """
+
+    def __init__(self, columns: Optional[Dict[str, Field]] = None, encode: Callable[[Any], str] = _json_encoder.encode):
+        self.encode = encode
+        self.column_names: Optional[List[str]] = None
+        self.nested_columns = frozenset()
+        if columns is not None:
+            self.column_names = [name for name in columns if name != "rowid"]
+            self.nested_columns = frozenset(name for name, field in columns.items() if isinstance(field, String))
+
+    def get_rows(self,
+                 data: Iterable[Any],
+                 start: int = 0,
+                 requested_columns: Optional[Collection[str]] = None) -> Iterator[Row]:
+        encode = self.encode
+        if _logger.isEnabledFor(logging.DEBUG):
+            data = log_items(data, _logger)
+
+        if self.column_names is None:
+            for rowid, item in enumerate(data, start):
+                row = {key: encode(value) if isinstance(value, (list, dict)) else value for key, value in item.items()}
+                row["rowid"] = rowid
+                yield row
+            return
+
+        names = self.column_names
+        if requested_columns is not None:
+            names = [name for name in names if name in requested_columns]
+        plain_columns = [name for name in names if name not in self.nested_columns]
+        nested_columns = [name for name in names if name in self.nested_columns]
+
+        for rowid, item in enumerate(data, start):
+            row = {name: item.get(name) for name in plain_columns}
+            for name in nested_columns:
+                value = item.get(name)
+                row[name] = encode(value) if isinstance(value, (list, dict)) else value
+            row["rowid"] = rowid
+            yield row
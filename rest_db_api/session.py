@@ -0,0 +1,237 @@
+import itertools
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple, TypeVar
+
+import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from shillelagh.exceptions import ProgrammingError
+
+from rest_db_api.logs import Payload
+
+_logger = logging.getLogger(__name__)
+
+
+CACHE_BACKENDS = ("memory", "sqlite", "filesystem")
+
+
+class SessionConfig(NamedTuple):
+    """
+    Connection pool and cache settings of a shared session, set from the ``rest://`` engine URL.
+    """
+    # number of per-host pools kept by the session
+    pool_connections: int = 10
+    # connections kept (and, with ``pool_block``, allowed) per host
+    pool_maxsize: int = 10
+    pool_block: bool = False
+    keep_alive: bool = True
+    # seconds a response is cached for; -1 never expires, 0 disables caching
+    cache_ttl: float = 5
+    cache_backend: str = "sqlite"
+    # sqlite file, or directory of the filesystem backend
+    cache_path: str = "rest_api_cache"
+    # maximum number of cached responses, the oldest ones are evicted first
+    cache_max_size: Optional[int] = None
+    # ``(url pattern, ttl)`` pairs, overriding ``cache_ttl`` for matching URLs
+    cache_urls_expire_after: Tuple[Tuple[str, float], ...] = ()
+    # serve expired responses right away, while they are refreshed in the background
+    cache_stale_while_revalidate: bool = False
+
+    @classmethod
+    def from_options(cls, engine_options: Dict[str, Any]) -> 'SessionConfig':
+        config = {key: engine_options[key] for key in cls._fields if engine_options.get(key) is not None}
+        if isinstance(config.get("cache_urls_expire_after"), dict):
+            # kept as a tuple, so that the config stays hashable
+            config["cache_urls_expire_after"] = tuple(config["cache_urls_expire_after"].items())
+        return cls(**config)
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key: the first caller runs the call, the others wait for its result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, call: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._calls[key] = Future()
+
+        if not is_leader:
+            _logger.info("waiting for an identical in-flight request; key : %s", Payload(key[:2]))
+            return future.result()
+
+        try:
+            result = call()
+        except BaseException as exception:
+            future.set_exception(exception)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+_in_flight_requests = SingleFlight()
+
+
+def get_request_key(method: str,
+                    url: str,
+                    params: Dict[str, Any],
+                    headers: Dict[str, str],
+                    body: Any) -> Tuple[str, str, str]:
+    """
+    Identify a request by its method, URL, params, headers and body.
+    """
+    return method, url, json.dumps([params, headers, body], sort_keys=True, default=str)
+
+
+def coalesce_request(key: Tuple[str, str, str], send: Callable[[], requests.Response]) -> requests.Response:
+    """
+    Send a request, unless an identical one is in flight, in which case its response is shared.
+    """
+    return _in_flight_requests.do(key, send)
+
+
+_sessions: Dict[Tuple[str, str, SessionConfig], requests_cache.CachedSession] = {}
+_streaming_sessions: Dict[Tuple[str, str, SessionConfig], requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def limit_cache_size(session: requests_cache.CachedSession, max_size: int):
+    """
+    Return a response hook evicting the oldest cached responses once there are more than ``max_size``.
+
+    Responses are evicted in storage order, which is insertion order for the memory and sqlite backends.
+    """
+
+    def hook(response: requests.Response, *args: Any, **kwargs: Any) -> requests.Response:
+        if getattr(response, "from_cache", False):
+            return response
+
+        # hooks also run after the response is saved, when it counts towards the size
+        excess = len(session.cache.responses) - max_size
+        if excess > 0:
+            session.cache.delete(expired=True)
+            excess = len(session.cache.responses) - max_size
+        if excess > 0:
+            keys = list(itertools.islice(session.cache.responses.keys(), excess))
+            _logger.info("evicting cached responses; count : %s; max_size : %s", len(keys), max_size)
+            session.cache.delete(*keys)
+        return response
+
+    return hook
+
+
+def create_session(scheme: str, config: SessionConfig) -> requests_cache.CachedSession:
+    """
+    Return a new cached session, with a connection pool and cache set up from ``config``.
+    """
+    if config.cache_backend not in CACHE_BACKENDS:
+        raise ProgrammingError(f"Unsupported cache backend : {config.cache_backend}; "
+                               f"supported backends : {list(CACHE_BACKENDS)}")
+
+    session = requests_cache.CachedSession(
+        cache_name=config.cache_path,
+        backend=config.cache_backend,
+        expire_after=config.cache_ttl,
+        urls_expire_after=dict(config.cache_urls_expire_after) or None,
+        stale_while_revalidate=config.cache_stale_while_revalidate,
+    )
+    if config.cache_max_size:
+        session.hooks["response"].append(limit_cache_size(session, config.cache_max_size))
+    session.mount(f"{scheme}://", HTTPAdapter(pool_connections=config.pool_connections,
+                                             pool_maxsize=config.pool_maxsize,
+                                             pool_block=config.pool_block))
+    if not config.keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+def get_session(base_url: str, is_https: bool = True, config: SessionConfig = SessionConfig()) \
+        -> requests_cache.CachedSession:
+    """
+    Return the cached session shared by every adapter of ``base_url``.
+
+    Sharing the session shares its connection pool and cache handle, so a query doesn't pay for new
+    TCP/TLS connections and for opening the cache.
+    """
+    scheme = "https" if is_https is None or is_https else "http"
+    key = (scheme, base_url, config)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            _logger.info("creating shared session; base_url : %s://%s; config : %s", scheme, base_url, config)
+            session = _sessions[key] = create_session(scheme, config)
+    return session
+
+
+def get_streaming_session(base_url: str, is_https: bool = True, config: SessionConfig = SessionConfig()) \
+        -> requests.Session:
+    """
+    Return an uncached session sharing the connection pool of ``get_session``, for streamed responses.
+
+    The cache reads whole responses to store them, which defeats streaming.
+    """
+    scheme = "https" if is_https is None or is_https else "http"
+    cached_session = get_session(base_url, is_https, config)
+    key = (scheme, base_url, config)
+    with _sessions_lock:
+        session = _streaming_sessions.get(key)
+        if session is None:
+            session = _streaming_sessions[key] = requests.Session()
+            session.mount(f"{scheme}://", cached_session.get_adapter(f"{scheme}://{base_url}"))
+            session.headers.update(cached_session.headers)
+    return session
+
+
+def clear_sessions() -> None:
+    """
+    Close and forget every shared session.
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _streaming_sessions.clear()
+
+
+def get_pool_stats() -> List[Dict[str, Any]]:
+    """
+    Return connection reuse statistics of every host pool of the shared sessions.
+
+    ``num_requests`` above ``num_connections`` means connections are being reused.
+    """
+    stats = []
+    with _sessions_lock:
+        sessions = list(_sessions.items())
+
+    for (scheme, base_url, _), session in sessions:
+        adapter = session.get_adapter(f"{scheme}://{base_url}")
+        pools = getattr(getattr(adapter, "poolmanager", None), "pools", None)
+        if pools is None:
+            continue
+        for pool_key in pools.keys():
+            pool = pools[pool_key]
+            stats.append({
+                "base_url": f"{scheme}://{base_url}",
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                "num_connections": pool.num_connections,
+                "num_requests": pool.num_requests,
+                "idle_connections": pool.pool.qsize() if pool.pool else 0,
+                "max_connections": pool.pool.maxsize if pool.pool else 0,
+            })
+    return stats
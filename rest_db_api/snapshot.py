@@ -0,0 +1,171 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Optional
+
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.typing import Row
+
+from rest_db_api.pushdown import get_sort_key
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PATH = "rest_api_snapshots"
+DEFAULT_SNAPSHOT_TTL = 3600
+SNAPSHOT_OPTION_KEYS = ("ttl", "key", "watermark", "since_param")
+# rows written per statement while a snapshot is refreshed
+WRITE_BATCH_SIZE = 1000
+
+
+class SnapshotConfig(NamedTuple):
+    """
+    The ``snapshot`` table option: the table is read from a local copy, refreshed once older than ``ttl``.
+
+    With ``watermark`` (a column) and ``since_param`` (the upstream param filtering on it), only the rows changed
+    since the last refresh are fetched, and merged into the copy by their ``key`` column.
+    """
+    ttl: float = DEFAULT_SNAPSHOT_TTL
+    key: Optional[str] = None
+    watermark: Optional[str] = None
+    since_param: Optional[str] = None
+
+    @classmethod
+    def from_option(cls, option: Any) -> Optional['SnapshotConfig']:
+        if not option:
+            return None
+        if option is True:
+            return cls()
+        if not isinstance(option, dict) or not set(option) <= set(SNAPSHOT_OPTION_KEYS):
+            raise ProgrammingError(f"Invalid snapshot option; expected an object with the keys"
+                                   f" {list(SNAPSHOT_OPTION_KEYS)}; found : {option}")
+        config = cls(float(option.get("ttl", DEFAULT_SNAPSHOT_TTL)), option.get("key"), option.get("watermark"),
+                     option.get("since_param"))
+        if bool(config.watermark) != bool(config.since_param):
+            raise ProgrammingError(f"Invalid snapshot option; `watermark` and `since_param` go together;"
+                                   f" found : {option}")
+        return config
+
+    @property
+    def is_incremental(self) -> bool:
+        return bool(self.key and self.watermark and self.since_param)
+
+
+class Snapshot(NamedTuple):
+    refreshed_at: float
+    # highest value of the watermark column, the next refresh asks for the rows changed since
+    watermark: Any
+    num_rows: int
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.refreshed_at < ttl
+
+
+class SnapshotStore:
+    """
+    Local copies of virtual tables, in a sqlite file.
+
+    Every operation opens its own connection, so that queries read a snapshot while it is being refreshed in the
+    background; a refresh is a single transaction, readers see the previous copy until it is committed.
+    """
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH):
+        if not path.endswith(".sqlite"):
+            path += ".sqlite"
+        self.path = path
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS snapshots ("
+                               "key TEXT PRIMARY KEY, refreshed_at REAL, watermark TEXT, num_rows INTEGER)")
+            connection.execute("CREATE TABLE IF NOT EXISTS snapshot_rows ("
+                               "key TEXT, row_key TEXT, data TEXT, PRIMARY KEY (key, row_key))")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str) -> Optional[Snapshot]:
+        connection = self._connect()
+        try:
+            result = connection.execute("SELECT refreshed_at, watermark, num_rows FROM snapshots WHERE key = ?",
+                                        (key,)).fetchone()
+        finally:
+            connection.close()
+        if result is None:
+            return None
+        refreshed_at, watermark, num_rows = result
+        return Snapshot(refreshed_at, json.loads(watermark), num_rows)
+
+    def get_rows(self, key: str) -> Iterator[Row]:
+        """
+        Yield the rows of a snapshot, without their ``rowid``.
+        """
+        connection = self._connect()
+        try:
+            for data, in connection.execute("SELECT data FROM snapshot_rows WHERE key = ? ORDER BY rowid", (key,)):
+                yield json.loads(data)
+        finally:
+            connection.close()
+
+    def save(self, key: str, rows: Iterable[Row], config: SnapshotConfig, merge: bool = False) -> Snapshot:
+        """
+        Write the rows of a refresh, replacing the snapshot, or merging them into it by ``config.key``.
+        """
+        previous = self.get(key) if merge else None
+        watermark = previous.watermark if previous else None
+
+        def get_records() -> Iterator[tuple]:
+            nonlocal watermark
+            for position, row in enumerate(rows):
+                row = {name: value for name, value in row.items() if name != "rowid"}
+                if config.watermark and row.get(config.watermark) is not None and (
+                        watermark is None or get_sort_key(row[config.watermark]) > get_sort_key(watermark)):
+                    watermark = row[config.watermark]
+                row_key = json.dumps(row.get(config.key)) if config.key else str(position)
+                yield key, row_key, json.dumps(row, default=str)
+
+        connection = self._connect()
+        try:
+            with connection:
+                if not merge:
+                    connection.execute("DELETE FROM snapshot_rows WHERE key = ?", (key,))
+                records = get_records()
+                while True:
+                    batch = [record for _, record in zip(range(WRITE_BATCH_SIZE), records)]
+                    if not batch:
+                        break
+                    connection.executemany("INSERT OR REPLACE INTO snapshot_rows VALUES (?, ?, ?)", batch)
+                num_rows, = connection.execute("SELECT count(*) FROM snapshot_rows WHERE key = ?", (key,)).fetchone()
+                snapshot = Snapshot(time.time(), watermark, num_rows)
+                connection.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+                                   (key, snapshot.refreshed_at, json.dumps(watermark, default=str), num_rows))
+        finally:
+            connection.close()
+        return snapshot
+
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="snapshot-refresh")
+_refreshes: Dict[str, Future] = {}
+_refreshes_lock = threading.Lock()
+
+
+def refresh_in_background(key: str, refresh: Callable[[], Snapshot]) -> Future:
+    """
+    Run ``refresh`` in the background, unless the snapshot is already being refreshed.
+    """
+    with _refreshes_lock:
+        future = _refreshes.get(key)
+        if future is None or future.done():
+            _logger.info("refreshing snapshot in the background; key : %s", key)
+            future = _refreshes[key] = _executor.submit(refresh)
+    return future
+
+
+def wait_for_refreshes(timeout: Optional[float] = None) -> None:
+    """
+    Wait for the snapshots being refreshed in the background.
+    """
+    with _refreshes_lock:
+        futures = list(_refreshes.values())
+    wait(futures, timeout)
@@ -0,0 +1,180 @@
+import logging
+import re
+import sqlite3
+import threading
+import urllib.parse
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import requests
+from shillelagh.exceptions import ProgrammingError
+
+_logger = logging.getLogger(__name__)
+
+STATS_BACKENDS = ("sqlite", "memory")
+DEFAULT_STATS_BACKEND = "memory"
+DEFAULT_STATS_PATH = "rest_api_stats"
+# weight of the latest read in the moving averages
+STATS_SMOOTHING = 0.3
+
+# path segments that identify a resource, eg ``/orders/42`` or ``/jobs/feb0b665-a9f5-4c7f-be74-7c27a08dd41f``
+ID_SEGMENT_PATTERN = re.compile(r"^(\d+|[0-9a-fA-F-]{16,}|[0-9a-fA-F]{24,})$")
+
+
+def normalize_endpoint(method: str, url: str, param_names: Iterable[str] = ()) -> str:
+    """
+    Return the key that the statistics of an endpoint are kept under, eg ``GET api.com/v1/orders/{id}?status``.
+
+    Ids in the path are replaced by ``{id}`` and only the names of the query params are kept, so that the tables
+    of an endpoint share their statistics.
+    """
+    parsed = urllib.parse.urlparse(url)
+    path = "/".join("{id}" if ID_SEGMENT_PATTERN.match(segment) else segment for segment in parsed.path.split("/"))
+    key = f"{method} {parsed.netloc}{path}"
+    param_names = sorted(param_names)
+    if param_names:
+        key += "?" + "&".join(param_names)
+    return key
+
+
+class Observation:
+    """
+    The rows, bytes and latency of the requests of a single read of a table.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.requests = 0
+        self.bytes = 0
+        # responses served from the cache don't tell how long the API takes
+        self.timed_requests = 0
+        self.latency = 0.0
+
+    def add_response(self, response: requests.Response, is_streamed: bool = False) -> None:
+        self.requests += 1
+        if is_streamed:
+            # reading the content would download the whole response
+            self.bytes += int(response.headers.get("Content-Length") or 0)
+        else:
+            self.bytes += len(response.content or b"")
+        if not getattr(response, "from_cache", False) and response.elapsed is not None:
+            self.timed_requests += 1
+            self.latency += response.elapsed.total_seconds()
+
+
+class EndpointStats(NamedTuple):
+    """
+    Moving averages of the reads of an endpoint.
+    """
+    rows: Optional[float]
+    requests: Optional[float]
+    # bytes downloaded per row
+    row_bytes: Optional[float]
+    # seconds per request, ``None`` until a response doesn't come from the cache
+    latency: Optional[float]
+    samples: int
+
+    def update(self, observation: Observation) -> 'EndpointStats':
+        latency = observation.latency / observation.timed_requests if observation.timed_requests else None
+        return EndpointStats(
+            rows=get_moving_average(self.rows, observation.rows),
+            requests=get_moving_average(self.requests, observation.requests),
+            row_bytes=get_moving_average(self.row_bytes, observation.bytes / max(observation.rows, 1)),
+            latency=get_moving_average(self.latency, latency),
+            samples=self.samples + 1,
+        )
+
+
+def get_moving_average(average: Optional[float], value: Optional[float]) -> Optional[float]:
+    if average is None or value is None:
+        return value if average is None else average
+    return average + STATS_SMOOTHING * (value - average)
+
+
+class StatsStore:
+    """
+    Keeps the statistics of the endpoints read by every adapter, in memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EndpointStats] = {}
+
+    def get(self, key: str) -> Optional[EndpointStats]:
+        return self._stats.get(key)
+
+    def record(self, key: str, observation: Observation) -> EndpointStats:
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = EndpointStats(rows=None, requests=None, row_bytes=None, latency=None, samples=0)
+            stats = self._stats[key] = stats.update(observation)
+            self._save(key, stats)
+        _logger.debug("recorded endpoint stats; key : %s; stats : %s", key, stats)
+        return stats
+
+    def _save(self, key: str, stats: EndpointStats) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteStatsStore(StatsStore):
+    """
+    Keeps the statistics in a sqlite file, so that they outlive the process. They are read once, when the store
+    is opened, and written through.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        if not path.endswith(".sqlite"):
+            path += ".sqlite"
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS endpoint_stats ("
+            "key TEXT PRIMARY KEY, rows REAL, requests REAL, row_bytes REAL, latency REAL, samples INTEGER)"
+        )
+        for key, *values in self._connection.execute("SELECT * FROM endpoint_stats"):
+            self._stats[key] = EndpointStats(*values)
+
+    def _save(self, key: str, stats: EndpointStats) -> None:
+        with self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO endpoint_stats VALUES (?, ?, ?, ?, ?, ?)",
+                                     (key, *stats))
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+_stores: Dict[Tuple[str, str], StatsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_stats_store(backend: Optional[str] = None, path: Optional[str] = None) -> StatsStore:
+    """
+    Return the statistics store shared by every adapter using ``backend`` and ``path``.
+
+    Statistics are kept in memory unless a ``sqlite`` backend or a ``path`` is configured.
+    """
+    backend = backend or ("sqlite" if path else DEFAULT_STATS_BACKEND)
+    path = path or DEFAULT_STATS_PATH
+    if backend not in STATS_BACKENDS:
+        raise ProgrammingError(f"Unsupported stats backend : {backend}; supported backends : {list(STATS_BACKENDS)}")
+
+    key = (backend, path if backend == "sqlite" else "")
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            _logger.info("opening endpoint stats; backend : %s; path : %s", backend, path)
+            store = _stores[key] = SqliteStatsStore(path) if backend == "sqlite" else StatsStore()
+    return store
+
+
+def clear_stats_stores() -> None:
+    """
+    Close and forget every stats store; the persisted statistics are kept.
+    """
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
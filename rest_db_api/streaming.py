@@ -0,0 +1,178 @@
+import codecs
+import csv
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# ``json`` documents are read with the table's jsonpath, the other formats hold one row per line
+RESPONSE_FORMATS = ("json", "ndjson", "csv")
+ROW_FORMATS = ("ndjson", "csv")
+INTEGER = re.compile(r"-?(0|[1-9][0-9]*)\Z")
+FLOAT = re.compile(r"-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?\Z")
+
+
+class JSONStream:
+    """
+    Incrementally decodes JSON values from a stream of bytes, keeping only the unread part in memory.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], encoding: str = "utf-8"):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder(encoding)()
+        self._json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _read_more(self) -> bool:
+        # drop what was already read, so the buffer only holds the value being decoded
+        if self.position:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+
+        for chunk in self._chunks:
+            text = self._text_decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+
+        self.buffer += self._text_decoder.decode(b"", final=True)
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        """
+        Return the next non whitespace character, or ``""`` at the end of the stream.
+        """
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof or not self._read_more():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Invalid JSON stream; expected : {char!r}; found : {found!r}")
+        self.position += 1
+
+    def value(self) -> Any:
+        """
+        Decode the next value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # the value is incomplete, read until the pending text doubles to keep retries linear
+                pending = len(self.buffer) - self.position
+                while len(self.buffer) - self.position < 2 * pending and self._read_more():
+                    pass
+                continue
+
+            # a value ending with the buffer may have been cut short, eg ``12`` of ``123``
+            if end >= len(self.buffer) and not self.eof:
+                self._read_more()
+                continue
+
+            self.position = end
+            return value
+
+
+def iter_json_array(chunks: Iterable[bytes], keys: List[str]) -> Iterator[Any]:
+    """
+    Yield the elements of the array found under ``keys`` of a streamed JSON document, one at a time.
+
+    This is ``$.<keys>[*]`` without holding the document in memory; values of an object found under
+    ``keys`` are yielded as well. Sibling values along the path are decoded and discarded.
+    """
+    stream = JSONStream(chunks)
+    for key in keys:
+        if stream.peek() != "{":
+            return
+        stream.expect("{")
+        while True:
+            if stream.peek() == "}":
+                return
+            name = stream.value()
+            stream.expect(":")
+            if name == key:
+                break
+            stream.value()
+            if stream.peek() == ",":
+                stream.expect(",")
+
+    container = stream.peek()
+    if container not in ("[", "{"):
+        return
+
+    stream.expect(container)
+    closing = "]" if container == "[" else "}"
+    while stream.peek() != closing:
+        if container == "{":
+            stream.value()
+            stream.expect(":")
+        yield stream.value()
+        if stream.peek() == ",":
+            stream.expect(",")
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Yield the lines of a stream of bytes, without their ``\\n``.
+    """
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_ndjson(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Yield the values of a stream of newline-delimited JSON, one per line.
+    """
+    for line in iter_lines(chunks):
+        if line.strip():
+            yield json.loads(line)
+
+
+def parse_csv_value(value: Optional[str]) -> Any:
+    """
+    Type a CSV value: empty values are nulls, and numbers (without leading zeros, eg not zip codes) are numbers.
+    """
+    if not value:
+        return None
+    if INTEGER.match(value):
+        return int(value)
+    if FLOAT.match(value):
+        return float(value)
+    return value
+
+
+def iter_csv(chunks: Iterable[bytes], delimiter: str = ",", encoding: str = "utf-8-sig") -> Iterator[Dict[str, Any]]:
+    """
+    Yield the rows of a stream of CSV with a header line, as objects.
+    """
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    # quoted values may span lines, the reader asks for more lines until they are closed
+    lines = (text_decoder.decode(line + b"\n") for line in iter_lines(chunks))
+    for row in csv.DictReader(lines, delimiter=delimiter):
+        yield {name: parse_csv_value(value) for name, value in row.items() if name is not None}
+
+
+def iter_rows(response_format: str, chunks: Iterable[bytes], options: Dict[str, Any]) -> Iterator[Any]:
+    """
+    Yield the rows of a response in one of the row formats, decoding them as the bytes arrive.
+    """
+    if response_format == "ndjson":
+        return iter_ndjson(chunks)
+    return iter_csv(chunks, delimiter=options.get("csv_delimiter", ","))
@@ -1,14 +1,19 @@
+import functools
 import json
 import logging
-import re
 import urllib
-from typing import Dict, Any, Tuple, List, Union
+from typing import Dict, Any, Tuple, List, Union, Optional
 from urllib.parse import urlencode
 
 import sqlglot
 
+from rest_db_api.logs import Payload
+
 _logger = logging.getLogger(__name__)
 
+# rewritten statements kept, keyed by ``(uri, operation)``
+SQL_REWRITE_CACHE_SIZE = 512
+
 white_listed_header_params: dict[str, str] = {
     "org_id": "x-cleartax-orgunit",
     "node_ids": "x-clear-node-id",
@@ -20,17 +25,18 @@ white_listed_query_params: dict[str, str] = {
 
 }
 
-invalid_sql_clause_post_parsing: list[str, str] = [
-    r'\bAND\s*\(\s*\)',
-    r'\bWHERE\s*\(\s*\)',
-]
 
 
 def get_virtual_table(endpoint: str,
                       params: Dict[str, Any] = None,
                       headers: Dict[str, Any] = None,
                       body: Dict[str, Any] = None,
-                      jsonpath: str = "$[*]") -> str:
+                      jsonpath: str = "$[*]",
+                      options: Dict[str, Any] = None,
+                      pagination: Union[str, Dict[str, Any]] = None) -> str:
+    if pagination:
+        options = {**(options or {}), "pagination": pagination}
+
     params_str = get_params_str(params=params)
 
     headers_custom_param = get_custom_header_params(is_param_added=True if params else False,
@@ -42,7 +48,11 @@ def get_virtual_table(endpoint: str,
     custom_body_param = get_custom_body_param(is_param_added=is_param_added,
                                               body=body)
 
-    virtual_table = endpoint + params_str + headers_custom_param + custom_body_param + "#" + jsonpath
+    custom_options_param = get_custom_options_param(is_param_added=is_param_added or bool(body),
+                                                    options=options)
+
+    virtual_table = (endpoint + params_str + headers_custom_param + custom_body_param + custom_options_param
+                     + "#" + jsonpath)
     return virtual_table
 
 
@@ -86,11 +96,21 @@ def get_custom_body_param(is_param_added: bool = False, body: Dict[Any, Any] = N
     return custom_body_param
 
 
-def remove_invalid_clause(operation: str) -> str:
-    for invalid_clause in invalid_sql_clause_post_parsing:
-        operation = re.sub(invalid_clause, '', operation)
+def get_custom_options_param(is_param_added: bool = False, options: Dict[str, Any] = None) -> str:
+    """
+    Encode adapter options (declared schema, pagination, ...) of a virtual table.
 
-    return operation
+    Options are never sent upstream; they configure how ``RestAdapter`` fetches the table.
+    """
+    if not options:
+        return ''
+
+    if is_param_added:
+        custom_options_param = '&options='
+    else:
+        custom_options_param = '?options='
+    custom_options_param += urllib.parse.quote(json.dumps(options), 'utf8')
+    return custom_options_param
 
 
 def sanitize_string(string: str) -> str:
@@ -121,6 +141,14 @@ def append_to_uri(uri: str, name: str, value: str) -> str:
     return uri + name + value
 
 
+def is_param_name(name: str) -> bool:
+    """
+    Whether conditions on the column ``name`` are sent as headers or query params, instead of filtering rows.
+    """
+    return (name.startswith("QUERY_PARAM") or name.startswith("HEADER")
+            or name in white_listed_header_params or name in white_listed_query_params)
+
+
 def append_headers_and_query_params_to_uri(expression: Union[sqlglot.expressions.Expression, List], is_where_clause,
                                            uri) -> str:
     if expression:
@@ -137,8 +165,7 @@ def append_headers_and_query_params_to_uri(expression: Union[sqlglot.expressions
             eq_expression: sqlglot.expressions.EQ = expression
             if is_where_clause:
                 param_name = sanitize_string(eq_expression.left.sql())
-                if (param_name.startswith("QUERY_PARAM") or param_name.startswith("HEADER")
-                        or param_name in white_listed_header_params or param_name in white_listed_query_params):
+                if is_param_name(param_name):
                     param_value = sanitize_string(eq_expression.right.sql())
                     uri = append_to_uri(uri, param_name, param_value)
                     eq_expression.pop()
@@ -146,8 +173,7 @@ def append_headers_and_query_params_to_uri(expression: Union[sqlglot.expressions
             in_expression: sqlglot.expressions.In = expression
             if is_where_clause:
                 param_name = sanitize_string(in_expression.this.sql())
-                if (param_name.startswith("QUERY_PARAM") or param_name.startswith("HEADER")
-                        or param_name in white_listed_header_params or param_name in white_listed_query_params):
+                if is_param_name(param_name):
                     query_param_values = [sanitize_string(value.sql()) for value in in_expression.expressions]
                     for param_value in query_param_values:
                         uri = append_to_uri(uri, param_name, param_value)
@@ -161,29 +187,56 @@ def append_headers_and_query_params_to_uri(expression: Union[sqlglot.expressions
     return uri.strip()
 
 
+def remove_empty_conditions(expression: sqlglot.expressions.Expression) \
+        -> Optional[sqlglot.expressions.Expression]:
+    """
+    Remove what ``append_headers_and_query_params_to_uri`` left empty, eg ``a AND <popped>`` becomes ``a``, and an
+    empty ``WHERE ()`` is dropped.
+
+    Returns ``None`` when ``expression`` is empty itself.
+    """
+    for key, value in list(expression.args.items()):
+        if isinstance(value, sqlglot.expressions.Expression):
+            child = remove_empty_conditions(value)
+            if child is not value:
+                expression.set(key, child)
+        elif isinstance(value, list) and any(isinstance(child, sqlglot.expressions.Expression) for child in value):
+            children = [remove_empty_conditions(child) if isinstance(child, sqlglot.expressions.Expression)
+                        else child for child in value]
+            expression.set(key, [child for child in children if child is not None])
+
+    if isinstance(expression, (sqlglot.expressions.And, sqlglot.expressions.Paren, sqlglot.expressions.Where)):
+        operands = [operand for operand in (expression.args.get("this"), expression.args.get("expression"))
+                    if operand is not None]
+        if not operands:
+            return None
+        if isinstance(expression, sqlglot.expressions.And) and len(operands) == 1:
+            return operands[0]
+    return expression
+
+
+@functools.lru_cache(maxsize=SQL_REWRITE_CACHE_SIZE)
 def parse_operation_and_uri(uri: str, operation: str) -> Tuple[str, str]:
-    parsed_operation = sqlglot.parse_one(sqlglot.parse_one(operation).sql())
-    updated_uri = append_headers_and_query_params_to_uri(parsed_operation, False, uri)
+    """
+    Move the header and query param conditions of ``operation`` into the virtual table ``uri``.
+
+    Dashboards re-issue the same statements, so rewrites are cached. A statement combining these conditions with
+    ``OR`` or negating them with ``NOT`` is valid, but a param can't be sent for only some of the rows: it is left as
+    it is.
+    """
+    parsed_operation = sqlglot.parse_one(operation)
+    for condition in parsed_operation.find_all(sqlglot.expressions.Or, sqlglot.expressions.Not):
+        columns = condition.find_all(sqlglot.expressions.Column)
+        if any(is_param_name(sanitize_string(column.sql())) for column in columns):
+            _logger.debug("header and query param conditions combined with OR or negated with NOT, the statement is"
+                          " not rewritten; uri : %s; operation : %s", Payload(uri), Payload(operation))
+            return uri, operation
 
-    operation_elems = []
-    for index, value in enumerate(parsed_operation.sql().split()):
-        if value == 'AND':
-            while len(operation_elems) > 0 and operation_elems[-1] == 'AND':
-                operation_elems.pop()
-            if len(operation_elems) > 0 and operation_elems[-1] != 'WHERE':
-                operation_elems.append(value)
-        elif value == 'ORDER' or value == 'LIMIT' or value == ")":
-            while len(operation_elems) > 0 and (operation_elems[-1] == 'WHERE' or operation_elems[-1] == 'AND'):
-                operation_elems.pop()
-            operation_elems.append(value)
-        else:
-            operation_elems.append(value)
-
-    while len(operation_elems) > 0 and (operation_elems[-1] == "WHERE" or operation_elems[-1] == 'AND'):
-        operation_elems.pop()
-
-    updated_operation = remove_invalid_clause(" ".join(operation_elems))
+    updated_uri = append_headers_and_query_params_to_uri(parsed_operation, False, uri)
+    parsed_operation = remove_empty_conditions(parsed_operation)
 
-    updated_operation = updated_operation.replace(uri, updated_uri)
+    for table in parsed_operation.find_all(sqlglot.expressions.Table):
+        if table.name == uri:
+            table.this.set("this", updated_uri)
 
-    return updated_uri.strip(), sqlglot.parse_one(updated_operation.strip()).sql()
+    return updated_uri.strip(), parsed_operation.sql()
@@ -1,12 +1,38 @@
-from typing import Generator
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Generator, List
 
 import pytest
 from sqlalchemy.engine import Connection
 from sqlalchemy import create_engine
 
+from rest_db_api import stats
+from rest_db_api.retries import clear_rate_limiters
+from rest_db_api.session import clear_sessions
+
 GET_SQL_ALCHEMY_URI = 'rest://api.covidtracking.com?ishttps=1'
 POST_SQL_ALCHEMY_URI = 'rest://some.api.com?ishttps=0'
 
+@pytest.fixture(autouse=True)
+def shared_sessions() -> Generator[None, None, None]:
+    # sessions are shared across adapters, don't leak them (or their mocks) between tests
+    clear_sessions()
+    clear_rate_limiters()
+    yield
+    clear_sessions()
+    clear_rate_limiters()
+
+
+@pytest.fixture(autouse=True)
+def endpoint_stats() -> Generator[None, None, None]:
+    # statistics change query plans, every test starts without any
+    stats.clear_stats_stores()
+    yield
+    stats.clear_stats_stores()
+
+
 @pytest.fixture
 def simple_url() -> str:
     return GET_SQL_ALCHEMY_URI
@@ -29,3 +55,38 @@ def post_data_connection(post_sql_uri: str) -> Generator[Connection, None, None]
     engine = create_engine(post_sql_uri)
     with engine.connect() as connection:
         yield connection
+
+
+@pytest.fixture
+def json_server() -> Generator[Callable, None, None]:
+    """
+    Start local HTTP servers answering every GET with ``handler(path, query_params)`` as JSON.
+
+    Unlike ``requests_mock``, requests reach the server concurrently.
+    """
+    servers: List[ThreadingHTTPServer] = []
+
+    def start(handler: Callable[[str, Dict[str, List[str]]], Any]) -> str:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urllib.parse.urlparse(self.path)
+                body = json.dumps(handler(parsed.path, urllib.parse.parse_qs(parsed.query))).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"127.0.0.1:{server.server_address[1]}"
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,71 @@
+import pytest
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+
+from rest_db_api import columnar
+from rest_db_api.columnar import fetch_arrow, fetch_columns, fetch_dataframe
+from rest_db_api.utils import get_virtual_table
+
+URL = 'https://api.covidtracking.com/v1/ledgers'
+BASE_URL = "api.covidtracking.com"
+
+ROWS = [{"id": i, "name": f"row {i}", "tags": [i], "amount": i / 2} for i in range(5)]
+
+
+@pytest.fixture
+def ledgers(mocker: MockerFixture, requests_mock: Mocker) -> Mocker:
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    return requests_mock
+
+
+def test_fetch_columns(ledgers: Mocker):
+    ledgers.get(URL, json={"items": ROWS})
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', jsonpath="$.items[*]")
+
+    batches = list(fetch_columns(virtual_table, BASE_URL, batch_size=2))
+    assert [batch["id"] for batch in batches] == [[0, 1], [2, 3], [4]]
+    assert batches[0] == {"id": [0, 1], "name": ["row 0", "row 1"], "tags": ["[0]", "[1]"], "amount": [0.0, 0.5]}
+    # the response of the schema discovery is reused
+    assert ledgers.call_count == 1
+
+    batches = list(fetch_columns(virtual_table, BASE_URL, columns=["name", "rowid"]))
+    assert batches == [{"name": [row["name"] for row in ROWS], "rowid": [0, 1, 2, 3, 4]}]
+
+
+def test_fetch_columns_paginated(ledgers: Mocker):
+    def get_page(request, context):
+        offset, limit = int(request.qs["offset"][0]), int(request.qs["limit"][0])
+        return ROWS[offset:offset + limit]
+
+    ledgers.get(URL, json=get_page)
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', pagination={"type": "offset", "page_size": 2},
+                                      options={"schema": {"id": "integer"}})
+    # batches don't span pages
+    assert [batch["id"] for batch in fetch_columns(virtual_table, BASE_URL, batch_size=10)] == [[0, 1], [2, 3], [4]]
+
+
+def test_fetch_columns_unknown_column(ledgers: Mocker):
+    ledgers.get(URL, json=ROWS)
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', options={"schema": {"id": "integer"}})
+    with pytest.raises(Exception, match="Unknown columns"):
+        list(fetch_columns(virtual_table, BASE_URL, columns=["name"]))
+
+
+def test_optional_dependencies(ledgers: Mocker, mocker: MockerFixture):
+    ledgers.get(URL, json=ROWS)
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers')
+    if columnar.pyarrow is None:
+        with pytest.raises(Exception, match="pyarrow"):
+            fetch_arrow(virtual_table, BASE_URL)
+    else:
+        table = fetch_arrow(virtual_table, BASE_URL)
+        assert table.column("id").to_pylist() == [0, 1, 2, 3, 4]
+        assert str(table.schema.field("amount").type) == "double"
+
+    mocker.patch.object(columnar, "pandas", None)
+    with pytest.raises(Exception, match="pandas"):
+        fetch_dataframe(virtual_table, BASE_URL)
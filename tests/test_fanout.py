@@ -0,0 +1,99 @@
+import threading
+import time
+
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+from shillelagh.filters import Equal
+from sqlalchemy import create_engine
+
+from rest_db_api.fanout import FanOut
+from rest_db_api.utils import get_virtual_table, parse_operation_and_uri
+
+URL = 'https://api.covidtracking.com/v1/ledgers'
+
+LATENCY = 0.1
+
+
+def get_ledgers(request, context):
+    node_id = request.headers["x-clear-node-id"]
+    if "," in node_id:
+        context.status_code = 400
+        return {"error": "a single node id is supported"}
+    return [{"id": f"{node_id}-{i}", "amount": i} for i in range(2)]
+
+
+def test_fan_out_requests():
+    fan_out = FanOut.from_option({"headers": {"X-Clear-Node-Id": "node_id"}, "params": ["gstin"]})
+    requests = fan_out.get_requests({"x-clear-node-id": "a, b", "x-other": "c"}, {"gstin": ["1", "2"], "page": ["1"]})
+    assert [request.tags for request in requests] == [
+        {"node_id": "a", "gstin": "1"}, {"node_id": "a", "gstin": "2"},
+        {"node_id": "b", "gstin": "1"}, {"node_id": "b", "gstin": "2"},
+    ]
+    assert requests[1].headers == {"x-clear-node-id": "a", "x-other": "c"}
+    assert requests[1].query_params == {"gstin": ["2"], "page": ["1"]}
+
+    requests = fan_out.get_requests({"x-clear-node-id": "a,b"}, {}, {"node_id": Equal("b")})
+    assert [request.tags for request in requests] == [{"node_id": "b"}]
+
+
+def test_fan_out_headers(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    requests_mock.get(URL, json=get_ledgers)
+    # header and param conditions are appended to the virtual table, which can't end with a fragment then
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', options={
+        "fan_out": {"headers": {"x-clear-node-id": "node"}},
+    }).split("#")[0]
+
+    query = f'''select node, id, amount from "{virtual_table}"
+        where "HEADERx-clear-node-id" in ('a', 'b') and amount = 1'''
+    # the dialect's host (eg superset) moves the header conditions into the virtual table
+    _, query = parse_operation_and_uri(virtual_table, query)
+    assert list(covid_data_connection.execute(query)) == [("a", "a-1", 1), ("b", "b-1", 1)]
+    assert sorted(request.headers["x-clear-node-id"] for request in requests_mock.request_history) \
+        == ["a", "a", "b"]
+
+    requests_mock.reset_mock()
+    query = f'''select id from "{virtual_table}" where "HEADERx-clear-node-id" in ('a', 'b') and node = 'b' '''
+    _, query = parse_operation_and_uri(virtual_table, query)
+    assert list(covid_data_connection.execute(query)) == [("b-0",), ("b-1",)]
+    # only the request of the selected value is sent
+    assert [request.headers["x-clear-node-id"] for request in requests_mock.request_history] == ["b"]
+
+
+def test_fan_out_concurrency(mocker: MockerFixture, json_server):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    lock = threading.Lock()
+    in_flight = []
+    max_in_flight = []
+
+    def get_gstin_rows(path, query_params):
+        with lock:
+            in_flight.append(1)
+            max_in_flight.append(len(in_flight))
+        time.sleep(LATENCY)
+        with lock:
+            in_flight.pop()
+        return [{"amount": int(gstin)} for gstin in query_params["gstin"]]
+
+    engine = create_engine(f"rest://{json_server(get_gstin_rows)}?ishttps=0")
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', options={
+        "schema": {"amount": "integer"}, "fan_out": {"params": ["gstin"], "concurrency": 3},
+    }).split("#")[0]
+    with engine.connect() as connection:
+        start = time.perf_counter()
+        _, query = parse_operation_and_uri(virtual_table, f'''select gstin, amount from "{virtual_table}"
+            where QUERY_PARAMgstin in (1, 2, 3, 4, 5, 6)''')
+        data = list(connection.execute(query))
+        elapsed = time.perf_counter() - start
+    engine.dispose()
+
+    assert data == [(str(i), i) for i in range(1, 7)]
+    assert max(max_in_flight) == 3
+    assert elapsed < 6 * LATENCY
@@ -0,0 +1,126 @@
+import gc
+import threading
+import time
+
+import pytest
+from pytest_mock import MockerFixture
+from requests import Session
+from shillelagh.exceptions import ProgrammingError
+from sqlalchemy import create_engine
+
+from rest_db_api.fetcher import AsyncFetcher, close_fetchers, get_fetcher
+from rest_db_api.utils import get_virtual_table
+
+LATENCY = 0.1
+
+
+@pytest.fixture(autouse=True)
+def fetchers():
+    yield
+    close_fetchers()
+
+
+def test_async_fetcher_map(recwarn):
+    fetcher = AsyncFetcher(max_concurrency=2)
+    lock = threading.Lock()
+    in_flight = []
+    max_in_flight = []
+    called = []
+
+    def call(item: int) -> int:
+        with lock:
+            in_flight.append(item)
+            max_in_flight.append(len(in_flight))
+            called.append(item)
+        time.sleep(0.01 * (5 - item))
+        with lock:
+            in_flight.remove(item)
+        return item * 10
+
+    # results keep the order of the items, whichever call finishes first
+    assert list(fetcher.map(call, range(5), concurrency=4)) == [0, 10, 20, 30, 40]
+    assert max(max_in_flight) == 2
+
+    called.clear()
+    results = fetcher.map(call, range(100), concurrency=2)
+    assert next(results) == 0
+    results.close()
+    assert len(called) < 5
+    fetcher.close()
+    gc.collect()
+    # closing the iterator early doesn't leave coroutines that were never awaited
+    assert not [warning for warning in recwarn if issubclass(warning.category, RuntimeWarning)]
+
+
+def test_unsupported_engine():
+    assert get_fetcher(None) is None
+    with pytest.raises(ProgrammingError):
+        get_fetcher("gevent")
+
+
+def test_async_pagination(mocker: MockerFixture, json_server):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    rows = [{"id": i} for i in range(16)]
+    lock = threading.Lock()
+    in_flight = []
+    max_in_flight = []
+
+    def get_page(path, query_params):
+        with lock:
+            in_flight.append(1)
+            max_in_flight.append(len(in_flight))
+        time.sleep(LATENCY)
+        with lock:
+            in_flight.pop()
+        page = int(query_params["page"][0])
+        return {"totalPages": 8, "items": rows[(page - 1) * 2:page * 2]}
+
+    engine = create_engine(f"rest://{json_server(get_page)}?ishttps=0&fetch_engine=async&max_concurrency=4")
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers',
+                                      jsonpath="$.items[*]",
+                                      pagination={"type": "page", "page_size": 2, "total_pages_path": "$.totalPages",
+                                                  "concurrency": 8})
+    with engine.connect() as connection:
+        start = time.perf_counter()
+        data = list(connection.execute(f'select id from "{virtual_table}"'))
+        elapsed = time.perf_counter() - start
+    engine.dispose()
+
+    assert data == [(i,) for i in range(16)]
+    # the first page, then the 7 others at most 4 at a time
+    assert max(max_in_flight) == 4
+    assert elapsed < 8 * LATENCY
+
+
+def test_async_fan_out_pagination(mocker: MockerFixture, json_server):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    def get_page(path, query_params):
+        page = int(query_params["page"][0])
+        return {"totalPages": 3, "items": [{"id": (page - 1) * 2 + i} for i in range(2)]}
+
+    engine = create_engine(f"rest://{json_server(get_page)}?ishttps=0&fetch_engine=async&max_concurrency=2")
+    # every fanned-out request fetches its remaining pages concurrently, while using one of the 2 permits
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', headers={"x-clear-node-id": "a,b,c"},
+                                      jsonpath="$.items[*]",
+                                      options={"fan_out": {"headers": {"x-clear-node-id": "node"}}},
+                                      pagination={"type": "page", "page_size": 2, "total_pages_path": "$.totalPages"})
+    data = []
+
+    def query():
+        with engine.connect() as connection:
+            data.extend(connection.execute(f'select node, id from "{virtual_table}"'))
+
+    thread = threading.Thread(target=query, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    engine.dispose()
+
+    assert not thread.is_alive()
+    assert data == [(node, i) for node in "abc" for i in range(6)]
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+from jsonpath import JSONPath
+
+from rest_db_api.fragments import compile_fragment, parse_simple_fragment, parse_simple_path
+
+PAYLOAD = {
+    "data": {"items": [{"id": 1}, {"id": 2}], "by_id": {"a": {"id": 1}}, "empty": None, "count": 2},
+    "line items": [1, 2],
+    "nested": [{"items": [1]}, {"items": [2]}],
+}
+
+
+def test_parse_simple_path():
+    assert parse_simple_path("$") == ([], False)
+    assert parse_simple_path("$.meta.total") == (["meta", "total"], False)
+    assert parse_simple_path("$['line items'][*]") == (["line items"], True)
+    assert parse_simple_path("$..items[*]") is None
+    assert parse_simple_path("$.items[0]") is None
+    assert parse_simple_fragment("$.meta.total") is None
+
+
+@pytest.mark.parametrize("fragment", [
+    "$",
+    "$.data.items[*]",
+    "$.data.by_id[*]",
+    "$.data.empty[*]",
+    "$.data.count",
+    "$.data.count[*]",
+    "$.data.missing[*]",
+    "$['line items'][*]",
+    "$.nested.items[*]",
+    "$.data.items[?(@.id > 1)]",
+    "$..id",
+])
+def test_compiled_fragment_matches_jsonpath(fragment: str):
+    assert compile_fragment(fragment).parse(PAYLOAD) == JSONPath(fragment).parse(PAYLOAD)
+
+
+def test_compile_fragment_is_cached():
+    assert compile_fragment("$.data.items[*]") is compile_fragment("$.data.items[*]")
+    assert compile_fragment("$.data.items[*]").is_simple
+    assert not compile_fragment("$..id").is_simple
+
+
+def test_compiled_fragment_is_thread_safe():
+    fragment = compile_fragment("$.data.items[?(@.id > 1)]")
+    payloads = [{"data": {"items": [{"id": i}, {"id": i + 1}]}} for i in range(1, 50)]
+    results = {}
+
+    def parse(i: int):
+        results[i] = fragment.parse(payloads[i])
+
+    threads = [threading.Thread(target=parse, args=(i,)) for i in range(len(payloads))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(results[i] == [item for item in payloads[i]["data"]["items"] if item["id"] > 1] for i in results)
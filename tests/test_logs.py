@@ -0,0 +1,56 @@
+import logging
+
+import pytest
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+
+from rest_db_api.logs import Payload, Redacted, redact_text
+from rest_db_api.rest_api_adapter import RestAdapter
+from rest_db_api.rows import RowMaterializer
+from rest_db_api.utils import get_virtual_table
+
+URL = 'https://api.covidtracking.com/v1/ledgers'
+
+
+def test_redact_text():
+    statement = ('SELECT * FROM "/v1/x?a=1&key=abc&header1=Authorization:Bearer s&header1=accept:*/*"'
+                 " WHERE HEADER_COOKIE = 'a=b' AND HEADER_X_ORG = '7'")
+    assert redact_text(statement) == ('SELECT * FROM "/v1/x?a=1&key=***&header1=Authorization:***&header1=accept:*/*"'
+                                      " WHERE HEADER_COOKIE = '***' AND HEADER_X_ORG = '7'")
+    assert str(Payload({"user": "u", "password": "p"})) == '{"user": "u", "password": "***"}'
+    assert str(Redacted({"Cookie": "c", "Accept": "a", "x-cl": "t"}, {"x-cl"})) == \
+        "{'Cookie': '***', 'Accept': 'a', 'x-cl': '***'}"
+
+
+def test_payloads_are_capped_and_lazy(mocker: MockerFixture, caplog: pytest.LogCaptureFixture):
+    assert str(Payload("a" * 2000, max_length=10)) == "aaaaaaaaaa... (2000 characters)"
+
+    dumps = mocker.patch("rest_db_api.logs.dump_head", return_value=("{}", False))
+    logger = logging.getLogger("rest_db_api.test")
+    with caplog.at_level(logging.INFO, logger="rest_db_api.test"):
+        logger.debug("json : %s", Payload({"a": 1}))
+        assert not dumps.called
+        logger.info("json : %s", Payload({"a": 1}))
+        assert dumps.called
+
+
+def test_failed_requests_are_logged_redacted(mocker: MockerFixture, requests_mock: Mocker,
+                                             caplog: pytest.LogCaptureFixture):
+    mocker.patch("rest_db_api.session.requests_cache.CachedSession", return_value=Session())
+    requests_mock.get(URL, status_code=404)
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', headers={"Authorization": "Bearer secret"},
+                                      options={"schema": {"id": "integer"}})
+    adapter = RestAdapter(*RestAdapter.parse_uri(virtual_table), base_url="api.covidtracking.com")
+    with pytest.raises(Exception, match="status : 404"):
+        list(adapter.get_data({}, []))
+    assert "failed to fetch response" in caplog.text
+    assert "Bearer secret" not in caplog.text
+    assert requests_mock.last_request.headers["Authorization"] == "Bearer secret"
+
+
+def test_rows_are_logged_at_debug(caplog: pytest.LogCaptureFixture):
+    materializer = RowMaterializer()
+    with caplog.at_level(logging.DEBUG, logger="rest_db_api.rows"):
+        assert [row["id"] for row in materializer.get_rows([{"id": 1}, {"id": 2}])] == [1, 2]
+    assert [record.getMessage() for record in caplog.records] == ['row : {"id": 1}', 'row : {"id": 2}']
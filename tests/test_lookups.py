@@ -0,0 +1,76 @@
+import threading
+
+from requests_mock.mocker import Mocker
+
+from rest_db_api.lookups import KeyIndex, start_statement
+from rest_db_api.utils import get_virtual_table
+from tests.test_pushdown import get_table, orders  # noqa: F401
+
+STATUSES_URL = "https://api.covidtracking.com/v1/statuses"
+STATUSES = [{"status": "open", "label": "Open"}, {"status": "closed", "label": "Closed"},
+            {"status": "void", "label": "Void"}]
+
+
+def get_statuses(request, context):
+    keys = request.qs["ids"][0].split(",") if "ids" in request.qs else None
+    return [status for status in STATUSES if keys is None or status["status"] in keys]
+
+
+def test_key_index():
+    key_index = KeyIndex("id", batch_size=2)
+    start_statement("join")
+    assert key_index.probe(1) is None
+    key_index.add([1], [{"id": 1, "rowid": 0}])
+    assert key_index.probe(2.0) is None
+    key_index.add([2, 3], [{"id": "2", "rowid": 0}])
+    assert key_index.get(2) == [{"id": "2", "rowid": 0}]
+    assert key_index.get(3) == []
+    # however long a statement takes, its rows are kept until the next one
+    assert key_index.probe(1) == [{"id": 1, "rowid": 0}]
+
+    # another statement isn't seeded with unrelated keys
+    start_statement("other join")
+    assert key_index.probe(2) is None
+    assert key_index.get_batch(2) == [2]
+
+    # a re-run fetches the keys of the last run of the statement along with its first miss
+    start_statement("join")
+    assert key_index.probe(2) is None
+    assert key_index.get_batch(2) == [2, 1]
+
+
+def test_key_index_without_statement():
+    key_index = KeyIndex("id", batch_size=2)
+    probes = []
+
+    def probe():
+        # probes outside of a statement aren't known to belong to the same query, nothing is kept between them
+        probes.append(key_index.probe(1))
+        key_index.add([1], [{"id": 1, "rowid": 0}])
+        probes.append(key_index.probe(1))
+        probes.append(key_index.get_batch(2))
+
+    thread = threading.Thread(target=probe)
+    thread.start()
+    thread.join()
+    assert probes == [None, None, [2]]
+
+
+def test_join_lookups(orders: Mocker, covid_data_connection):
+    orders.get(STATUSES_URL, json=get_statuses)
+    statuses = get_virtual_table(endpoint="/v1/statuses", options={
+        "schema": {"status": "string", "label": "string"}, "filters": {"status": {"in": "ids"}},
+    })
+    query = f'select o.id, s.label from "{get_table()}" o join "{statuses}" s on o.status = s.status'
+
+    data = list(covid_data_connection.execute(query))
+    assert sorted(data) == [(i, "Open" if i % 2 else "Closed") for i in range(1, 8)]
+    # 7 probes, one request per distinct key
+    lookups = [request.qs["ids"] for request in orders.request_history if "ids" in request.qs]
+    assert sorted(lookups) == [["closed"], ["open"]]
+
+    # the re-run sends the keys of the first run in a single request
+    orders.reset_mock()
+    assert sorted(covid_data_connection.execute(query)) == sorted(data)
+    lookups = [request.qs["ids"] for request in orders.request_history if "ids" in request.qs]
+    assert [sorted(lookup[0].split(",")) for lookup in lookups] == [["closed", "open"]]
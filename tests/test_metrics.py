@@ -0,0 +1,87 @@
+from typing import Generator, List
+
+import pytest
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+from sqlalchemy import create_engine
+
+from rest_db_api.metrics import NO_METRICS, MetricsRegistry, QueryMetrics, add_metrics_hook, clear_metrics_hooks, \
+    start_metrics
+from rest_db_api.rest_api_adapter import RestAdapter
+from rest_db_api.utils import get_virtual_table
+
+URL = 'https://api.covidtracking.com/v1/ledgers'
+ROWS = [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}, {"id": 3, "name": "c"}]
+
+
+@pytest.fixture
+def collected() -> Generator[List[QueryMetrics], None, None]:
+    metrics: List[QueryMetrics] = []
+    add_metrics_hook(metrics.append)
+    yield metrics
+    clear_metrics_hooks()
+
+
+@pytest.fixture
+def ledgers(mocker: MockerFixture, requests_mock: Mocker) -> Mocker:
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    requests_mock.get(URL, json={"items": ROWS})
+    return requests_mock
+
+
+def test_disabled_without_hooks():
+    assert start_metrics("get_data", URL) is NO_METRICS
+    rows = iter(ROWS)
+    assert NO_METRICS.track(rows) is rows
+
+
+def test_get_data_metrics(ledgers: Mocker, collected: List[QueryMetrics]):
+    engine = create_engine("rest://api.covidtracking.com?ishttps=1")
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', jsonpath="$.items[*]")
+    try:
+        with engine.connect() as connection:
+            assert len(list(connection.execute(f'select * from "{virtual_table}"'))) == 3
+    finally:
+        engine.dispose()
+
+    by_operation = {metrics.operation: metrics for metrics in collected}
+    discovery = by_operation["set_columns"]
+    assert (discovery.requests, discovery.rows, discovery.cache_misses) == (1, 3, 1)
+    assert {"request", "decode", "jsonpath", "analyze"} <= set(discovery.phases)
+
+    query = by_operation["get_data"]
+    # the response of the discovery is reused, and counted
+    assert ledgers.call_count == 1
+    assert (query.requests, query.rows, query.error) == (1, 3, None)
+    assert query.bytes > 0
+    assert {"materialize", "sqlite"} <= set(query.phases)
+    assert query.duration >= query.phases["materialize"]
+
+
+def test_parse_operation_and_uri_metrics(collected: List[QueryMetrics]):
+    uri = "/v1/ledgers?a=b"
+    RestAdapter.parse_operation_and_uri(uri, f'SELECT * FROM "{uri}" WHERE HEADER_X_KEY = \'key\'')
+    metrics, = collected
+    assert metrics.operation == "parse_operation_and_uri"
+    assert metrics.phases["rewrite"] > 0
+
+
+def test_registry_and_failing_hooks(ledgers: Mocker, collected: List[QueryMetrics]):
+    registry = MetricsRegistry()
+    add_metrics_hook(lambda metrics: 1 / 0)
+    add_metrics_hook(registry)
+    adapter = RestAdapter(*RestAdapter.parse_uri(get_virtual_table(endpoint='/v1/ledgers', jsonpath="$.items[*]",
+                                                                   options={"schema": {"id": "integer"}})),
+                          base_url="api.covidtracking.com")
+    # a failing hook doesn't fail the query
+    assert [row["id"] for row in adapter.get_data({}, [])] == [1, 2, 3]
+    assert [row["id"] for row in adapter.get_data({}, [], limit=1)] == [1]
+
+    counters = registry.collect()
+    assert counters[("get_data", "calls")] == 2
+    assert counters[("get_data", "rows")] == 4
+    assert counters[("get_data", "requests")] == 2
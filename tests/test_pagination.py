@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+from sqlalchemy import create_engine
+
+from rest_db_api.pagination import PageNumberPaginator, PageRequest, Paginator, get_paginator
+from rest_db_api.utils import get_virtual_table
+
+PAGED_URL = 'https://api.covidtracking.com/v1/ledgers'
+
+ROWS = [{"id": i, "name": f"row {i}"} for i in range(5)]
+
+
+def get_offset_page(request, context):
+    limit = int(request.qs["limit"][0])
+    offset = int(request.qs["offset"][0])
+    return ROWS[offset:offset + limit]
+
+
+def test_offset_pagination(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    requests_mock.get(PAGED_URL, json=get_offset_page)
+
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', pagination={"type": "offset", "page_size": 2})
+    data = list(covid_data_connection.execute(f'select id from "{virtual_table}"'))
+    assert data == [(0,), (1,), (2,), (3,), (4,)]
+    # the first page is fetched once, for both the schema and the query
+    assert [request.qs["offset"] for request in requests_mock.request_history] == [["0"], ["2"], ["4"]]
+
+
+def test_pagination_stops_at_limit(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    requests_mock.get(PAGED_URL, json=get_offset_page)
+
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', pagination={"type": "offset", "page_size": 2})
+    data = list(covid_data_connection.execute(f'select id from "{virtual_table}" limit 2 offset 1'))
+    assert data == [(1,), (2,)]
+    assert [request.qs["offset"] for request in requests_mock.request_history] == [["0"], ["1"]]
+
+
+def test_cursor_pagination(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    def get_page(request, context):
+        start = int(request.qs.get("cursor", ["0"])[0])
+        next_cursor = str(start + 2) if start + 2 < len(ROWS) else None
+        return {"data": {"items": ROWS[start:start + 2]}, "meta": {"next": next_cursor}}
+
+    requests_mock.get(PAGED_URL, json=get_page)
+
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers',
+                                      jsonpath="$.data.items[*]",
+                                      pagination={"type": "cursor", "cursor_path": "$.meta.next"})
+    data = list(covid_data_connection.execute(f'select id from "{virtual_table}"'))
+    assert data == [(0,), (1,), (2,), (3,), (4,)]
+    assert requests_mock.call_count == 3
+
+
+def test_link_header_pagination(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    requests_mock.get(PAGED_URL, json=ROWS[:3], headers={"Link": f'<{PAGED_URL}?page=2&size=3>; rel="next"'})
+    requests_mock.get(f"{PAGED_URL}?page=2", json=ROWS[3:])
+
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', params={"size": 3}, pagination="link")
+    data = list(covid_data_connection.execute(f'select id from "{virtual_table}"'))
+    assert data == [(0,), (1,), (2,), (3,), (4,)]
+    assert requests_mock.last_request.qs == {"page": ["2"], "size": ["3"]}
+
+
+def test_concurrent_pagination(mocker: MockerFixture, json_server):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    rows = [{"id": i} for i in range(20)]
+    lock = threading.Lock()
+    in_flight = []
+    max_in_flight = []
+    requested_pages = []
+
+    def get_page(path, query_params):
+        with lock:
+            in_flight.append(1)
+            max_in_flight.append(len(in_flight))
+            requested_pages.append(int(query_params["page"][0]))
+        time.sleep(0.05)
+        with lock:
+            in_flight.pop()
+        page = int(query_params["page"][0])
+        return {"totalPages": 10, "items": rows[(page - 1) * 2:page * 2]}
+
+    engine = create_engine(f"rest://{json_server(get_page)}?ishttps=0")
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers',
+                                      jsonpath="$.items[*]",
+                                      pagination={"type": "page", "page_size": 2, "total_pages_path": "$.totalPages",
+                                                  "concurrency": 3})
+    with engine.connect() as connection:
+        data = list(connection.execute(f'select id from "{virtual_table}"'))
+        assert data == [(i,) for i in range(20)]
+        assert sorted(requested_pages) == list(range(1, 11))
+        assert max(max_in_flight) == 3
+
+        requested_pages.clear()
+        data = list(connection.execute(f'select id from "{virtual_table}" limit 5'))
+        assert data == [(i,) for i in range(5)]
+        # only the 3 pages holding the first 5 rows are fetched
+        assert sorted(requested_pages) == [1, 2, 3]
+
+
+def test_remaining_pages_from_total():
+    paginator = get_paginator({"pagination": {"type": "offset", "page_size": 10, "total_path": "$.meta.total"}})
+    page, _ = paginator.get_first_page(0)
+
+    remaining = paginator.get_remaining_pages(page, {"meta": {"total": 35}}, 10)
+    assert [page.params["offset"] for page in remaining] == [10, 20, 30]
+    assert paginator.get_remaining_pages(page, {"meta": {"total": 5}}, 5) == []
+    assert paginator.get_remaining_pages(page, {"meta": {}}, 10) is None
+
+
+def test_page_number_paginator():
+    paginator = get_paginator({"pagination": {"type": "page", "page_size": 10}, "page_param": "p", "page_start": 0})
+    assert isinstance(paginator, PageNumberPaginator)
+
+    page, skip = paginator.get_first_page(25)
+    assert page == PageRequest(None, {"p": 2, "size": 10})
+    assert skip == 5
+
+    assert paginator.get_next_page(page, None, None, 10) == PageRequest(None, {"p": 3, "size": 10})
+    assert paginator.get_next_page(page, None, None, 4) is None
+
+
+def test_incomplete_paginator():
+    class FirstPagePaginator(Paginator):
+        def get_first_page(self, offset: int):
+            return PageRequest(None, {}), offset
+
+    # a paginator that can't follow pages fails when it is created, not in the middle of a query
+    with pytest.raises(TypeError, match="get_next_page"):
+        FirstPagePaginator({})
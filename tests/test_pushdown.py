@@ -0,0 +1,146 @@
+import pytest
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Integer, Order, String
+from shillelagh.filters import Equal, Range
+
+from rest_db_api.pushdown import ColumnFilter, SortParam, filter_rows
+from rest_db_api.utils import get_virtual_table
+
+URL = 'https://api.covidtracking.com/v1/orders'
+
+ORDERS = [
+    {"id": i, "date": f"2024-01-0{i}", "status": "open" if i % 2 else "closed"}
+    for i in range(1, 8)
+]
+
+
+def get_orders(request, context):
+    orders = ORDERS
+    if "status" in request.qs:
+        orders = [order for order in orders if order["status"] in request.qs["status"]]
+    if "start_date" in request.qs:
+        orders = [order for order in orders if order["date"] >= request.qs["start_date"][0]]
+    if "end_date" in request.qs:
+        orders = [order for order in orders if order["date"] <= request.qs["end_date"][0]]
+    for sort in reversed(request.qs.get("sort", [])):
+        field, direction = sort.split(",")
+        orders = sorted(orders, key=lambda order: order[field], reverse=direction == "desc")
+    if "limit" in request.qs:
+        orders = orders[:int(request.qs["limit"][0])]
+    return orders
+
+
+@pytest.fixture
+def orders(mocker: MockerFixture, requests_mock: Mocker):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    requests_mock.get(URL, json=get_orders)
+    return requests_mock
+
+
+def get_table(**options) -> str:
+    schema = {"id": "integer", "date": "string", "status": "string"}
+    return get_virtual_table(endpoint='/v1/orders', options={"schema": schema, **options})
+
+
+def test_column_filter_params():
+    column_filter = ColumnFilter.from_option("date", {"eq": "date", "from": "start", "to": "end"})
+    assert column_filter.get_params(Equal("a")) == ({"date": "a"}, True)
+    assert column_filter.get_params(Range("a", "b", True, True)) == ({"start": "a", "end": "b"}, True)
+    # exclusive bounds are sent, but rows on the bound are filtered locally
+    assert column_filter.get_params(Range("a", None, False, False)) == ({"start": "a"}, False)
+    assert ColumnFilter.from_option("date", {"from": "start"}).get_params(Range(None, "b", True, True)) \
+        == ({}, False)
+    assert ColumnFilter.from_option("status", "status").get_params(Equal("open")) == ({"status": "open"}, True)
+
+
+def test_filter_rows_types():
+    rows = [{"id": "1"}, {"id": "5"}, {"id": "n/a"}, {"id": 7}]
+    bounds = {"id": Range(2, None, True, False)}
+    # numbers returned as strings are compared as the column's type
+    exact = {"id": Integer(filters=[Range], exact=True)}
+    assert list(filter_rows(rows, bounds, exact)) == [{"id": "5"}, {"id": 7}]
+    # rows that can't be compared are only left for SQLite to filter when the column is inexact
+    inexact = {"id": Integer(filters=[Range], exact=False)}
+    assert list(filter_rows(rows, bounds, inexact)) == [{"id": "5"}, {"id": "n/a"}, {"id": 7}]
+
+
+def test_invalid_filters(orders, covid_data_connection):
+    with pytest.raises(ProgrammingError):
+        ColumnFilter.from_option("date", {"exact": True})
+    with pytest.raises(ProgrammingError):
+        ColumnFilter.from_option("date", {"since": "start"})
+    with pytest.raises(Exception, match="unknown column"):
+        covid_data_connection.execute(f'select * from "{get_table(filters={"missing": "missing"})}"')
+
+
+def test_range_pushdown(orders: Mocker, covid_data_connection):
+    virtual_table = get_table(filters={"date": {"from": "start_date", "to": "end_date"}})
+    query = f"select id from \"{virtual_table}\" where date >= '2024-01-03' and date <= '2024-01-04'"
+    assert list(covid_data_connection.execute(query)) == [(3,), (4,)]
+    assert orders.last_request.qs == {"start_date": ["2024-01-03"], "end_date": ["2024-01-04"]}
+
+    query = f"select id from \"{virtual_table}\" where date > '2024-01-05'"
+    assert list(covid_data_connection.execute(query)) == [(6,), (7,)]
+    assert orders.last_request.qs == {"start_date": ["2024-01-05"]}
+
+
+def test_equal_and_in_pushdown(orders: Mocker, covid_data_connection):
+    virtual_table = get_table(filters={"status": "status"})
+    query = f"select id from \"{virtual_table}\" where status = 'closed' limit 2"
+    assert list(covid_data_connection.execute(query)) == [(2,), (4,)]
+    assert orders.last_request.qs == {"status": ["closed"]}
+
+    orders.reset_mock()
+    query = f"select id from \"{virtual_table}\" where status in ('open', 'closed')"
+    assert len(list(covid_data_connection.execute(query))) == 7
+    # SQLite probes each value of the IN list
+    assert sorted(request.qs["status"][0] for request in orders.request_history) == ["closed", "open"]
+
+
+def test_limit_pushdown_with_exact_filters(orders: Mocker, covid_data_connection):
+    virtual_table = get_table(filters={"status": "status"}, limit_param="limit")
+    query = f"select id from \"{virtual_table}\" where status = 'open' limit 2"
+    assert list(covid_data_connection.execute(query)) == [(1,), (3,)]
+    assert orders.last_request.qs == {"status": ["open"], "limit": ["2"]}
+
+
+def test_limit_after_local_filters(orders: Mocker, covid_data_connection):
+    virtual_table = get_table(limit_param="limit")
+    query = f"select id from \"{virtual_table}\" where id = 5 limit 1"
+    assert list(covid_data_connection.execute(query)) == [(5,)]
+    # the API can't filter on `id`, so it can't be asked for a single row either
+    assert orders.last_request.qs == {}
+
+
+def test_sort_params():
+    columns = {"id": Integer(), "date": String()}
+    sort_param = SortParam.from_option({"param": "sort", "columns": ["id", "date"]}, columns)
+    assert sort_param.get_params([("date", Order.DESCENDING), ("id", Order.ASCENDING)]) == \
+        {"sort": ["date,desc", "id,asc"]}
+    assert sort_param.get_params([]) == {}
+
+    sort_param = SortParam.from_option({"param": "sort", "columns": {"date": "created_at"},
+                                        "format": "{direction}{field}", "asc": "", "desc": "-", "separator": ","},
+                                       columns)
+    assert sort_param.get_params([("date", Order.DESCENDING)]) == {"sort": "-created_at"}
+
+    with pytest.raises(ProgrammingError):
+        SortParam.from_option({"param": "sort", "columns": ["missing"]}, columns)
+
+
+def test_top_n_pushdown(orders: Mocker, covid_data_connection):
+    virtual_table = get_table(sort={"param": "sort", "columns": ["id", "date"]}, limit_param="limit")
+    query = f'select id from "{virtual_table}" order by date desc limit 2'
+    assert list(covid_data_connection.execute(query)) == [(7,), (6,)]
+    # the API sorts, and only returns the top rows
+    assert orders.last_request.qs == {"sort": ["date,desc"], "limit": ["2"]}
+
+    query = f'select id from "{virtual_table}" order by status, id desc limit 2'
+    assert list(covid_data_connection.execute(query)) == [(6,), (4,)]
+
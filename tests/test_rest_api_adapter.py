@@ -1,3 +1,7 @@
+import logging
+
+import pytest
+
 from rest_db_api import rest_api_adapter, utils
 
 
@@ -19,12 +23,13 @@ class TestQueryParsing:
         assert uri_response_2 == uri_response_1
         assert operation_response_2 == operation_response_1
 
-        path, query_params, headers_dict, fragment, body = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
+        path, query_params, headers_dict, fragment, body, options = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
         assert path == "/reports/v2.0/ledgers"
         assert query_params == {"count": ["100"], }
         assert headers_dict == {"x-clear-node-id": "test-header-6,test-header-9", }
         assert fragment == '$[*]'
         assert body == {}
+        assert options == {}
 
     @staticmethod
     def test_parse_operation_and_uri_2():
@@ -45,12 +50,13 @@ class TestQueryParsing:
         assert uri_response_2 == uri_response_1
         assert operation_response_2 == operation_response_1
 
-        path, query_params, headers_dict, fragment, body = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
+        path, query_params, headers_dict, fragment, body, options = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
         assert path == "/reports/v2.0/ledgers"
         assert query_params == {"count": ["100"], "page": ["5", "6"]}
         assert headers_dict == {"x-clear-node-id": "test-header-6,test-header-9", "x-clear-node-type": "node-type"}
         assert fragment == '$[*]'
         assert body == {}
+        assert options == {}
 
     @staticmethod
     def test_parse_operation_and_uri_3():
@@ -100,7 +106,7 @@ class TestQueryParsing:
         assert uri_response_2 == uri_response_1
         assert operation_response_2 == operation_response_1
 
-        path, query_params, headers_dict, fragment, body = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
+        path, query_params, headers_dict, fragment, body, options = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
         assert path == "/api/gst-reports/reports/v3.0/ledgers/transaction"
         assert query_params == {'job_id': ['7227c292-2812-472f-bee3-9333195de314']}
         assert headers_dict == {'x-job-type': 'PAN_ELECTRONIC_REVERSAL_LEDGER',
@@ -111,6 +117,7 @@ class TestQueryParsing:
                                 'x-cleartax-product': 'GST'}
         assert fragment == '$[*]'
         assert body == {}
+        assert options == {}
 
     @staticmethod
     def test_parse_operation_and_uri_4():
@@ -167,7 +174,7 @@ OFFSET 0"""
         assert uri_response_2 == uri_response_1
         assert operation_response_2 == operation_response_1
 
-        path, query_params, headers_dict, fragment, body = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
+        path, query_params, headers_dict, fragment, body, options = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
         assert path == "REPORTS_LEDGER_SUMMARY"
         assert query_params == {
         }
@@ -178,6 +185,7 @@ OFFSET 0"""
         }
         assert fragment == '$[*]'
         assert body == {}
+        assert options == {}
 
     @staticmethod
     def test_parse_operation_and_uri_5():
@@ -224,7 +232,7 @@ OFFSET 0"""
         assert uri_response_2 == uri_response_1
         assert operation_response_2 == operation_response_1
 
-        path, query_params, headers_dict, fragment, body = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
+        path, query_params, headers_dict, fragment, body, options = rest_api_adapter.RestAdapter.parse_uri(uri_response_2)
         assert path == "REPORTS_LEDGER_SUMMARY"
         assert query_params == {
             'job_id': [
@@ -237,16 +245,7 @@ OFFSET 0"""
         }
         assert fragment == '$[*]'
         assert body == {}
-
-    @staticmethod
-    def test_remove_redundant_clause():
-        assert "WHERE (org_id = 1234)" == utils.remove_invalid_clause("WHERE (org_id = 1234)")
-        assert "" == utils.remove_invalid_clause("WHERE ()")
-        assert "" == utils.remove_invalid_clause("WHERE ( )")
-        assert "" == utils.remove_invalid_clause("WHERE (    )")
-        assert "" == utils.remove_invalid_clause("AND ( )")
-        assert "" == utils.remove_invalid_clause("AND ()")
-        assert "" == utils.remove_invalid_clause("WHERE ( AND () )")
+        assert options == {}
 
     @staticmethod
     def test_invalid_operation():
@@ -258,9 +257,72 @@ OFFSET 0"""
         assert uri == updated_uri
         assert invalid_operation == updated_operation
 
-        path, query_params, headers_dict, fragment, body = rest_api_adapter.RestAdapter.parse_uri(updated_uri)
+        path, query_params, headers_dict, fragment, body, options = rest_api_adapter.RestAdapter.parse_uri(updated_uri)
         assert path == "/api/gst-reports/reports/v3.0/ledgers/transaction"
         assert query_params == {}
         assert headers_dict == {}
         assert fragment == '$[*]'
         assert body == {}
+        assert options == {}
+
+    @staticmethod
+    def test_parse_operation_and_uri_nested_conditions():
+        uri = "/r"
+        operation = 'SELECT * FROM "/r" WHERE a = 2 AND (QUERY_PARAMx = 1 AND b = 3) AND (HEADERy = 4 AND cookie = "c")'
+
+        updated_uri, updated_operation = rest_api_adapter.RestAdapter.parse_operation_and_uri(uri, operation)
+        assert updated_uri == "/r?x=1&header=y:4&header=cookie:c"
+        assert updated_operation == 'SELECT * FROM "/r?x=1&header=y:4&header=cookie:c" WHERE a = 2 AND (b = 3)'
+
+    @staticmethod
+    def test_parse_operation_and_uri_with_or(caplog: pytest.LogCaptureFixture):
+        uri = "/r"
+        operation = 'SELECT * FROM "/r" WHERE a = 1 AND QUERY_PARAMx = 2 OR b = 3'
+
+        # a param can't be sent for only some of the rows, the statement is left as is
+        assert rest_api_adapter.RestAdapter.parse_operation_and_uri(uri, operation) == (uri, operation)
+        # the statement is valid, it isn't reported as an error
+        assert not [record for record in caplog.records if record.levelno >= logging.WARNING]
+
+    @staticmethod
+    def test_parse_operation_and_uri_with_not():
+        uri = "/r"
+        operation = 'SELECT * FROM "/r" WHERE NOT QUERY_PARAMx = 2'
+
+        # the param would select the rows the condition excludes, the statement is left as is
+        assert rest_api_adapter.RestAdapter.parse_operation_and_uri(uri, operation) == (uri, operation)
+
+    @staticmethod
+    def test_parse_operation_and_uri_is_cached():
+        utils.parse_operation_and_uri.cache_clear()
+        operation = 'SELECT * FROM "/r" WHERE QUERY_PARAMx = 1'
+
+        first = rest_api_adapter.RestAdapter.parse_operation_and_uri("/r", operation)
+        second = rest_api_adapter.RestAdapter.parse_operation_and_uri("/r", operation)
+        assert first == second == ("/r?x=1", 'SELECT * FROM "/r?x=1"')
+        assert utils.parse_operation_and_uri.cache_info().hits == 1
+
+    @staticmethod
+    def test_decode_virtual_table_is_cached():
+        rest_api_adapter.decode_virtual_table.cache_clear()
+        uri = utils.get_virtual_table(endpoint="/v1/items", params={"a": 1}, headers={"accept": "*/*"},
+                                      body={"filters": list(range(100))},
+                                      options={"schema_sample_size": 5, "pagination": {"type": "page"}})
+
+        first = rest_api_adapter.RestAdapter.parse_uri(uri)
+        first[1]["a"].append("2")
+        first[2]["accept"] = "text/html"
+        first[4]["filters"].append(100)
+        first[5]["pagination"]["type"] = "offset"
+        rest_api_adapter.decompose_virtual_table(uri)[4]["filters"].clear()
+        second = rest_api_adapter.RestAdapter.parse_uri(uri)
+        # callers get their own containers, down to the nested ones, the decoded spec isn't changed
+        assert second == ("/v1/items", {"a": ["1"]}, {"accept": "*/*"}, "$[*]", {"filters": list(range(100))},
+                          {"schema_sample_size": 5, "pagination": {"type": "page"}})
+        assert rest_api_adapter.decompose_virtual_table(uri) == ("/v1/items", {"a": "1"}, {"accept": "*/*"}, "$[*]",
+                                                                 {"filters": list(range(100))})
+
+        cache_info = rest_api_adapter.decode_virtual_table.cache_info()
+        assert (cache_info.hits, cache_info.misses) == (3, 1)
+        with pytest.raises(TypeError):
+            rest_api_adapter.decode_virtual_table(uri).query_params["a"] = ("3",)
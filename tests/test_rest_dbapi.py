@@ -99,7 +99,7 @@ MOCK_RESPONSE = [
 
 def test_rest_adapter(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
     mocker.patch(
-        "rest_db_api.rest_api_adapter.requests_cache.CachedSession",
+        "rest_db_api.session.requests_cache.CachedSession",
         return_value=Session(),
     )
 
@@ -112,7 +112,7 @@ def test_rest_adapter(mocker: MockerFixture, requests_mock: Mocker, covid_data_c
 
 def test_rest_adapter_post(mocker: MockerFixture, requests_mock: Mocker, post_data_connection):
     mocker.patch(
-        "rest_db_api.rest_api_adapter.requests_cache.CachedSession",
+        "rest_db_api.session.requests_cache.CachedSession",
         return_value=Session(),
     )
 
@@ -200,3 +200,114 @@ def test_decompose_virtual_table():
     assert fragment == "$[*]"
     assert body == expected_body
     assert path == "/api/v1/test"
+
+
+def test_rest_adapter_fetches_once(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    requests_mock.get(SIMPLE_URL, json=MOCK_RESPONSE)
+
+    sql = "select * from '/v1/us/daily.json'"
+    data = covid_data_connection.execute(sql)
+    assert len(list(data)) == 2
+    # the payload fetched for schema discovery is reused by the query
+    assert requests_mock.call_count == 1
+
+
+def test_rest_adapter_declared_schema(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    requests_mock.get(SIMPLE_URL, json=MOCK_RESPONSE)
+
+    virtual_table = get_virtual_table(endpoint='/v1/us/daily.json',
+                                      options={"schema": {"date": "integer", "hash": "string"}})
+    data = list(covid_data_connection.execute(f'select * from "{virtual_table}"'))
+    assert data == [(20210307, "a80d0063822e251249fd9a44730c49cb23defd83", 0),
+                    (20210306, "dae5e558c24adb86686bbd58c08cce5f610b8bb0", 1)]
+    assert requests_mock.call_count == 1
+    assert "options" not in requests_mock.last_request.qs
+
+
+def test_rest_adapter_schema_sample(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    # only the first row is sampled, so ``extra`` is not discovered as a column
+    requests_mock.get(SIMPLE_URL, json=[{"id": 1}, {"id": 2, "extra": "x"}])
+
+    virtual_table = get_virtual_table(endpoint='/v1/us/daily.json', options={"schema_sample_size": 1})
+    data = covid_data_connection.execute(f'select * from "{virtual_table}"')
+    assert data.keys() == ["id", "rowid"]
+    assert len(list(data)) == 2
+
+
+def test_get_virtual_table_with_options():
+    virtual_table = get_virtual_table(endpoint='/v1/forecast.json', params={"q": "Bangalore"},
+                                      options={"schema_sample_size": 10})
+    assert virtual_table == '/v1/forecast.json?q=Bangalore&options=%7B%22schema_sample_size%22%3A%2010%7D#$[*]'
+
+    path, query_params, headers_dict, fragment, body = decompose_virtual_table(virtual_table)
+    assert query_params == {"q": "Bangalore"}
+
+
+def test_rest_adapter_limit_offset(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    requests_mock.get(SIMPLE_URL, json=MOCK_RESPONSE)
+
+    data = list(covid_data_connection.execute("select date from '/v1/us/daily.json' limit 1 offset 1"))
+    assert data == [(20210306,)]
+    assert requests_mock.call_count == 1
+
+
+def test_rest_adapter_limit_offset_pushdown(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    requests_mock.get(SIMPLE_URL, json=MOCK_RESPONSE[1:])
+
+    virtual_table = get_virtual_table(endpoint='/v1/us/daily.json',
+                                      options={"limit_param": "$top", "offset_param": "$skip"})
+    data = list(covid_data_connection.execute(f'select date from "{virtual_table}" limit 1 offset 1'))
+    assert data == [(20210306,)]
+    schema_request, data_request = requests_mock.request_history
+    assert schema_request.qs == {"$top": ["1000"]}
+    assert data_request.qs == {"$top": ["1"], "$skip": ["1"]}
+
+
+def test_rest_adapter_page_pushdown(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+
+    def get_page(request, context):
+        size = int(request.qs["size"][0])
+        start = (int(request.qs["page"][0]) - 1) * size
+        return (MOCK_RESPONSE * 3)[start:start + size]
+
+    requests_mock.get(SIMPLE_URL, json=get_page)
+
+    virtual_table = get_virtual_table(endpoint='/v1/us/daily.json',
+                                      options={"page_param": "page", "page_size_param": "size",
+                                               "schema": {"date": "integer"}})
+    data = list(covid_data_connection.execute(f'select date from "{virtual_table}" limit 2 offset 4'))
+    assert data == [(20210307,), (20210306,)]
+    assert requests_mock.last_request.qs == {"page": ["3"], "size": ["2"]}
+
+    data = list(covid_data_connection.execute(f'select date from "{virtual_table}" limit 1 offset 1'))
+    assert data == [(20210306,)]
+    assert requests_mock.last_request.qs == {"page": ["2"], "size": ["1"]}
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+import requests
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+from sqlalchemy import create_engine
+
+from rest_db_api.retries import RetryPolicy, TokenBucket, get_rate_limiter
+from rest_db_api.utils import get_virtual_table
+
+URL = 'https://api.covidtracking.com/v1/ledgers'
+ENGINE_URL = "rest://api.covidtracking.com?ishttps=1&retry_backoff=0.001&connect_timeout=2&read_timeout=5"
+
+ROWS = [{"id": 1}, {"id": 2}]
+
+
+@pytest.fixture
+def ledgers(mocker: MockerFixture, requests_mock: Mocker):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    return requests_mock
+
+
+def query(engine_url: str = ENGINE_URL):
+    engine = create_engine(engine_url)
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', options={"schema": {"id": "integer"}})
+    try:
+        with engine.connect() as connection:
+            return list(connection.execute(f'select id from "{virtual_table}"'))
+    finally:
+        engine.dispose()
+
+
+def test_get_delay():
+    policy = RetryPolicy(retry_backoff=1, max_backoff=3, max_retry_after=10)
+    assert all(0 <= policy.get_delay(attempt) <= 3 for attempt in range(10))
+
+    response = requests.Response()
+    response.headers["Retry-After"] = "2"
+    assert policy.get_delay(0, response) == 2
+    response.headers["Retry-After"] = "120"
+    assert policy.get_delay(0, response) is None
+
+
+def test_can_retry():
+    policy = RetryPolicy()
+    response = requests.Response()
+    response.status_code = 503
+    assert policy.can_retry("GET", response=response)
+    assert not policy.can_retry("POST", response=response)
+    response.status_code = 429
+    assert policy.can_retry("POST", response=response)
+    assert policy.can_retry("POST", exception=requests.exceptions.ConnectTimeout())
+    assert not policy.can_retry("POST", exception=requests.exceptions.ReadTimeout())
+
+
+def test_retries(ledgers):
+    ledgers.get(URL, [{"status_code": 503}, {"status_code": 429, "headers": {"Retry-After": "0"}},
+                      {"json": ROWS}])
+    assert query() == [(1,), (2,)]
+    assert ledgers.call_count == 3
+    assert ledgers.last_request.timeout == (2, 5)
+    # the 429 lowered the rate of requests to the host
+    assert get_rate_limiter("api.covidtracking.com").rate is not None
+
+
+def test_failures_raise(ledgers):
+    ledgers.get(URL, status_code=500, json={"error": "boom"})
+    with pytest.raises(Exception, match="status : 500"):
+        query()
+    assert ledgers.call_count == 4
+
+    ledgers.reset_mock()
+    ledgers.get(URL, exc=requests.exceptions.ConnectTimeout)
+    with pytest.raises(Exception, match="attempts : 2"):
+        query(ENGINE_URL + "&max_retries=1")
+    assert ledgers.call_count == 2
+
+
+def test_rate_limits_per_engine(ledgers):
+    ledgers.get(URL, json=ROWS)
+    assert query(f"{ENGINE_URL}&rate_limit=5") == query(f"{ENGINE_URL}&rate_limit=50") == [(1,), (2,)]
+    # the engines share the host, not the limit of the first one
+    slow, fast = get_rate_limiter("api.covidtracking.com", 5), get_rate_limiter("api.covidtracking.com", 50)
+    assert (slow.max_rate, fast.max_rate) == (5, 50)
+    assert len(slow._sent) == len(fast._sent) == 1
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=20)
+    start = time.perf_counter()
+    for _ in range(25):
+        bucket.acquire()
+    # 20 requests in the first second, then 20 per second
+    assert 0.2 <= time.perf_counter() - start < 1
+
+    bucket.throttle()
+    assert bucket.rate == 10
+    bucket.recover()
+    assert bucket.rate == 10.5
+
+    unlimited = TokenBucket()
+    for _ in range(8):
+        unlimited.acquire()
+    unlimited.throttle()
+    assert unlimited.rate == 4
@@ -0,0 +1,66 @@
+import copy
+import json
+
+import pytest
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+from shillelagh.exceptions import ProgrammingError
+from shillelagh.fields import Integer, String
+
+from rest_db_api import rows
+from rest_db_api.rows import RowMaterializer, get_json_encoder
+from rest_db_api.utils import get_virtual_table
+
+ITEMS = [
+    {"id": 1, "name": "a", "tags": ["x", "y"], "meta": {"score": 1.5}},
+    {"id": 2, "name": "b", "tags": [], "extra": True},
+]
+
+
+def test_discovery_rows_keep_every_key():
+    items = copy.deepcopy(ITEMS)
+    data = list(RowMaterializer().get_rows(items, start=10))
+    assert data[0] == {"id": 1, "name": "a", "tags": '["x", "y"]', "meta": '{"score": 1.5}', "rowid": 10}
+    assert data[1] == {"id": 2, "name": "b", "tags": "[]", "extra": True, "rowid": 11}
+    # the parsed payload isn't mutated
+    assert items == ITEMS
+
+
+def test_rows_hold_the_columns():
+    columns = {"id": Integer(), "tags": String(), "meta": String(), "rowid": Integer()}
+    materializer = RowMaterializer(columns)
+    assert materializer.nested_columns == {"tags", "meta"}
+
+    data = list(materializer.get_rows(ITEMS))
+    assert data == [
+        {"id": 1, "tags": '["x", "y"]', "meta": '{"score": 1.5}', "rowid": 0},
+        {"id": 2, "tags": "[]", "meta": None, "rowid": 1},
+    ]
+    assert list(materializer.get_rows(ITEMS, requested_columns={"tags"})) == [
+        {"tags": '["x", "y"]', "rowid": 0},
+        {"tags": "[]", "rowid": 1},
+    ]
+
+
+def test_get_json_encoder():
+    assert get_json_encoder("json")({"a": [1, "é"]}) == json.dumps({"a": [1, "é"]})
+    with pytest.raises(ProgrammingError):
+        get_json_encoder("yaml")
+    if rows.orjson is not None:
+        assert json.loads(get_json_encoder("orjson")({"a": [1, "é"]})) == {"a": [1, "é"]}
+
+
+def test_only_requested_columns_are_materialized(mocker: MockerFixture, requests_mock: Mocker,
+                                                 covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        return_value=Session(),
+    )
+    requests_mock.get('https://api.covidtracking.com/v1/items', json=ITEMS)
+    get_rows = mocker.spy(RowMaterializer, "get_rows")
+
+    virtual_table = get_virtual_table(endpoint='/v1/items')
+    data = list(covid_data_connection.execute(f'select tags from "{virtual_table}" where id = 2'))
+    assert data == [("[]",)]
+    assert get_rows.call_args.args[3] == {"id", "tags"}
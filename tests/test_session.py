@@ -0,0 +1,181 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pytest_mock import MockerFixture
+from requests import Session
+from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+
+from rest_db_api.rest_api_dialect import RestApiDialect
+from rest_db_api.session import SessionConfig, SingleFlight, get_pool_stats, get_session
+from rest_db_api.utils import get_virtual_table
+
+
+def test_get_session_is_shared(mocker: MockerFixture):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        side_effect=lambda **kwargs: Session(),
+    )
+
+    session = get_session("api.covidtracking.com", True)
+    assert get_session("api.covidtracking.com", True) is session
+    assert get_session("api.covidtracking.com", False) is not session
+    assert get_session("api.covidtracking.com", True, SessionConfig(pool_maxsize=2)) is not session
+
+    adapter = session.get_adapter("https://api.covidtracking.com")
+    assert adapter._pool_maxsize == 10
+
+
+def test_pool_stats(mocker: MockerFixture, json_server):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        side_effect=lambda **kwargs: Session(),
+    )
+    base_url = json_server(lambda path, query_params: [{"id": 1}, {"id": 2}])
+
+    engine = create_engine(f"rest://{base_url}?ishttps=0&pool_maxsize=4")
+    for _ in range(3):
+        with engine.connect() as connection:
+            assert len(list(connection.execute('select * from "/v1/ledgers"'))) == 2
+
+    stats = get_pool_stats()
+    assert len(stats) == 1
+    assert stats[0]["max_connections"] == 4
+    # every query reused the same connection
+    assert stats[0]["num_connections"] == 1
+    assert stats[0]["num_requests"] == 3
+
+
+def test_dialect_session_args():
+    url = make_url("rest://api.covidtracking.com?ishttps=1&pool_maxsize=20&pool_block=true&keep_alive=0")
+    _, kwargs = RestApiDialect().create_connect_args(url)
+    assert kwargs["adapter_kwargs"]["myrestadapter"] == {
+        "base_url": "api.covidtracking.com",
+        "is_https": True,
+        "engine_options": {
+            "pool_maxsize": 20,
+            "pool_block": True,
+            "keep_alive": False,
+        },
+    }
+
+
+def test_cache_policy(requests_mock):
+    requests_mock.get("https://api.covidtracking.com/v1/us/daily.json", json=[{"id": 1}])
+    requests_mock.get("https://api.covidtracking.com/v1/live.json", json=[{"id": 1}])
+
+    engine = create_engine("rest://api.covidtracking.com?ishttps=1&cache_backend=memory&cache_ttl=3600")
+    for _ in range(2):
+        with engine.connect() as connection:
+            assert len(list(connection.execute('select * from "/v1/us/daily.json"'))) == 1
+    assert requests_mock.call_count == 1
+
+    # tables can override the ttl, 0 disables caching
+    virtual_table = get_virtual_table(endpoint="/v1/live.json", options={"cache_ttl": 0})
+    for _ in range(2):
+        with engine.connect() as connection:
+            assert len(list(connection.execute(f'select * from "{virtual_table}"'))) == 1
+    assert requests_mock.call_count == 3
+
+
+def test_cache_max_size(requests_mock):
+    requests_mock.get("https://api.covidtracking.com/v1/us/daily.json", json=[{"id": 1}])
+
+    session = get_session("api.covidtracking.com", True,
+                          SessionConfig(cache_backend="memory", cache_ttl=3600, cache_max_size=2))
+    for day in range(4):
+        session.get("https://api.covidtracking.com/v1/us/daily.json", params={"day": day})
+    assert len(session.cache.responses) == 2
+    assert session.get("https://api.covidtracking.com/v1/us/daily.json", params={"day": 3}).from_cache
+
+
+def test_dialect_cache_args():
+    url = make_url("rest://api.covidtracking.com?ishttps=1&cache_backend=filesystem&cache_path=/tmp/rest-cache"
+                   "&cache_ttl=30&cache_urls_expire_after=%7B%22%2A%2Fmasters%2F%2A%22%3A%2086400%7D")
+    _, kwargs = RestApiDialect().create_connect_args(url)
+    engine_options = kwargs["adapter_kwargs"]["myrestadapter"]["engine_options"]
+    assert engine_options == {
+        "cache_backend": "filesystem",
+        "cache_path": "/tmp/rest-cache",
+        "cache_ttl": 30.0,
+        "cache_urls_expire_after": {"*/masters/*": 86400},
+    }
+    assert SessionConfig.from_options(engine_options).cache_urls_expire_after == (("*/masters/*", 86400),)
+
+
+def test_single_flight():
+    single_flight = SingleFlight()
+    calls = []
+    barrier = threading.Barrier(5)
+
+    def call():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+
+    def run():
+        barrier.wait()
+        return single_flight.do(("GET", "https://api.covidtracking.com"), call)
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(lambda _: run(), range(5)))
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+    # once the call is done, the key can be used again
+    single_flight.do(("GET", "https://api.covidtracking.com"), call)
+    assert len(calls) == 2
+
+
+def test_concurrent_queries_are_coalesced(mocker: MockerFixture, json_server):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        side_effect=lambda **kwargs: Session(),
+    )
+    calls = []
+
+    def get_rows(path, query_params):
+        calls.append(path)
+        time.sleep(0.3)
+        return [{"id": 1}, {"id": 2}]
+
+    engine = create_engine(f"rest://{json_server(get_rows)}?ishttps=0")
+    barrier = threading.Barrier(4)
+
+    def query():
+        with engine.connect() as connection:
+            barrier.wait()
+            return list(connection.execute('select * from "/v1/ledgers"'))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: query(), range(4)))
+
+    assert all(result == [(1, 0), (2, 1)] for result in results)
+    assert calls == ["/v1/ledgers"]
+
+
+def test_stale_while_revalidate(json_server):
+    calls = []
+
+    def get_rows(path, query_params):
+        calls.append(path)
+        return [{"version": len(calls)}]
+
+    base_url = json_server(get_rows)
+    engine = create_engine(f"rest://{base_url}?ishttps=0&cache_backend=memory&cache_ttl=1"
+                           f"&cache_stale_while_revalidate=1")
+    with engine.connect() as connection:
+        assert list(connection.execute('select version from "/v1/ledgers"')) == [(1,)]
+
+    time.sleep(1.1)
+    with engine.connect() as connection:
+        # the expired response is served while it is refreshed in the background
+        assert list(connection.execute('select version from "/v1/ledgers"')) == [(1,)]
+
+    # wait for the refreshed response to be cached
+    time.sleep(0.3)
+    assert len(calls) == 2
+    with engine.connect() as connection:
+        assert list(connection.execute('select version from "/v1/ledgers"')) == [(2,)]
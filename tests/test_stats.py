@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import create_engine
+
+from rest_db_api.stats import Observation, SqliteStatsStore, StatsStore, get_stats_store, normalize_endpoint
+from rest_db_api.utils import get_virtual_table
+from tests.test_pushdown import URL, get_table, orders  # noqa: F401
+
+SCAN_KEY = "GET api.covidtracking.com/v1/orders"
+
+
+def get_observation(rows: int, latency: float) -> Observation:
+    observation = Observation()
+    observation.rows, observation.requests, observation.bytes = rows, 1, rows * 50
+    observation.timed_requests, observation.latency = 1, latency
+    return observation
+
+
+def test_normalize_endpoint():
+    assert normalize_endpoint("GET", "https://api.com/v1/orders/42/lines", ["status", "date"]) \
+        == "GET api.com/v1/orders/{id}/lines?date&status"
+    assert normalize_endpoint("POST", "http://api.com/jobs/feb0b665-a9f5-4c7f-be74-7c27a08dd41f") \
+        == "POST api.com/jobs/{id}"
+    assert normalize_endpoint("GET", "https://api.com/v2.0/ledgers") == "GET api.com/v2.0/ledgers"
+
+
+def test_sqlite_stats_store(tmp_path):
+    path = str(tmp_path / "stats")
+    store = SqliteStatsStore(path)
+    store.record(SCAN_KEY, get_observation(100, 0.2))
+    stats = store.record(SCAN_KEY, get_observation(200, 0.1))
+    assert (stats.rows, stats.row_bytes, stats.samples) == (130, 50, 2)
+    assert stats.latency == pytest.approx(0.17)
+    store.close()
+
+    assert SqliteStatsStore(path).get(SCAN_KEY) == stats
+
+
+def test_stats_store_backends(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    # nothing is written to the working directory unless a sqlite store is configured
+    assert type(get_stats_store()) is StatsStore
+    assert not list(tmp_path.iterdir())
+    assert isinstance(get_stats_store(path=str(tmp_path / "stats")), SqliteStatsStore)
+    assert isinstance(get_stats_store("sqlite"), SqliteStatsStore)
+    assert (tmp_path / "rest_api_stats.sqlite").exists()
+
+
+def test_reads_are_recorded(orders):
+    connection = create_engine("rest://api.covidtracking.com?ishttps=1&stats_backend=memory").connect()
+    list(connection.execute(f'select * from "{get_table(filters={"status": "status"})}"'))
+    list(connection.execute(f'select * from "{get_table(filters={"status": "status"})}" where status = "open"'))
+    # reads cut short by a LIMIT don't tell the size of the endpoint
+    list(connection.execute(f'select * from "{get_table()}" limit 1'))
+
+    store = get_stats_store("memory")
+    assert (store.get(SCAN_KEY).rows, store.get(SCAN_KEY).requests, store.get(SCAN_KEY).samples) == (7, 1, 1)
+    assert store.get(f"{SCAN_KEY} where status").rows == 4
+
+
+STATUSES_URL = "https://api.covidtracking.com/v1/statuses"
+STATUSES = [{"status": "open", "label": "Open"}, {"status": "closed", "label": "Closed"}]
+
+
+@pytest.mark.parametrize("orders_rows, statuses_rows, large_url", [
+    (1000000, 2, URL),
+    (7, 1000000, STATUSES_URL),
+])
+def test_cost_uses_observed_rows(orders, orders_rows, statuses_rows, large_url):
+    orders.get(STATUSES_URL, json=lambda request, context: [
+        status for status in STATUSES if status["status"] in request.qs.get("status", [status["status"]])
+    ])
+    store = get_stats_store("memory")
+    store.record(SCAN_KEY, get_observation(orders_rows, 0.1))
+    store.record("GET api.covidtracking.com/v1/statuses", get_observation(statuses_rows, 0.1))
+    connection = create_engine("rest://api.covidtracking.com?ishttps=1&stats_backend=memory").connect()
+    statuses = get_virtual_table(endpoint="/v1/statuses", options={
+        "schema": {"status": "string", "label": "string"}, "filters": {"status": "status"},
+    })
+
+    data = list(connection.execute(f'''select o.id, s.label from "{get_table(filters={"status": "status"})}" o
+        join "{statuses}" s on o.status = s.status'''))
+    assert sorted(data) == [(i, "Open" if i % 2 else "Closed") for i in range(1, 8)]
+    # the large endpoint is read once, the small one is read again for each of its rows
+    large_requests = [request for request in orders.request_history if request.url.startswith(large_url)]
+    assert len(large_requests) == 1
+    assert "status" not in large_requests[0].qs
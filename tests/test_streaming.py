@@ -0,0 +1,173 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Generator, List, Tuple
+
+import pytest
+from pytest_mock import MockerFixture
+from requests import Session
+from requests_mock.mocker import Mocker
+from sqlalchemy import create_engine
+
+from rest_db_api.fragments import parse_simple_fragment
+from rest_db_api.rest_api_adapter import RestAdapter
+from rest_db_api.streaming import iter_csv, iter_json_array, iter_ndjson
+from rest_db_api.utils import get_virtual_table
+
+STREAMED_URL = 'https://api.covidtracking.com/v1/ledgers'
+
+ROWS = [{"id": i, "name": f"row {i} ✓", "score": i * 1.5, "tags": {"even": i % 2 == 0}} for i in range(50)]
+
+
+def get_chunks(document, chunk_size: int):
+    data = json.dumps(document, ensure_ascii=False).encode()
+    return (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+
+
+def test_parse_simple_fragment():
+    assert parse_simple_fragment("$[*]") == []
+    assert parse_simple_fragment("$.data.items[*]") == ["data", "items"]
+    assert parse_simple_fragment("$['line items'][*]") == ["line items"]
+    assert parse_simple_fragment("$..items[*]") is None
+    assert parse_simple_fragment("$.items[?(@.id > 1)]") is None
+    assert parse_simple_fragment("$.items[0]") is None
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_iter_json_array(chunk_size: int):
+    document = {"meta": {"skipped": [1, {"a": "}"}]}, "data": {"count": 50, "items": ROWS}}
+    assert list(iter_json_array(get_chunks(document, chunk_size), ["data", "items"])) == ROWS
+    assert list(iter_json_array(get_chunks(ROWS, chunk_size), [])) == ROWS
+    assert list(iter_json_array(get_chunks({"data": {}}, chunk_size), ["data", "items"])) == []
+    assert list(iter_json_array(get_chunks([], chunk_size), [])) == []
+
+
+def test_iter_json_array_is_lazy():
+    chunks_read = []
+
+    def chunks():
+        for chunk in get_chunks(ROWS, 10):
+            chunks_read.append(chunk)
+            yield chunk
+
+    rows = iter_json_array(chunks(), [])
+    assert next(rows) == ROWS[0]
+    assert len(chunks_read) < len(list(get_chunks(ROWS, 10))) / 10
+
+
+def test_streamed_table(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        side_effect=lambda **kwargs: Session(),
+    )
+    requests_mock.get(STREAMED_URL, json={"data": {"items": ROWS}})
+
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', jsonpath="$.data.items[*]",
+                                      options={"stream": True, "schema_sample_size": 5})
+    data = list(covid_data_connection.execute(f'select id, name, tags from "{virtual_table}" where id >= 48'))
+    assert data == [(48, "row 48 ✓", '{"even": true}'), (49, "row 49 ✓", '{"even": false}')]
+    # the sampled rows are replayed, the response isn't fetched again for the query
+    assert len(requests_mock.request_history) == 1
+
+
+def test_stream_falls_back_for_complex_fragments(mocker: MockerFixture, requests_mock: Mocker,
+                                                 covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        side_effect=lambda **kwargs: Session(),
+    )
+    requests_mock.get(STREAMED_URL, json={"data": {"items": ROWS}})
+
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', jsonpath="$.data.items[?(@.id < 2)]",
+                                      options={"stream": True})
+    data = list(covid_data_connection.execute(f'select id from "{virtual_table}"'))
+    assert data == [(0,), (1,)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1000])
+def test_row_formats(chunk_size: int):
+    ndjson = "\n".join(json.dumps(row, ensure_ascii=False) for row in ROWS[:3]).encode() + b"\n\n"
+    chunks = [ndjson[i:i + chunk_size] for i in range(0, len(ndjson), chunk_size)]
+    assert list(iter_ndjson(chunks)) == ROWS[:3]
+
+    document = '\ufeffid,name,zip,score\r\n1,"a, ✓\nb",00123,1.5\r\n2,,7,-3e2\r\n'.encode()
+    chunks = [document[i:i + chunk_size] for i in range(0, len(document), chunk_size)]
+    assert list(iter_csv(chunks)) == [{"id": 1, "name": "a, ✓\nb", "zip": "00123", "score": 1.5},
+                                      {"id": 2, "name": None, "zip": 7, "score": -300.0}]
+
+
+@pytest.fixture
+def compressed_server() -> Generator[Tuple[str, List[dict]], None, None]:
+    """
+    Serve ``ROWS`` as gzipped NDJSON; yields the address of the server and the headers of the requests it received.
+    """
+    requests_headers: List[dict] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_headers.append(dict(self.headers))
+            body = gzip.compress("".join(json.dumps(row) + "\n" for row in ROWS).encode())
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"127.0.0.1:{server.server_address[1]}", requests_headers
+    server.shutdown()
+    server.server_close()
+
+
+def test_compressed_ndjson_table(compressed_server: Tuple[str, List[dict]]):
+    address, requests_headers = compressed_server
+    engine = create_engine(f"rest://{address}?ishttps=0&cache_backend=memory&stats_backend=memory")
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', options={"format": "ndjson"})
+    try:
+        with engine.connect() as connection:
+            data = list(connection.execute(f'select id, tags from "{virtual_table}" where id >= 48'))
+    finally:
+        engine.dispose()
+    assert data == [(48, '{"even": true}'), (49, '{"even": false}')]
+    assert len(requests_headers) == 1
+    assert "gzip" in requests_headers[0]["Accept-Encoding"]
+
+
+def test_csv_table(mocker: MockerFixture, requests_mock: Mocker, covid_data_connection):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        side_effect=lambda **kwargs: Session(),
+    )
+    requests_mock.get(STREAMED_URL, text="id;name\n1;a\n2;b\n")
+
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', options={"format": "csv", "csv_delimiter": ";",
+                                                                       "stream": False})
+    assert list(covid_data_connection.execute(f'select id, name from "{virtual_table}"')) == [(1, "a"), (2, "b")]
+
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', options={"format": "xml"})
+    with pytest.raises(Exception, match="Unsupported response format"):
+        covid_data_connection.execute(f'select * from "{virtual_table}"')
+
+
+def test_unused_prefetched_response_is_closed(mocker: MockerFixture, requests_mock: Mocker):
+    mocker.patch(
+        "rest_db_api.session.requests_cache.CachedSession",
+        side_effect=lambda **kwargs: Session(),
+    )
+    requests_mock.get(STREAMED_URL, json=lambda request, context: ROWS[:int(request.qs["limit"][0])])
+    virtual_table = get_virtual_table(endpoint='/v1/ledgers', options={"schema_sample_size": 5, "limit_param": "limit",
+                                                                       "stream": True})
+    adapter = RestAdapter(*RestAdapter.parse_uri(virtual_table), base_url="api.covidtracking.com")
+    prefetched_response = adapter._prefetched[1]
+    close = mocker.spy(prefetched_response, "close")
+
+    # the query asks for another page than the one of the schema discovery, whose connection is released
+    assert [row["id"] for row in adapter.get_data({}, [], limit=2)] == [0, 1]
+    assert close.call_count == 1
+    assert adapter._prefetched is None